@@ -0,0 +1,64 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from mda_form_engine import MDAFormEngine
+
+# 批量导入基准测试：把N条历史采购入库记录导入单据，对比save_records整批写入与逐条保存
+# 逐条保存的JSON文件存储每条都要重写整个文件，只测前若干条后按平均耗时估算
+# 用法：python bench_bulk_save.py [记录数]
+
+METADATA_FILE = os.path.abspath('erp_form_metadata.xml')
+
+
+def make_row(i):
+    return {'入库单号': f'RK{i:08d}', '供应商名称': f'供应商{i % 500}', '商品名称': f'商品{i % 2000}',
+            '入库金额': str(i % 10000)}
+
+
+def bulk_save(storage, count):
+    engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage=storage)
+    start = time.perf_counter()
+    engine.save_records('采购管理', '采购入库', map(make_row, range(count)))
+    elapsed = time.perf_counter() - start
+    engine.close_stores()
+    return elapsed
+
+
+def single_saves(storage, count, sample):
+    """逐条保存前sample条，返回按平均耗时估算的N条总耗时"""
+    engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage=storage)
+    store = engine.get_store('data_采购管理_采购入库.json')
+    sample = min(sample, count)
+    start = time.perf_counter()
+    for i in range(sample):
+        row = make_row(i)
+        row['id'] = engine.new_record_id()
+        store.put_record(row)
+    elapsed = time.perf_counter() - start
+    engine.close_stores()
+    return elapsed / sample * count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    cwd = os.getcwd()
+    for storage in ('json', 'sqlite', 'journal'):
+        temp_dir = tempfile.mkdtemp()
+        os.chdir(temp_dir)
+        try:
+            bulk = bulk_save(storage, count)
+            for name in os.listdir(temp_dir):
+                os.remove(os.path.join(temp_dir, name))
+            # JSON逐条保存的耗时随记录数平方增长，只测前2000条，估算值偏低
+            single = single_saves(storage, count, 2000 if storage == 'json' else count)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(temp_dir)
+        print(f'{storage:7} {count} 条：批量导入 {bulk:7.2f} 秒，逐条保存 {single:9.2f} 秒'
+              f'{"（估算）" if storage == "json" else ""}，加速 {single / bulk:6.1f} 倍')
+
+
+if __name__ == '__main__':
+    main()
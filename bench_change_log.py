@@ -0,0 +1,72 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from mda_form_engine import MDAFormEngine
+from record_store import open_record_store
+
+# 变更日志基准测试：单据已有N条记录，之后有M条保存、删除时，下游同步一次的耗时：
+# 改造前重新读取整个数据文件并与上次的结果比较，改造后按偏移量只读取新增的变更
+# 用法：python bench_change_log.py [记录数] [变更数]
+
+METADATA_FILE = os.path.abspath('erp_form_metadata.xml')
+
+
+def make_row(i):
+    return {'入库单号': f'RK{i:08d}', '供应商名称': f'供应商{i % 500}', '商品名称': f'商品{i % 2000}',
+            '入库金额': str(i % 10000)}
+
+
+def diff_full_file(filename, previous):
+    """改造前的同步方式：读取整个数据文件，与上次同步时的记录比较找出变化"""
+    current = {record['id']: record for record in open_record_store(filename).get_records()}
+    changed = [record_id for record_id, record in current.items() if previous.get(record_id) != record]
+    deleted = [record_id for record_id in previous if record_id not in current]
+    return current, changed, deleted
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    changes = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    cwd = os.getcwd()
+    temp_dir = tempfile.mkdtemp()
+    os.chdir(temp_dir)
+    try:
+        engine = MDAFormEngine(METADATA_FILE, use_snapshot=False)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        ids = engine.save_records('采购管理', '采购入库', map(make_row, range(count)))
+        consumer = engine.change_consumer('采购管理', '采购入库', 'sync')
+        while consumer.poll(10000):
+            consumer.commit()
+        snapshot, _, _ = diff_full_file(filename, {})
+
+        start = time.perf_counter()
+        for i in range(changes):
+            engine.save_records('采购管理', '采购入库', [dict(make_row(i), id=ids[i], 入库金额='0')])
+        save = (time.perf_counter() - start) / changes
+
+        log = engine.get_change_log(filename)
+        start = time.perf_counter()
+        for i in range(changes):
+            log.write(lambda: (None, [{'op': 'update', 'id': ids[i], 'record': make_row(i)}]))
+        append = (time.perf_counter() - start) / changes
+
+        start = time.perf_counter()
+        _, changed, deleted = diff_full_file(filename, snapshot)
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        events = consumer.poll(changes)
+        consumer.commit()
+        incremental = time.perf_counter() - start
+        print(f'{count} 条记录、{changes} 条变更：单条保存 {save * 1000:.2f} ms，其中追加变更日志 {append * 1000:.3f} ms')
+        print(f'  重新读取数据文件比较：{full * 1000:8.2f} ms，找到 {len(changed) + len(deleted)} 条变化')
+        print(f'  按偏移量读取变更日志：{incremental * 1000:8.2f} ms，读到 {len(events)} 个事件')
+        engine.close_stores()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import Process
+from record_store import open_record_store
+
+# 并发保存压力测试：多个进程、每个进程多个线程同时向同一单据保存新记录，
+# 检查最终记录数是否等于保存次数（没有丢失的更新），并统计吞吐量和组提交的批次数
+# 用法：python bench_concurrent_saves.py [进程数] [每进程线程数] [每线程保存数]
+
+
+def make_record(process, thread, i):
+    return {'id': f'{process}-{thread}-{i}', '单号': f'RK{process:02d}{thread:02d}{i:06d}', '数量': str(i % 100)}
+
+
+def legacy_save(filename, record):
+    """改造前的保存方式：不加锁读出整个文件，追加后写回"""
+    records = []
+    if os.path.exists(filename):
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except ValueError:
+            records = []
+    records.append(record)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def worker(filename, backend, process, threads, saves, commit_window, result_file):
+    store = None if backend == 'legacy' else open_record_store(filename, backend, commit_window=commit_window)
+
+    def save_records(thread):
+        for i in range(saves):
+            record = make_record(process, thread, i)
+            if store is None:
+                legacy_save(filename, record)
+            else:
+                store.put_record(record)
+
+    pool = [threading.Thread(target=save_records, args=(thread,)) for thread in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    batches = store.committer.batches if store is not None else threads * saves
+    if store is not None:
+        store.close()
+    with open(result_file, 'w') as f:
+        f.write(str(batches))
+
+
+def run(backend, processes, threads, saves, commit_window, temp_dir):
+    """返回(最终记录数, 耗时, 批次数)"""
+    filename = os.path.join(temp_dir, f'data_{backend}_{commit_window}.json')
+    result_files = [os.path.join(temp_dir, f'result_{backend}_{p}') for p in range(processes)]
+    pool = [Process(target=worker, args=(filename, backend, p, threads, saves, commit_window, result_files[p]))
+            for p in range(processes)]
+    start = time.perf_counter()
+    for process in pool:
+        process.start()
+    for process in pool:
+        process.join()
+    elapsed = time.perf_counter() - start
+    batches = 0
+    for result_file in result_files:
+        with open(result_file) as f:
+            batches += int(f.read())
+    if backend == 'legacy':
+        with open(filename, 'r', encoding='utf-8') as f:
+            count = len(json.load(f))
+    else:
+        store = open_record_store(filename, backend)
+        count = len(store.get_records())
+        store.close()
+    return count, elapsed, batches
+
+
+def main():
+    processes, threads, saves = ([int(arg) for arg in sys.argv[1:4]] + [4, 4, 50][len(sys.argv[1:4]):])
+    expected = processes * threads * saves
+    print(f'{processes} 个进程 × {threads} 个线程 × {saves} 次保存，共 {expected} 条记录')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for backend, commit_window in (('legacy', 0), ('json', 0), ('json', 0.002), ('journal', 0), ('journal', 0.002)):
+            try:
+                count, elapsed, batches = run(backend, processes, threads, saves, commit_window, temp_dir)
+            except ValueError as e:
+                # 不加锁的写法可能读到写了一半的文件
+                print(f'{backend:8} 数据文件损坏：{e}')
+                continue
+            lost = expected - count
+            print(f'{backend:8} 窗口 {commit_window * 1000:4.1f} ms：{expected / elapsed:8.0f} 次保存/秒，'
+                  f'写入 {batches:6} 次，最终 {count} 条，丢失 {lost} 条')
+
+
+if __name__ == '__main__':
+    main()
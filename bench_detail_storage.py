@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from bench_record_store import make_record
+from mda_form_engine import MDAFormEngine
+
+# 明细行存储基准测试：每张单据带若干明细行时，打开数据列表（读取全部表头）和打开一张单据的耗时，
+# 对比明细嵌套在表头记录中（旧格式）与明细单独保存
+# 打开单据分别统计首次（明细存储尚未加载）和再次打开另一张单据的耗时
+# 用法：python bench_detail_storage.py [单据数] [每张单据的明细行数]
+
+METADATA_FILE = os.path.abspath('erp_form_metadata.xml')
+
+
+def make_document(i, lines):
+    record = make_record(i)
+    record['details'] = [{'物料编码': f'WL{i:06d}{j:03d}', '物料名称': '螺丝', '数量': '10', '单价': '0.5', '金额': '5'}
+                         for j in range(lines)]
+    return record
+
+
+def open_document(engine, filename, record_id):
+    start = time.perf_counter()
+    record = engine.get_record_by_id(filename, record_id)
+    details = engine.get_record_details(filename, record)
+    return time.perf_counter() - start, details
+
+
+def measure(storage, separate, count, lines):
+    engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage=storage)
+    filename = engine.data_filename_for('采购管理', '采购入库')
+    documents = [make_document(i, lines) for i in range(count)]
+    if separate:
+        engine.save_records('采购管理', '采购入库', documents)
+    else:
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(documents, f, ensure_ascii=False, indent=2)
+    engine.close_stores()
+    # 用新的引擎打开，模拟切换到该单据时的首次读取
+    engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage=storage)
+    engine.details_checked.add(filename)
+    start = time.perf_counter()
+    engine.get_records(filename)
+    list_time = time.perf_counter() - start
+    engine.close_stores()
+    engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage=storage)
+    first_time, details = open_document(engine, filename, documents[count // 2]['id'])
+    assert len(details) == lines
+    next_time, _ = open_document(engine, filename, documents[count // 3]['id'])
+    engine.close_stores()
+    return list_time, first_time, next_time
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    cwd = os.getcwd()
+    print(f'{count} 张单据，每张 {lines} 行明细')
+    # 明细嵌套保存只有JSON文件一种旧格式
+    for storage, separate in (('json', False), ('json', True), ('sqlite', True)):
+        temp_dir = tempfile.mkdtemp()
+        os.chdir(temp_dir)
+        try:
+            list_time, first_time, next_time = measure(storage, separate, count, lines)
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(temp_dir)
+        print(f'{storage:6} {"明细单独保存" if separate else "明细嵌套保存"}：打开数据列表 {list_time * 1000:8.1f} ms，'
+              f'首次打开单据 {first_time * 1000:8.1f} ms，再次打开 {next_time * 1000:6.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
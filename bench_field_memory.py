@@ -0,0 +1,86 @@
+import os
+import sys
+import tempfile
+import tracemalloc
+import xml.etree.ElementTree as ET
+from bench_metadata_load import generate_catalog
+from metadata_model import MetadataModel
+
+# 字段元数据内存基准测试：原先的嵌套字典 vs 紧凑的FieldSpec/FormSpec
+# 用法：python bench_field_memory.py [字段总数]
+
+
+def legacy_parse_field(field_elem):
+    """原先的字典表示，作为对比基线"""
+    field_type = field_elem.tag
+    field_info = {
+        'type': field_type,
+        'left': int(field_elem.get('Left', 10)),
+        'top': int(field_elem.get('Top', 10)),
+        'width': int(field_elem.get('Width', 200)),
+        'height': int(field_elem.get('Height', 30)),
+        'visible_ext': field_elem.get('VisibleExt', '111')
+    }
+    if field_type == 'TextField':
+        field_info['length'] = int(field_elem.get('Length', 200))
+    elif field_type == 'ComboBox':
+        field_info['options'] = [opt.text for opt in field_elem.find('Options').findall('Option')]
+    elif field_type == 'MoneyField':
+        field_info['length'] = int(field_elem.get('Length', 10))
+    validation = field_elem.find('Validation')
+    if validation is not None:
+        field_info['validation'] = {}
+        if validation.find('Required') is not None:
+            field_info['validation']['required'] = validation.find('Required').text == '1'
+        if validation.find('Number') is not None:
+            field_info['validation']['number'] = validation.find('Number').text == '1'
+    return field_info
+
+
+def legacy_parse_form(form_elem):
+    form_config = {'fields': {}}
+    for field_elem in form_elem.find('FieldList'):
+        form_config['fields'][field_elem.get('name')] = legacy_parse_field(field_elem)
+    detail_table = form_elem.find('DetailTable')
+    if detail_table is not None:
+        form_config['detail_columns'] = [
+            {'name': col.get('name'), 'width': int(col.get('width', 100)), 'type': col.get('type', 'TextField')}
+            for col in detail_table.findall('Column')
+        ]
+    return form_config
+
+
+def retained_memory(build):
+    """构建模型后仍保留的内存（不含XML树本身）"""
+    tracemalloc.start()
+    result = build()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, retained
+
+
+def main():
+    total_fields = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    field_count = 20
+    form_count = 100
+    module_count = max(1, total_fields // (field_count * form_count))
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        metadata_file = os.path.join(temp_dir, 'catalog.xml')
+        generate_catalog(metadata_file, module_count, form_count, field_count)
+        forms = ET.parse(metadata_file).getroot().iter('Form')
+        form_elems = list(forms)
+        parser = MetadataModel.__new__(MetadataModel)
+
+        legacy, legacy_bytes = retained_memory(lambda: [legacy_parse_form(f) for f in form_elems])
+        specs, spec_bytes = retained_memory(lambda: [parser.parse_form(f) for f in form_elems])
+
+        fields = sum(len(f['fields']) for f in specs)
+        print(f'合成目录：{len(form_elems)} 个单据，{fields} 个字段')
+        print(f'嵌套字典：{legacy_bytes / 1048576:.1f} MB（{legacy_bytes / fields:.0f} 字节/字段）')
+        print(f'FieldSpec：{spec_bytes / 1048576:.1f} MB（{spec_bytes / fields:.0f} 字节/字段）')
+        print(f'节省：{(1 - spec_bytes / legacy_bytes) * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+from bench_record_store import seed
+from record_index import record_matches
+from record_store import open_record_store
+
+# 二级索引基准测试：单据有N条记录时，按供应商名称相等、按入库单号前缀查找的耗时，与逐条扫描对比
+# 用法：python bench_find_records.py [记录数...]
+
+
+def average(function, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(backend, count, temp_dir):
+    filename = os.path.join(temp_dir, f'data_{backend}_{count}.json')
+    store = open_record_store(filename, backend)
+    seed(store, count)
+    records = store.get_records()
+    start = time.perf_counter()
+    store.set_indexes(['供应商名称', '入库单号'])
+    store.find_records({'供应商名称': '供应商0'})
+    build = time.perf_counter() - start
+    equal = average(lambda i: store.find_records({'入库单号': f'RK{i * 7919 % count:08d}'}), 1000)
+    prefix = average(lambda i: store.find_records(prefixes={'入库单号': f'RK{i * 7919 % count:08d}'[:-1]}), 1000)
+    scan = average(lambda i: [r for r in records if record_matches(r, {'入库单号': f'RK{i:08d}'}, {})], 3)
+    store.close()
+    return build, equal, prefix, scan
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for backend in ('json', 'sqlite', 'journal'):
+            for count in counts:
+                build, equal, prefix, scan = measure(backend, count, temp_dir)
+                print(f'{backend:7} {count:>8} 条记录：建索引 {build:6.2f} 秒，相等查找 {equal * 1000:7.3f} ms，'
+                      f'前缀查找 {prefix * 1000:7.3f} ms，逐条扫描 {scan * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import sys
+import timeit
+from form_validator import compile_form_validator
+from metadata_model import FieldSpec, ValidationSpec
+
+# 表单验证基准测试：原先每次验证都查验证字典、匹配字段名 vs 编译好的验证流水线
+# 用法：python bench_form_validation.py [字段数]
+
+
+def legacy_custom_validation(field_name, value, field_info):
+    """原先的自定义验证，作为对比基线"""
+    if '邮箱' in field_name or 'email' in field_name.lower():
+        if value and '@' not in value:
+            return f'{field_name} 格式不正确，必须包含 @ 符号'
+    if '手机' in field_name or 'phone' in field_name.lower():
+        if value and (len(value) != 11 or not value.isdigit()):
+            return f'{field_name} 格式不正确，必须是11位数字'
+    return None
+
+
+def legacy_validate(visible_fields, values):
+    """原先validate_form中的逐字段验证逻辑"""
+    errors = []
+    for field_name, field_info in visible_fields:
+        if field_name not in values:
+            continue
+        value = values[field_name]
+        validation = field_info.get('validation', {})
+        if validation.get('required'):
+            if not value:
+                errors.append(f'{field_name} 不能为空')
+        if validation.get('number'):
+            if value:
+                try:
+                    float(value)
+                except ValueError:
+                    errors.append(f'{field_name} 必须是数字')
+        if field_info.get('length'):
+            max_length = field_info['length']
+            if len(value) > max_length:
+                errors.append(f'{field_name} 长度不能超过 {max_length} 个字符')
+        custom_error = legacy_custom_validation(field_name, value, field_info)
+        if custom_error:
+            errors.append(custom_error)
+    return errors
+
+
+def generate_fields(field_count):
+    """生成合成表单：文本、金额、下拉、邮箱、手机字段交替出现"""
+    fields = {}
+    values = {}
+    for i in range(field_count):
+        kind = i % 5
+        if kind == 0:
+            fields[f'文本{i}'] = FieldSpec('TextField', length=200, validation=ValidationSpec(required=True))
+            values[f'文本{i}'] = '内容'
+        elif kind == 1:
+            fields[f'金额{i}'] = FieldSpec('MoneyField', length=10, validation=ValidationSpec(required=True, number=True))
+            values[f'金额{i}'] = '123.45'
+        elif kind == 2:
+            fields[f'下拉{i}'] = FieldSpec('ComboBox', options=['是', '否'])
+            values[f'下拉{i}'] = '是'
+        elif kind == 3:
+            fields[f'邮箱{i}'] = FieldSpec('TextField', length=100)
+            values[f'邮箱{i}'] = 'user@example.com'
+        else:
+            fields[f'手机{i}'] = FieldSpec('TextField', length=20)
+            values[f'手机{i}'] = '13800138000'
+    return fields, values
+
+
+def main():
+    field_count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    fields, values = generate_fields(field_count)
+    visible_fields = list(fields.items())
+    validator = compile_form_validator(visible_fields)
+    assert validator.validate(values) == legacy_validate(visible_fields, values)
+
+    number = 200
+    compile_time = min(timeit.repeat(lambda: compile_form_validator(visible_fields), number=20, repeat=5)) / 20
+    legacy = min(timeit.repeat(lambda: legacy_validate(visible_fields, values), number=number, repeat=5)) / number
+    compiled = min(timeit.repeat(lambda: validator.validate(values), number=number, repeat=5)) / number
+    print(f'合成表单：{field_count} 个字段')
+    print(f'编译验证流水线（每次切换表单一次）：{compile_time * 1000:.2f} ms')
+    print(f'原先逐字段验证：{legacy * 1000:.3f} ms/次')
+    print(f'编译后的流水线：{compiled * 1000:.3f} ms/次')
+    print(f'加速比：{legacy / compiled:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
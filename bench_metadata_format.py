@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+from bench_metadata_load import generate_catalog, best_of
+from convert_metadata import convert_metadata
+from mda_form_engine import MDAFormEngine
+
+# 元数据格式基准测试：XML与紧凑格式（JSON）的加载耗时和文件大小
+# 用法：python bench_metadata_format.py [模块数] [每模块单据数] [每单据字段数]
+
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:4]]
+    module_count, form_count, field_count = (args + [20, 100, 20][len(args):])[:3]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = os.path.join(temp_dir, 'catalog.xml')
+        compact_file = os.path.join(temp_dir, 'catalog.json')
+        generate_catalog(xml_file, module_count, form_count, field_count)
+        convert_metadata(xml_file, compact_file)
+        print(f'元数据目录：{module_count} 个模块 × {form_count} 个单据 × {field_count} 个字段')
+        print(f'文件大小：XML {os.path.getsize(xml_file) / 1024:.0f} KB，'
+              f'紧凑格式 {os.path.getsize(compact_file) / 1024:.0f} KB')
+
+        xml = best_of(lambda: MDAFormEngine(xml_file, use_snapshot=False))
+        compact = best_of(lambda: MDAFormEngine(compact_file))
+        print(f'XML（不使用快照）：{xml * 1000:.1f} ms')
+        print(f'紧凑格式：{compact * 1000:.1f} ms')
+        print(f'加速比：{xml / compact:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from mda_form_engine import MDAFormEngine
+
+# 元数据加载基准测试：冷启动解析XML、热启动加载快照、懒加载表单索引、流式解析峰值内存、多文件并行解析
+# 用法：python bench_metadata_load.py [模块数] [每模块单据数] [每单据字段数]
+
+
+def generate_catalog(filename, module_count=20, form_count=100, field_count=20, first_module=0):
+    """生成合成的元数据目录"""
+    root = ET.Element('FormMetadata')
+    modules_elem = ET.SubElement(root, 'Modules')
+    for m in range(first_module, first_module + module_count):
+        module_elem = ET.SubElement(modules_elem, 'Module')
+        module_elem.set('name', f'模块{m}')
+        forms_elem = ET.SubElement(module_elem, 'Forms')
+        for f in range(form_count):
+            form_elem = ET.SubElement(forms_elem, 'Form')
+            form_elem.set('name', f'单据{f}')
+            field_list = ET.SubElement(form_elem, 'FieldList')
+            for i in range(field_count):
+                if i % 3 == 0:
+                    field_elem = ET.SubElement(field_list, 'TextField')
+                    field_elem.set('Length', '200')
+                elif i % 3 == 1:
+                    field_elem = ET.SubElement(field_list, 'MoneyField')
+                    field_elem.set('Length', '10')
+                else:
+                    field_elem = ET.SubElement(field_list, 'ComboBox')
+                    options_elem = ET.SubElement(field_elem, 'Options')
+                    ET.SubElement(options_elem, 'Option').text = '选项1'
+                    ET.SubElement(options_elem, 'Option').text = '选项2'
+                field_elem.set('name', f'字段{i}')
+                field_elem.set('Left', '10')
+                field_elem.set('Top', str(10 + i * 40))
+                field_elem.set('Width', '200')
+                field_elem.set('Height', '30')
+                field_elem.set('VisibleExt', '111' if i % 4 else '100')
+                if i % 5 == 0:
+                    validation = ET.SubElement(field_elem, 'Validation')
+                    ET.SubElement(validation, 'Required').text = '1'
+            detail_table = ET.SubElement(form_elem, 'DetailTable')
+            for col_name in ['物料编码', '物料名称', '数量', '单价', '金额']:
+                column_elem = ET.SubElement(detail_table, 'Column')
+                column_elem.set('name', col_name)
+                column_elem.set('width', '100')
+                column_elem.set('type', 'TextField')
+    ET.ElementTree(root).write(filename, encoding='UTF-8', xml_declaration=True)
+
+
+def best_of(func, repeat=5):
+    """多次运行取最短耗时"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def parse_overhead(func):
+    """返回解析过程的峰值内存减去最终保留的内存，即解析本身的额外开销"""
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak - retained
+
+
+def main():
+    args = [int(arg) for arg in sys.argv[1:4]]
+    module_count, form_count, field_count = (args + [20, 100, 20][len(args):])[:3]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        metadata_file = os.path.join(temp_dir, 'catalog.xml')
+        generate_catalog(metadata_file, module_count, form_count, field_count)
+        size_kb = os.path.getsize(metadata_file) / 1024
+        print(f'元数据目录：{module_count} 个模块 × {form_count} 个单据 × {field_count} 个字段（{size_kb:.0f} KB）')
+
+        cold = best_of(lambda: MDAFormEngine(metadata_file, use_snapshot=False))
+        # 先生成一次快照，之后的启动都命中快照
+        MDAFormEngine(metadata_file)
+        warm = best_of(lambda: MDAFormEngine(metadata_file))
+        lazy = best_of(lambda: MDAFormEngine(metadata_file, lazy=True))
+
+        print(f'冷启动（解析XML）：{cold * 1000:.1f} ms')
+        print(f'热启动（加载快照）：{warm * 1000:.1f} ms')
+        print(f'加速比：{cold / warm:.1f}x')
+        print(f'懒加载（只建表单索引）：{lazy * 1000:.1f} ms')
+
+        # 文件大小翻倍时，完整解析的额外内存随之翻倍，流式解析保持不变
+        for scale in (1, 2):
+            generate_catalog(metadata_file, module_count * scale, form_count, field_count)
+            full = parse_overhead(lambda: MDAFormEngine(metadata_file, use_snapshot=False))
+            streaming = parse_overhead(lambda: MDAFormEngine(metadata_file, use_snapshot=False, streaming=True))
+            print(f'{module_count * scale} 个模块：完整解析额外内存 {full / 1048576:.1f} MB，'
+                  f'流式解析额外内存 {streaming / 1048576:.1f} MB')
+
+        # 按模块拆分为多个文件，比较单进程与进程池解析
+        catalog_dir = os.path.join(temp_dir, 'catalog')
+        os.mkdir(catalog_dir)
+        for m in range(module_count):
+            generate_catalog(os.path.join(catalog_dir, f'module{m:03d}.xml'), 1, form_count, field_count, first_module=m)
+        serial = best_of(lambda: MDAFormEngine(catalog_dir, use_snapshot=False, workers=1), repeat=3)
+        parallel = best_of(lambda: MDAFormEngine(catalog_dir, use_snapshot=False), repeat=3)
+        print(f'多文件目录（{module_count} 个文件）：单进程 {serial * 1000:.1f} ms，'
+              f'{os.cpu_count()} 核并行 {parallel * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from record_history import RecordHistory
+
+# 版本历史基准测试：N条记录（含明细行）各修改K次、每次改一个字段时，
+# 差异加定期完整版本的历史文件大小与每个版本保存完整内容对比，以及保存一个版本、读取任一历史版本的耗时
+# 用法：python bench_record_history.py [记录数] [修改次数]
+
+
+def make_record(i):
+    return {'id': f'R{i:08d}', '入库单号': f'RK{i:08d}', '供应商名称': f'供应商{i % 500}', '入库金额': '100',
+            'created_at': '2026-01-01 12:00:00',
+            'details': [{'物料编码': f'WL{i * 10 + j:08d}', '物料名称': '螺丝', '数量': '10', '单价': '0.5'}
+                        for j in range(10)]}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        history = RecordHistory(os.path.join(temp_dir, 'data.history.jsonl'))
+        records = [make_record(i) for i in range(count)]
+        history.append([(record['id'], record) for record in records])
+        full_size = sum(len(json.dumps(record, ensure_ascii=False).encode('utf-8')) for record in records)
+        start = time.perf_counter()
+        for edit in range(edits):
+            for record in records:
+                record['入库金额'] = str(rng.randint(1, 10000))
+            history.append([(record['id'], dict(record)) for record in records])
+        append = (time.perf_counter() - start) / (edits * count)
+        full_size *= edits + 1
+        size = os.path.getsize(history.filename)
+        start = time.perf_counter()
+        for _ in range(1000):
+            history.get_record_as_of(records[rng.randrange(count)]['id'], rng.randint(1, edits + 1))
+        read = (time.perf_counter() - start) / 1000
+        print(f'{count} 条记录各 {edits + 1} 个版本：每个版本保存完整内容 {full_size / 1024 / 1024:.1f} MB，'
+              f'差异加每{history.snapshot_interval}个版本一次完整内容 {size / 1024 / 1024:.1f} MB')
+        print(f'  保存一个版本 {append * 1000:.3f} ms，读取任一历史版本 {read * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from record_store import open_record_store
+
+# 记录存储基准测试：单据已有N条记录时，按ID读取、保存、删除单条记录的耗时
+# 用法：python bench_record_store.py [已有记录数...]
+
+
+def make_record(i):
+    """合成的采购入库记录"""
+    return {
+        'id': f'{1700000000 + i}{i % 9000 + 1000}',
+        '入库单号': f'RK{i:08d}',
+        '供应商名称': f'供应商{i % 500}',
+        '商品名称': f'商品{i % 2000}',
+        '数量': str(i % 100),
+        'created_at': '2026-01-01 12:00:00',
+        'details': [{'物料编码': f'WL{i:06d}', '物料名称': '螺丝', '数量': '10', '单价': '0.5', '金额': '5'}]
+    }
+
+
+def seed(store, count):
+    """批量写入初始记录（不计时）"""
+    if hasattr(store, 'journal_file'):
+        with open(store.journal_file, 'wb') as f:
+            store.write_checkpoint(f, [make_record(i) for i in range(count)])
+    elif hasattr(store, 'connection'):
+        with store.connection:
+            store.connection.executemany(
+                f'INSERT INTO {store.table} (id, data) VALUES (?, ?)',
+                [(record['id'], json.dumps(record, ensure_ascii=False))
+                 for record in map(make_record, range(count))])
+    else:
+        store.write_records([make_record(i) for i in range(count)])
+
+
+def measure(backend, count, temp_dir, repeat=20):
+    """返回按ID读取、单条保存和单条删除的平均耗时"""
+    filename = os.path.join(temp_dir, f'data_{backend}_{count}.json')
+    store = open_record_store(filename, backend)
+    seed(store, count)
+    # 首次加载（读取文件、重放日志）不计入单条保存的耗时
+    store.get_records()
+    start = time.perf_counter()
+    for i in range(0, count, max(1, count // 1000)):
+        store.get_record(make_record(i)['id'])
+    lookup = (time.perf_counter() - start) / len(range(0, count, max(1, count // 1000)))
+    repeat = repeat if backend != 'json' or count <= 10000 else 3
+    start = time.perf_counter()
+    for i in range(repeat):
+        store.put_record(make_record(count + i))
+    save = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for i in range(repeat):
+        store.delete_record(make_record(count + i)['id'])
+    delete = (time.perf_counter() - start) / repeat
+    store.close()
+    return lookup, save, delete
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for backend in ('json', 'sqlite', 'journal'):
+            for count in counts:
+                lookup, save, delete = measure(backend, count, temp_dir)
+                print(f'{backend:7} {count:>8} 条记录：读取 {lookup * 1000:6.3f} ms/条，'
+                      f'保存 {save * 1000:8.2f} ms/条，删除 {delete * 1000:8.2f} ms/条')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import os
+import random
+import sys
+import tempfile
+import time
+from fulltext_index import FullTextIndex, record_text
+
+# 全文检索基准测试：单据有N条记录（含明细行）时，建立索引、加载索引、检索和增量更新的耗时，与逐条查找子串对比
+# 用法：python bench_search_records.py [记录数...]
+
+CITIES = ['深圳', '上海', '北京', '杭州', '苏州', '成都', '武汉', '广州', '天津', '重庆', '南京', '宁波']
+WORDS = ['华为', '中兴', '精密', '五金', '电子', '机械', '科技', '新材料', '物流', '包装', '化工', '光电',
+         '塑胶', '模具', '自动化', '信息', '贸易', '汽车', '配件', '能源', '环保', '医疗', '仪器', '纺织']
+MATERIALS = ['六角螺丝', '螺母', '垫片', '轴承', '电阻', '电容', '铜线', '铝板', '不锈钢管', '纸箱', '标签',
+             '胶带', '弹簧', '齿轮', '电机', '传感器', '继电器', '开关', '插座', '线缆']
+
+
+def make_text(i, rng):
+    supplier = rng.choice(CITIES) + rng.choice(WORDS) + rng.choice(WORDS) + '有限公司'
+    record = {'入库单号': f'RK{i:08d}', '供应商名称': supplier, '备注': f'第{i % 97}批'}
+    details = [{'物料名称': rng.choice(MATERIALS), '规格': f'M{rng.randint(2, 30)}'} for _ in range(3)]
+    return record_text(record, details)
+
+
+def average(function, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def measure(count, temp_dir):
+    rng = random.Random(count)
+    texts = [make_text(i, rng) for i in range(count)]
+    path = os.path.join(temp_dir, f'data_{count}.search')
+    index = FullTextIndex(path)
+    start = time.perf_counter()
+    index.rebuild((str(i), text) for i, text in enumerate(texts))
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    FullTextIndex(path).refresh()
+    load = time.perf_counter() - start
+    print(f'{count:>8} 条记录：建立索引 {build:6.2f} 秒，索引文件 {os.path.getsize(path) / 1024 / 1024:6.1f} MB，'
+          f'加载 {load:5.2f} 秒')
+    for query in ('RK00001234', '杭州光电', '华为 轴承', '苏州模具 传感器 M12'):
+        ranked = average(lambda i: index.search(query), 20)
+        hits = len(index.search(query, limit=count))
+        terms = query.split()
+        scan = average(lambda i: [n for n, text in enumerate(texts) if all(term in text for term in terms)], 1)
+        print(f'  检索"{query}"：{hits:>7} 条匹配，前20条 {ranked * 1000:8.2f} ms，逐条查找子串 {scan * 1000:8.2f} ms')
+    update = average(lambda i: index.update([(str(i), make_text(i, rng))]), 200)
+    print(f'  增量更新一条记录 {update * 1000:6.3f} ms')
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for count in counts:
+            measure(count, temp_dir)
+
+
+if __name__ == '__main__':
+    main()
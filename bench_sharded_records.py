@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import time
+from bench_record_store import make_record
+from record_store import open_record_store
+
+# 按月分片基准测试：单据积累了若干年的历史数据后，重新打开单据查看最近50条记录、
+# 查询一个月的记录、保存一条新记录的耗时，对比单个JSON文件与按月分片
+# 用法：python bench_sharded_records.py [年数] [每月记录数]
+
+
+def history(years, per_month):
+    """按月份生成历史记录，最后一个月为当前月份"""
+    now = time.localtime()
+    records = []
+    for offset in range(years * 12 - 1, -1, -1):
+        year, month = divmod(now.tm_year * 12 + now.tm_mon - 1 - offset, 12)
+        for i in range(per_month):
+            record = make_record(len(records))
+            record['created_at'] = f'{year:04d}-{month + 1:02d}-{i % 28 + 1:02d} 09:00:00'
+            records.append(record)
+    return records
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def measure(backend, records, temp_dir):
+    filename = os.path.join(temp_dir, f'data_{backend}.json')
+    store = open_record_store(filename, backend)
+    store.put_records(records)
+    store.close()
+    this_month = time.strftime('%Y-%m')
+    # 每项操作都重新打开单据，模拟切换到该单据时的首次访问
+    recent, _ = timed(lambda: open_record_store(filename, backend).get_recent_records(50))
+    month, _ = timed(lambda: open_record_store(filename, backend).get_records_between(this_month))
+    new_record = make_record(len(records))
+    new_record['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    save, _ = timed(lambda: open_record_store(filename, backend).put_record(new_record))
+    return recent, month, save
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    per_month = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    records = history(years, per_month)
+    print(f'{years} 年历史数据，每月 {per_month} 条，共 {len(records)} 条')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for backend in ('json', 'sharded'):
+            recent, month, save = measure(backend, records, temp_dir)
+            print(f'{backend:8} 最近50条 {recent * 1000:8.1f} ms，本月记录 {month * 1000:8.1f} ms，'
+                  f'保存一条 {save * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
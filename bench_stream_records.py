@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from bench_record_store import make_record
+
+# 流式读取基准测试：遍历一个大的旧JSON数据文件，对比json.load整体读取与流式逐条读取的耗时和进程内存峰值
+# 生成文件和每种读取方式都在单独的子进程中运行（Linux上内存峰值会从父进程继承），分别统计内存峰值
+# 用法：python bench_stream_records.py [记录数]
+
+
+def run(mode, filename):
+    """子进程：遍历文件中的全部记录，输出耗时和内存峰值（MB）"""
+    import resource
+    from json_stream import iter_json_array
+    start = time.perf_counter()
+    count = 0
+    if mode == 'load':
+        with open(filename, 'r', encoding='utf-8') as f:
+            for record in json.load(f):
+                count += 1
+    else:
+        for record in iter_json_array(filename):
+            count += 1
+    elapsed = time.perf_counter() - start
+    # Linux上ru_maxrss单位为KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{count} {elapsed} {peak}')
+
+
+def generate(filename, count):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump([make_record(i) for i in range(count)], f, ensure_ascii=False, indent=2)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run(sys.argv[2], sys.argv[3])
+        return
+    if len(sys.argv) > 2 and sys.argv[1] == '--generate':
+        generate(sys.argv[2], int(sys.argv[3]))
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'data_采购管理_采购入库.json')
+        subprocess.run([sys.executable, __file__, '--generate', filename, str(count)], check=True)
+        size = os.path.getsize(filename) / 1024 / 1024
+        print(f'{count} 条记录，数据文件 {size:.0f} MB')
+        for mode, label in (('load', 'json.load整体读取'), ('stream', '流式逐条读取')):
+            output = subprocess.run([sys.executable, __file__, '--run', mode, filename],
+                                    capture_output=True, text=True, check=True).stdout.split()
+            print(f'{label:14} 遍历 {float(output[1]):6.2f} 秒，内存峰值 {float(output[2]):7.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
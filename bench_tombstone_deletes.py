@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import time
+from bench_record_store import make_record
+from record_store import JsonRecordStore
+
+# 墓碑删除基准测试：JSON数据文件有N条记录时删除K条，对比改造前每次删除都重写整个文件、
+# 改造后逐条删除只追加墓碑、批量删除整批追加一次墓碑，以及整理（vacuum）一次的耗时
+# 改造前的写法只测前若干条后按平均耗时估算
+# 用法：python bench_tombstone_deletes.py [记录数] [删除数]
+
+
+def seed(filename, count):
+    store = JsonRecordStore(filename)
+    store.write_records(make_record(i) for i in range(count))
+    return [make_record(i)['id'] for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    deletes = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = os.path.join(temp_dir, 'data.json')
+        ids = seed(filename, count)
+        store = JsonRecordStore(filename, background=False, min_tombstones=deletes + 1)
+        store.load()
+        sample = min(deletes, 5)
+        start = time.perf_counter()
+        for record_id in ids[:sample]:
+            # 改造前：删除后整体重写数据文件
+            records = store.load()
+            store.apply(records, ('del', record_id))
+            store.write_records(records.values())
+        rewrite = (time.perf_counter() - start) / sample * deletes
+
+        ids = seed(filename, count)
+        store = JsonRecordStore(filename, background=False, min_tombstones=deletes + 1)
+        store.load()
+        start = time.perf_counter()
+        for record_id in ids[:deletes]:
+            store.delete_record(record_id)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        store.delete_records(ids[deletes:deletes * 2])
+        bulk = time.perf_counter() - start
+        start = time.perf_counter()
+        store.vacuum()
+        vacuum = time.perf_counter() - start
+        print(f'{count} 条记录中删除 {deletes} 条：每次重写文件（估算） {rewrite:8.2f} 秒，'
+              f'逐条追加墓碑 {single:6.3f} 秒，批量删除 {bulk * 1000:7.2f} ms，整理一次 {vacuum:5.2f} 秒')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+import json
+import os
+import time
+from write_coordinator import FileLock, atomic_write, lock_file_for
+
+# 变更日志（CDC）：单据的每次保存、删除按发生顺序追加到data_{模块}_{单据}.changes.jsonl，
+# 每行一个事件{"seq": 序号, "op": "insert"/"update"/"delete", "id": 记录ID, "ts": 时间戳, "record": 保存的记录}，
+# 序号从1开始连续递增。写入存储和追加日志在日志的文件锁内完成，多个进程同时保存时日志顺序与存储的写入顺序一致。
+# 下游按保存的偏移量（序号和文件位置）继续读取，每次同步的工作量只与新增的变更有关
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def change_log_file_for(filename):
+    """data_采购管理_采购订单.json对应的变更日志data_采购管理_采购订单.changes.jsonl"""
+    return os.path.splitext(filename)[0] + '.changes.jsonl'
+
+
+def change_event(op, record_id, record=None):
+    """一个变更事件（序号在追加时分配）"""
+    event = {'op': op, 'id': record_id}
+    if record is not None:
+        event['record'] = record
+    return event
+
+
+class ChangeLog:
+    """一个单据的变更日志"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock_file = lock_file_for(filename)
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.filename)
+        except FileNotFoundError:
+            return 0
+
+    def last_sequence(self):
+        """日志中最后一个事件的序号（调用方持有文件锁）；最后一行不完整（写入时进程中断）时截掉"""
+        try:
+            f = open(self.filename, 'rb+')
+        except FileNotFoundError:
+            return 0
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            # 从文件末尾向前按块查找最后两个换行符之间的完整行
+            tail = b''
+            position = size
+            while position > 0:
+                step = min(READ_CHUNK_SIZE, position)
+                position -= step
+                f.seek(position)
+                tail = f.read(step) + tail
+                if tail.count(b'\n') >= 2 or (position == 0 and b'\n' in tail):
+                    break
+            end = tail.rfind(b'\n') + 1
+            if position + end < size:
+                f.truncate(position + end)
+            lines = tail[:end].splitlines()
+            if not lines:
+                return 0
+            return json.loads(lines[-1])['seq']
+
+    def write(self, operation):
+        """在日志的文件锁内执行operation()写入存储，把它返回的变更事件依次编号后追加到日志，返回operation的结果
+
+        operation返回(结果, 变更事件列表)
+        """
+        with FileLock(self.lock_file):
+            result, events = operation()
+            if events:
+                sequence = self.last_sequence()
+                timestamp = time.time()
+                data = bytearray()
+                for event in events:
+                    sequence += 1
+                    event = dict(event, seq=sequence, ts=timestamp)
+                    data += (json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+                with open(self.filename, 'ab') as f:
+                    f.write(data)
+        return result
+
+    def iter_events(self, position=0):
+        """从文件位置position开始逐个产出(事件, 下一个事件的文件位置)"""
+        try:
+            f = open(self.filename, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(position)
+            while True:
+                line = f.readline()
+                # 没有换行符的最后一行正在写入，留到下次读取
+                if not line.endswith(b'\n'):
+                    return
+                position += len(line)
+                if line.strip():
+                    yield json.loads(line), position
+
+    def read(self, position=0, limit=None):
+        """从文件位置position开始读取完整的事件，最多limit个，返回(事件列表, 下一个事件的文件位置)"""
+        events = []
+        for event, next_position in self.iter_events(position):
+            if limit is not None and len(events) >= limit:
+                break
+            events.append(event)
+            position = next_position
+        return events, position
+
+    def read_after(self, sequence, limit=None):
+        """读取序号大于sequence的事件（从头扫描，不知道文件位置时使用），返回(事件列表, 下一个事件的文件位置)"""
+        position = 0
+        for event, next_position in self.iter_events():
+            if event['seq'] > sequence:
+                break
+            position = next_position
+        return self.read(position, limit)
+
+
+class ChangeConsumer:
+    """变更日志的消费者：poll()取出尚未处理的事件，处理完后commit()保存偏移量，重启后从保存的偏移量继续"""
+
+    def __init__(self, change_log, offset_file):
+        self.change_log = change_log
+        self.offset_file = offset_file
+        # 已提交的偏移量：最后处理的事件序号和下一个事件的文件位置
+        self.sequence = 0
+        self.position = 0
+        if os.path.exists(offset_file):
+            with open(offset_file, 'r', encoding='utf-8') as f:
+                offset = json.load(f)
+            self.sequence = offset['sequence']
+            self.position = offset['position']
+        self.pending = None
+
+    def poll(self, limit=1000):
+        """读取已提交偏移量之后的事件，最多limit个；未提交时重复调用返回同样的事件"""
+        try:
+            events, position = self.change_log.read(self.position, limit)
+        except ValueError:
+            # 文件位置落在某一行中间
+            events, position = None, None
+        if events:
+            mismatched = events[0].get('seq') != self.sequence + 1
+        else:
+            mismatched = events is None or self.position > self.change_log.size()
+        if mismatched:
+            # 文件位置与序号对不上（日志被替换或截短过），按序号重新定位
+            events, position = self.change_log.read_after(self.sequence, limit)
+        if events:
+            self.pending = (events[-1]['seq'], position)
+        return events
+
+    def commit(self):
+        """确认poll()取出的事件已处理，保存偏移量"""
+        if self.pending is None:
+            return
+        self.sequence, self.position = self.pending
+        self.pending = None
+        offset = {'sequence': self.sequence, 'position': self.position}
+        atomic_write(self.offset_file, json.dumps(offset).encode('utf-8'))
@@ -0,0 +1,32 @@
+import sys
+import multiprocessing
+from metadata_model import MetadataModel
+
+# 元数据格式转换：XML与紧凑格式（JSON）互相转换，按目标文件扩展名选择格式
+# 用法：python convert_metadata.py erp_form_metadata.xml erp_form_metadata.json
+#       python convert_metadata.py erp_form_metadata.json erp_form_metadata.xml
+
+
+def convert_metadata(source_file, target_file):
+    """转换元数据文件格式，源文件可以是XML、紧凑格式或多文件目录"""
+    model = MetadataModel(source_file, use_snapshot=False)
+    if target_file.endswith('.xml'):
+        model.save_xml(target_file)
+    else:
+        model.save_compact(target_file)
+    return model
+
+
+def main():
+    if len(sys.argv) != 3:
+        print('用法：python convert_metadata.py 源文件 目标文件（.xml或.json）')
+        sys.exit(1)
+    model = convert_metadata(sys.argv[1], sys.argv[2])
+    form_count = sum(len(forms) for forms in model.modules.values())
+    print(f'已转换 {len(model.modules)} 个模块、{form_count} 个单据：{sys.argv[1]} -> {sys.argv[2]}')
+
+
+if __name__ == '__main__':
+    # 打包为exe后，多文件元数据并行解析的子进程在这里执行解析任务后退出，不会再次启动程序
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,352 @@
+import gc
+import json
+import math
+import os
+import pickle
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import nlargest
+from write_coordinator import FileLock, atomic_write, lock_file_for
+
+# 全文检索索引：记录的文本按字符二元组（bigram）切分建立倒排索引，中文不需要分词即可按部分名称查找。
+# 索引保存在数据文件旁：data_{模块}_{单据}.search为索引快照，.search.log为快照之后的增量修改（每行一个操作），
+# 增量修改超过阈值时重写快照并清空日志；多个进程通过锁文件互斥写入，读取时重放其他进程追加的日志
+
+INDEX_VERSION = 1
+# BM25排序参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 不参与检索的字段
+SKIP_FIELDS = ('id', 'created_at')
+# 候选数乘以该值仍小于倒排表长度时，求交集改为逐个二分查找
+INTERSECT_RATIO = 32
+# 整词：连续的英文字母和数字
+WORD_PATTERN = re.compile(r'[a-z0-9]{3,}')
+
+
+def search_file_for(filename):
+    """data_采购管理_采购订单.json对应的索引文件data_采购管理_采购订单.search"""
+    return os.path.splitext(filename)[0] + '.search'
+
+
+def tokenize(text):
+    """把文本切分为检索词：全角转半角、转小写后，连续的文字和数字按字符二元组切分，单个字符保留为一元"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    terms = []
+    run = []
+    for char in text + ' ':
+        if char.isalnum():
+            run.append(char)
+            continue
+        if len(run) == 1:
+            terms.append(run[0])
+        else:
+            terms.extend(run[i] + run[i + 1] for i in range(len(run) - 1))
+        run = []
+    return terms
+
+
+def word_terms(text):
+    """英文字母和数字组成的整词（至少3个字符），如单号、物料编码，用于提高完全匹配的相关度"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    return WORD_PATTERN.findall(text)
+
+
+def contains(posting, doc):
+    position = bisect_left(posting, doc)
+    return position < len(posting) and posting[position] == doc
+
+
+def load_snapshot(filename):
+    """读取索引快照；其中有大量小对象，读取期间暂停垃圾回收以免反复扫描"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def record_text(record, details=None):
+    """记录中参与检索的文本：表头字段和明细行中的文本、数字"""
+    values = [value for key, value in record.items() if key not in SKIP_FIELDS and key != 'details']
+    for row in details or ():
+        values.extend(row.values())
+    return ' '.join(str(value) for value in values if isinstance(value, (str, int, float)))
+
+
+class FullTextIndex:
+    """一个单据的全文检索索引"""
+
+    def __init__(self, path, checkpoint_entries=10000):
+        self.snapshot_file = path
+        self.log_file = path + '.log'
+        self.lock_file = lock_file_for(path)
+        # 日志行数超过checkpoint_entries且超过文档数的十分之一时重写快照
+        self.checkpoint_entries = checkpoint_entries
+        self.reset()
+        self.snapshot_state = None
+        self.log_offset = 0
+        self.log_entries = 0
+
+    def reset(self):
+        # 二元组 -> 文档编号数组（升序，同一文档出现几次就重复几次，即词频）
+        self.postings = {}
+        # 整词 -> 文档编号列表，格式同上；整词大多只出现在一条记录中，用列表比数组加载快
+        self.words = {}
+        # 文档编号 -> 记录ID，已删除或已被更新替换的文档为None
+        self.doc_ids = []
+        self.doc_lengths = array('I')
+        # 记录ID -> 文档编号
+        self.doc_numbers = {}
+        self.total_length = 0
+        # 字符 -> 包含该字符的二元组，单个字符的查询词用它找倒排表；首次单字查询时按词表建立
+        self.char_terms = None
+        # 二元组、整词 -> 倒排表中不同的文档编号数（含已删除的文档），首次检索该词时统计，之后随添加文档更新
+        self.term_counts = {}
+        self.word_counts = {}
+        # 已删除或已被更新替换、尚未在重新编号时清除的文档编号
+        self.dead_docs = []
+
+    def exists(self):
+        return os.path.exists(self.snapshot_file) or os.path.exists(self.log_file)
+
+    def get_file_state(self, filename):
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def refresh(self):
+        """快照变化时重新加载，再重放日志中尚未应用的部分"""
+        snapshot_state = self.get_file_state(self.snapshot_file)
+        if snapshot_state != self.snapshot_state:
+            self.reset()
+            if snapshot_state is not None:
+                data = load_snapshot(self.snapshot_file)
+                if data.get('version') == INDEX_VERSION:
+                    self.postings = data['postings']
+                    self.words = data['words']
+                    self.doc_ids = data['doc_ids']
+                    self.doc_lengths = data['doc_lengths']
+                    self.total_length = data['total_length']
+                    self.doc_numbers = {record_id: doc for doc, record_id in enumerate(self.doc_ids)
+                                        if record_id is not None}
+                    self.dead_docs = [doc for doc, record_id in enumerate(self.doc_ids) if record_id is None]
+            self.snapshot_state = snapshot_state
+            self.log_offset = 0
+            self.log_entries = 0
+        try:
+            size = os.path.getsize(self.log_file)
+        except FileNotFoundError:
+            size = 0
+        if size < self.log_offset:
+            # 日志已被其他进程清空（重写了快照），从快照重新加载
+            self.snapshot_state = None
+            self.refresh()
+            return
+        if size == self.log_offset:
+            return
+        with open(self.log_file, 'rb') as f:
+            f.seek(self.log_offset)
+            data = f.read()
+        # 只处理完整的行，写到一半的最后一行留到下次
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.apply(json.loads(line))
+                self.log_entries += 1
+        self.log_offset += end
+
+    def apply(self, entry):
+        """应用一条日志：{"op":"put","id":...,"text":...}或{"op":"del","id":...}"""
+        self.remove(entry['id'])
+        if entry['op'] == 'put':
+            self.add(entry['id'], entry['text'])
+
+    def add(self, record_id, text):
+        doc = len(self.doc_ids)
+        terms = tokenize(text)
+        words = word_terms(text)
+        self.doc_ids.append(record_id)
+        self.doc_lengths.append(len(terms) + len(words))
+        self.doc_numbers[record_id] = doc
+        self.total_length += len(terms) + len(words)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = array('I')
+                if self.char_terms is not None:
+                    self.add_char_terms(term)
+            elif posting[-1] != doc and term in self.term_counts:
+                self.term_counts[term] += 1
+            posting.append(doc)
+        for word in words:
+            posting = self.words.get(word)
+            if posting is None:
+                posting = self.words[word] = []
+            elif posting[-1] != doc and word in self.word_counts:
+                self.word_counts[word] += 1
+            posting.append(doc)
+
+    def remove(self, record_id):
+        doc = self.doc_numbers.pop(record_id, None)
+        if doc is not None:
+            # 倒排表中的旧编号保留，检索时跳过，重写快照时清除
+            self.doc_ids[doc] = None
+            self.total_length -= self.doc_lengths[doc]
+            self.dead_docs.append(doc)
+
+    def write(self, entries):
+        """追加一批修改到日志并应用到内存中的索引"""
+        with FileLock(self.lock_file):
+            self.refresh()
+            data = b''.join((json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+                            for entry in entries)
+            with open(self.log_file, 'ab') as f:
+                f.write(data)
+            for entry in entries:
+                self.apply(entry)
+            self.log_offset += len(data)
+            self.log_entries += len(entries)
+            if self.log_entries > max(self.checkpoint_entries, len(self.doc_numbers) // 10):
+                self.save_snapshot()
+
+    def update(self, items):
+        """新增或更新文档，items为[(记录ID, 文本), ...]"""
+        self.write([{'op': 'put', 'id': record_id, 'text': text} for record_id, text in items])
+
+    def delete(self, record_ids):
+        self.write([{'op': 'del', 'id': record_id} for record_id in record_ids])
+
+    def rebuild(self, items):
+        """按全部文档重新建立索引，items为(记录ID, 文本)的可迭代对象"""
+        with FileLock(self.lock_file):
+            self.reset()
+            for record_id, text in items:
+                self.remove(record_id)
+                self.add(record_id, text)
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        """重写快照并清空日志（调用方持有文件锁）；已删除的文档较多时重新编号"""
+        if len(self.doc_numbers) < len(self.doc_ids) // 2:
+            self.renumber()
+        data = {'version': INDEX_VERSION, 'postings': self.postings, 'words': self.words, 'doc_ids': self.doc_ids,
+                'doc_lengths': self.doc_lengths, 'total_length': self.total_length}
+        atomic_write(self.snapshot_file, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        with open(self.log_file, 'wb'):
+            pass
+        self.snapshot_state = self.get_file_state(self.snapshot_file)
+        self.log_offset = 0
+        self.log_entries = 0
+
+    def renumber(self):
+        """去掉已删除的文档，剩余文档按原顺序重新编号"""
+        mapping = {}
+        doc_ids = []
+        doc_lengths = array('I')
+        for doc, record_id in enumerate(self.doc_ids):
+            if record_id is not None:
+                mapping[doc] = len(doc_ids)
+                doc_ids.append(record_id)
+                doc_lengths.append(self.doc_lengths[doc])
+        postings = {}
+        for term, posting in self.postings.items():
+            renumbered = array('I', (mapping[doc] for doc in posting if doc in mapping))
+            if renumbered:
+                postings[term] = renumbered
+        words = {}
+        for word, posting in self.words.items():
+            renumbered = [mapping[doc] for doc in posting if doc in mapping]
+            if renumbered:
+                words[word] = renumbered
+        self.postings = postings
+        self.words = words
+        self.char_terms = None
+        self.term_counts = {}
+        self.word_counts = {}
+        self.dead_docs = []
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.doc_numbers = {record_id: doc for doc, record_id in enumerate(doc_ids)}
+
+    def add_char_terms(self, term):
+        for char in set(term):
+            self.char_terms.setdefault(char, set()).add(term)
+
+    def terms_with_char(self, char):
+        """包含字符char的二元组（以及单独出现的该字符）"""
+        if self.char_terms is None:
+            self.char_terms = {}
+            for term in self.postings:
+                self.add_char_terms(term)
+        return self.char_terms.get(char, ())
+
+    def document_frequency(self, posting, counts=None, term=None):
+        """包含该词的未删除文档数：倒排表中不同的文档编号数（counts中缓存）减去其中已删除的文档"""
+        if counts is None or len(self.dead_docs) * INTERSECT_RATIO >= len(posting):
+            return sum(1 for doc in set(posting) if self.doc_ids[doc] is not None)
+        count = counts.get(term)
+        if count is None:
+            count = counts[term] = len(set(posting))
+        return count - sum(1 for doc in self.dead_docs if contains(posting, doc))
+
+    def query_postings(self, terms):
+        """查询词对应的倒排表；单个字符的查询词匹配所有包含该字符的二元组"""
+        result = []
+        for term in terms:
+            if len(term) == 1:
+                docs = sorted(doc for key in self.terms_with_char(term) for doc in self.postings[key])
+                result.append((term, array('I', docs)))
+            else:
+                result.append((term, self.postings.get(term, array('I'))))
+        return result
+
+    def search(self, text, limit=20):
+        """检索包含查询文本全部检索词的记录，按BM25相关度从高到低返回记录ID"""
+        self.refresh()
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms or not self.doc_numbers:
+            return []
+        postings = sorted(self.query_postings(terms), key=lambda item: len(item[1]))
+        # 先取最短的倒排表作为候选，再依次与其余倒排表求交集：
+        # 候选远少于倒排表时逐个二分查找，否则用集合运算整体求交
+        candidates = set(postings[0][1])
+        for _, posting in postings[1:]:
+            if not candidates:
+                return []
+            if len(candidates) * INTERSECT_RATIO < len(posting):
+                candidates = {doc for doc in candidates if contains(posting, doc)}
+            else:
+                candidates.intersection_update(posting)
+        # 文档频率：包含该词的未删除文档数，倒排表中的重复编号（词频）和已删除的文档不计；
+        # 单个字符的查询词合并了多个倒排表，不缓存
+        frequencies = [self.document_frequency(posting, self.term_counts if len(term) > 1 else None, term)
+                       for term, posting in postings]
+        # 整词完全匹配的记录（如输入完整的单号）相关度更高，但不要求整词匹配
+        for word in dict.fromkeys(word_terms(text)):
+            if word in self.words:
+                postings.append((word, self.words[word]))
+                frequencies.append(self.document_frequency(self.words[word], self.word_counts, word))
+        doc_count = len(self.doc_numbers)
+        average_length = self.total_length / doc_count or 1
+        idfs = [math.log(1 + (doc_count - frequency + 0.5) / (frequency + 0.5)) for frequency in frequencies]
+        scores = []
+        for doc in candidates:
+            if self.doc_ids[doc] is None:
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / average_length)
+            score = 0.0
+            for (_, posting), idf in zip(postings, idfs):
+                # 倒排表按文档编号升序，词频为该文档编号出现的次数
+                frequency = bisect_right(posting, doc) - bisect_left(posting, doc)
+                score += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            scores.append((score, doc))
+        # 相关度相同时新添加的记录在前
+        return [self.doc_ids[doc] for _, doc in nlargest(limit, scores)]
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+from record_store import RecordStore, JsonRecordStore, check_unique_ids
+from write_coordinator import FileLock, GroupCommitter, lock_file_for, temp_file_for
+
+# 追加日志记录存储：每次新增、更新、删除在data_{模块}_{单据}.jsonl末尾追加一行，
+# 写入耗时只与记录大小有关；读取时从最近的检查点开始重放日志得到当前状态。
+# 失效的行（被更新或删除的旧记录）超过阈值时压缩：把当前状态重写为新的检查点。
+#
+# 每行一个操作：
+#   {"op":"checkpoint","records":N}  压缩后的日志以检查点开头，后面N行为当时的全部记录
+#   {"op":"put","record":{...}}      新增或更新
+#   {"op":"del","id":"..."}          删除
+
+
+def journal_file_for(filename):
+    """data_采购管理_采购订单.json对应的日志文件data_采购管理_采购订单.jsonl"""
+    return os.path.splitext(filename)[0] + '.jsonl'
+
+
+def encode_entry(entry):
+    return (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+class JournalRecordStore(RecordStore):
+    """追加日志存储，首次打开时自动导入原有的JSON数据文件"""
+
+    def __init__(self, filename, compact_ratio=0.5, min_dead_entries=1000, background=True, sync=False,
+                 commit_window=0.0):
+        super().__init__(filename)
+        self.journal_file = journal_file_for(filename)
+        # 失效行占日志总行数的比例超过compact_ratio且不少于min_dead_entries行时压缩
+        self.compact_ratio = compact_ratio
+        self.min_dead_entries = min_dead_entries
+        # 在后台线程中压缩，不阻塞保存操作
+        self.background = background
+        # 每次写入后fsync，断电也不丢失已保存的记录
+        self.sync = sync
+        # ID -> 记录，按首次添加的顺序
+        self.records = {}
+        self.entry_count = 0
+        # 已重放到的文件位置和日志文件标识，其他进程追加或压缩后据此增量读取或整体重读
+        self.offset = 0
+        self.file_id = None
+        self.lock = threading.RLock()
+        self.compaction_thread = None
+        # 多个进程的追加和压缩替换日志都在文件锁内进行，追加的行不会交错，也不会写到被替换的旧日志
+        self.lock_file = lock_file_for(self.journal_file)
+        # 组提交：同时到达的多个保存合并为一次写入（sync=True时也只fsync一次）
+        self.committer = GroupCommitter(self.commit, commit_window)
+        self.migrate()
+
+    def migrate(self):
+        """日志不存在而JSON数据文件存在时，把原有记录写成日志的检查点"""
+        if os.path.exists(self.journal_file) or not os.path.exists(self.filename):
+            return
+        # 多个进程同时首次打开时在文件锁内重新检查，只有一个进程导入
+        with FileLock(self.lock_file):
+            if os.path.exists(self.journal_file) or not os.path.exists(self.filename):
+                return
+            # 流式读取原有文件两遍（先检查ID并计数，再写出），导入大文件时不把全部记录读入内存
+            legacy = JsonRecordStore(self.filename)
+            count = check_unique_ids(self.filename, legacy.iter_records())
+            temp_file = temp_file_for(self.journal_file)
+            try:
+                with open(temp_file, 'wb') as f:
+                    self.write_checkpoint(f, legacy.iter_records(), count)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.journal_file)
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+            # 导入完成后保留原文件作为备份，避免与日志中的数据混淆
+            os.replace(self.filename, self.filename + '.migrated')
+
+    def write_checkpoint(self, f, records, count=None):
+        """写出检查点：当前全部记录，返回写入的字节数；records为迭代器时由count给出记录数"""
+        count = len(records) if count is None else count
+        size = f.write(encode_entry({'op': 'checkpoint', 'records': count}))
+        for record in records:
+            size += f.write(encode_entry({'op': 'put', 'record': record}))
+        return size
+
+    def exists(self):
+        return os.path.exists(self.journal_file)
+
+    def apply(self, entry):
+        """重放一条日志"""
+        op = entry.get('op')
+        if op == 'put':
+            record = entry['record']
+            key = self.record_key(record.get('id'))
+            if self.index is not None:
+                self.index.replace(key, self.records.get(key), record)
+            self.records[key] = record
+        elif op == 'del':
+            old_record = self.records.pop(entry['id'], None)
+            if self.index is not None and old_record is not None:
+                self.index.remove(entry['id'], old_record)
+        elif op == 'checkpoint':
+            # 检查点之前的内容已全部包含在检查点中
+            self.records = {}
+            self.entry_count = 0
+            self.index = None
+            return
+        self.entry_count += 1
+
+    def refresh(self):
+        """读取日志中尚未重放的部分；日志被压缩替换后从头重读"""
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            self.records = {}
+            self.entry_count = 0
+            self.offset = 0
+            self.file_id = None
+            self.index = None
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self.file_id or stat.st_size < self.offset:
+            self.records = {}
+            self.entry_count = 0
+            self.offset = 0
+            self.file_id = file_id
+            self.index = None
+        if stat.st_size == self.offset:
+            return
+        with open(self.journal_file, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # 只处理完整的行，写到一半的最后一行留到下次
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self.apply(json.loads(line))
+        self.offset += end
+
+    def commit(self, ops):
+        """追加一批操作的日志并更新内存状态，整批只写一次"""
+        with FileLock(self.lock_file), self.lock:
+            self.refresh()
+            data = bytearray()
+            results = []
+            for kind, value in ops:
+                if kind == 'put':
+                    results.append(bool(value.get('id')) and value.get('id') in self.records)
+                    entry = {'op': 'put', 'record': value}
+                elif value and value in self.records:
+                    results.append(True)
+                    entry = {'op': 'del', 'id': value}
+                else:
+                    results.append(False)
+                    continue
+                data += encode_entry(entry)
+                # 本进程写入的内容已知，直接应用，不必再从文件读回
+                self.apply(entry)
+            if data:
+                try:
+                    with open(self.journal_file, 'ab') as f:
+                        if f.seek(0, os.SEEK_END) != self.offset:
+                            # 最后一行不完整（写入时进程中断），从该处覆盖，新追加的行不会与它拼在一起
+                            f.truncate(self.offset)
+                        f.write(data)
+                        f.flush()
+                        if self.sync:
+                            os.fsync(f.fileno())
+                except OSError:
+                    # 写入失败时内存状态作废，下次从日志重新加载
+                    self.file_id = None
+                    raise
+                self.offset += len(data)
+                if self.file_id is None:
+                    stat = os.stat(self.journal_file)
+                    self.file_id = (stat.st_dev, stat.st_ino)
+        return results
+
+    def get_version(self):
+        try:
+            stat = os.stat(self.journal_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_dev, stat.st_ino, stat.st_size)
+
+    def release(self):
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                # 正在压缩时保留内存状态，压缩完成前还要用到
+                return
+            self.records = {}
+            self.entry_count = 0
+            self.offset = 0
+            self.file_id = None
+            self.index = None
+
+    def get_records(self):
+        with self.lock:
+            self.refresh()
+            return list(self.records.values())
+
+    def get_record(self, record_id):
+        with self.lock:
+            self.refresh()
+            return self.records.get(record_id)
+
+    def find_records(self, equals=None, prefixes=None):
+        with self.lock:
+            self.refresh()
+            index = self.get_index(self.records)
+            if index is None:
+                return super().find_records(equals, prefixes)
+            return index.find(self.records, equals or {}, prefixes or {})
+
+    def put_record(self, record):
+        updated = self.committer.submit(('put', record))
+        self.maybe_compact()
+        return updated
+
+    def put_records(self, records):
+        updated = self.commit([('put', record) for record in records])
+        self.maybe_compact()
+        return updated
+
+    def delete_record(self, record_id):
+        deleted = self.committer.submit(('del', record_id))
+        self.maybe_compact()
+        return deleted
+
+    def delete_records(self, record_ids):
+        deleted = self.commit([('del', record_id) for record_id in record_ids])
+        self.maybe_compact()
+        return deleted
+
+    def dead_entries(self):
+        """日志中已失效的行数"""
+        return self.entry_count - len(self.records)
+
+    def needs_compaction(self):
+        dead = self.dead_entries()
+        return dead >= self.min_dead_entries and dead > self.entry_count * self.compact_ratio
+
+    def maybe_compact(self):
+        """失效行超过阈值时压缩日志"""
+        if not self.needs_compaction():
+            return
+        if not self.background:
+            self.compact()
+        elif self.compaction_thread is None or not self.compaction_thread.is_alive():
+            self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+            self.compaction_thread.start()
+
+    def compact(self):
+        """把当前状态重写为检查点；写出期间的追加在替换前复制到新日志末尾
+
+        写出期间日志已被其他实例压缩替换时放弃本次压缩，返回是否完成
+        """
+        with self.lock:
+            self.refresh()
+            records = list(self.records.values())
+            offset = self.offset
+            entry_count = self.entry_count
+            file_id = self.file_id
+        if file_id is None:
+            return False
+        temp_file = temp_file_for(self.journal_file)
+        try:
+            with open(temp_file, 'wb') as f:
+                checkpoint_size = self.write_checkpoint(f, records)
+            with FileLock(self.lock_file), self.lock:
+                try:
+                    stat = os.stat(self.journal_file)
+                except FileNotFoundError:
+                    return False
+                if (stat.st_dev, stat.st_ino) != file_id or self.file_id != file_id:
+                    # 检查点是按被替换前的旧日志写出的，offset在新日志上没有意义
+                    return False
+                with open(self.journal_file, 'rb') as f:
+                    f.seek(offset)
+                    tail = f.read()
+                # 不完整的最后一行不复制，由下次追加时截掉
+                tail = tail[:tail.rfind(b'\n') + 1]
+                with open(temp_file, 'ab') as f:
+                    f.write(tail)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.journal_file)
+                # 内存状态不变，只把位置换算到新日志上：检查点之后紧接着原日志offset之后的内容
+                stat = os.stat(self.journal_file)
+                self.file_id = (stat.st_dev, stat.st_ino)
+                self.offset = checkpoint_size + (self.offset - offset)
+                self.entry_count = len(records) + (self.entry_count - entry_count)
+                return True
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def close(self):
+        thread = self.compaction_thread
+        if thread is not None:
+            thread.join()
+            self.compaction_thread = None
@@ -0,0 +1,80 @@
+import json
+
+# 流式读取JSON数据文件：按块读取顶层数组，用增量解码逐条产出记录，
+# 内存占用只与单条记录和读取块的大小有关，与文件大小无关
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = ' \t\r\n'
+
+
+def iter_json_array(filename, chunk_size=CHUNK_SIZE):
+    """逐条产出JSON文件顶层数组中的元素；顶层为单个对象（旧格式）时产出该对象，空文件不产出
+
+    文件格式错误时抛出ValueError（json.JSONDecodeError）
+    """
+    decoder = json.JSONDecoder()
+    with open(filename, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def fill():
+            """读取下一块并丢弃已解码的部分，返回是否读到了新内容"""
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            return True
+
+        def skip_whitespace():
+            """跳过空白，返回下一个字符，文件结束时返回空字符串"""
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                if not fill():
+                    return ''
+
+        def decode_value():
+            """解码pos处的一个完整值；缓冲区中的内容不完整时继续读取"""
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # 值恰好在缓冲区末尾结束时可能被截断（如数字），读到更多内容后重新解码
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                if not fill():
+                    value, pos = decoder.raw_decode(buffer, pos)
+                    return value
+
+        first = skip_whitespace()
+        if first == '\ufeff':
+            pos += 1
+            first = skip_whitespace()
+        if not first:
+            return
+        if first != '[':
+            yield decode_value()
+            return
+        pos += 1
+        if skip_whitespace() == ']':
+            return
+        while True:
+            yield decode_value()
+            separator = skip_whitespace()
+            if separator == ']':
+                return
+            if separator != ',':
+                raise json.JSONDecodeError('Expecting \',\' delimiter', buffer, pos)
+            pos += 1
+            skip_whitespace()
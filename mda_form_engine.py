@@ -1,14 +1,71 @@
-import xml.etree.ElementTree as ET
+import os
+import time
 import tkinter as tk
+import multiprocessing
+import xml.etree.ElementTree as ET
+from itertools import groupby
 from tkinter import ttk, messagebox
-import json
-import os
+from metadata_model import MetadataModel, DEVICES, is_visible_on, visible_field_items
+from form_validator import compile_form_validator, RecordValidationError
+from record_store import open_record_store
+from record_cache import RecordCache
+from record_id import new_record_id
+from record_index import parse_criteria
+from fulltext_index import FullTextIndex, search_file_for, record_text
+from change_log import ChangeLog, ChangeConsumer, change_log_file_for, change_event
+from record_history import RecordHistory, history_file_for
+from write_coordinator import GroupCommitter
 
 class MDAFormEngine:
-    def __init__(self, metadata_file):
+    def __init__(self, metadata_file, use_snapshot=True, lazy=False, streaming=False, model=None, device='pc',
+                 watch_interval=None, workers=None, storage='json', storage_options=None,
+                 record_cache_size=256 * 1024 * 1024, list_limit=None, keep_history=False, commit_window=0.0):
+        if device not in DEVICES:
+            raise ValueError(f'不支持的终端类型: {device}')
         self.metadata_file = metadata_file
+        # 目标终端：pc、tablet或mobile，对应VisibleExt的三位编码
+        self.device = device
+        self.use_snapshot = use_snapshot
+        self.lazy = lazy
+        self.streaming = streaming
+        # 多文件元数据目录并行解析的进程数，None表示使用全部CPU核心
+        self.workers = workers
+        # 记录存储方式：json（默认，每个单据一个JSON文件）、sqlite、journal（追加日志）或sharded（按月分片）
+        self.storage = storage
+        self.storage_options = dict(storage_options or {})
+        # 组提交：保存、删除的提交者先等待commit_window秒收集同时到达的操作；
+        # 兼容写在storage_options中的commit_window，取出后不再传给存储（SQLite存储不接受该参数）
+        self.commit_window = self.storage_options.pop('commit_window', commit_window)
+        # 数据文件名 -> 记录存储
+        self.stores = {}
+        # 各单据记录列表的共享缓存，record_cache_size为内存上限（字节）
+        self.record_cache = RecordCache(record_cache_size)
+        # 数据列表最多显示最近的list_limit条记录，None表示全部显示
+        self.list_limit = list_limit
+        # 已检查过旧数据中嵌套明细行的数据文件
+        self.details_checked = set()
+        # 数据文件名 -> 全文检索索引
+        self.search_indexes = {}
+        # 保存、删除记录时是否保存版本历史
+        self.keep_history = keep_history
+        # 数据文件名 -> 版本历史
+        self.histories = {}
+        # 数据文件名 -> 组提交器
+        self.committers = {}
+        # 元数据模型，可与编辑器共用同一个实例
+        self.model = model
+        # 热加载：每隔watch_interval毫秒检查一次元数据文件，None表示不监视
+        self.watch_interval = watch_interval
+        # 上一次热加载失败的提示信息，加载成功后清除
+        self.metadata_error = None
         self.fields = {}
+        # 当前表单在目标终端上可见的(字段名, 字段信息)列表，按定义顺序
+        self.visible_fields = []
+        # 当前表单编译好的验证流水线，切换表单时重新编译
+        self.validator = None
         self.field_widgets = {}
+        # 是否正在新增或修改记录：新增、修改时置为True，保存或离开编辑界面（切换表单、刷新列表）时清除
+        self.editing = False
         self.root = None
         self.form_frame = None
         self.modules = {}
@@ -18,107 +75,55 @@ class MDAFormEngine:
         self.load_metadata()
     
     def load_metadata(self):
-        tree = ET.parse(self.metadata_file)
-        root = tree.getroot()
-        
-        # 检查是否有Modules节点（新格式）
-        modules_elem = root.find('Modules')
-        if modules_elem is not None:
-            self.load_modules(modules_elem)
+        """加载元数据模型"""
+        if self.model is None:
+            self.model = MetadataModel(self.metadata_file, use_snapshot=self.use_snapshot,
+                                       lazy=self.lazy, streaming=self.streaming, workers=self.workers)
+        self.modules = self.model.modules
+        self.fields = self.model.fields
+        self.visible_fields = visible_field_items(self.fields, self.device)
+        self.compile_validator()
+        if self.model.form_name is not None:
+            self.form_name = self.model.form_name
+        if self.watch_interval and self.model.file_state is None:
+            self.model.start_tracking()
+    
+    def check_metadata_changes(self):
+        """检查元数据文件变化并增量应用，未变化的表单及其打开的记录保持不动"""
+        changes = self.model.check_for_changes()
+        if changes is None:
+            return None
+        
+        current = (self.current_module, self.current_form)
+        current_changed = current in changes['changed'] or current in changes['removed']
+        if changes['reloaded']:
+            # 旧格式整体重新加载
+            self.load_metadata()
+            current_changed = True
+        elif current_changed:
+            self.set_current_form(self.current_module, self.current_form)
+        
+        if self.root is not None:
+            if changes['added'] or changes['removed'] or changes['reloaded']:
+                self.populate_nav_tree()
+            # 正在编辑记录时不重建界面，避免丢失未保存的输入
+            if current_changed and not self.editing:
+                self.refresh_data_list()
+        return changes
+    
+    def poll_metadata(self):
+        """定时轮询元数据文件变化"""
+        try:
+            self.check_metadata_changes()
+        except (OSError, ET.ParseError, ValueError) as e:
+            # 文件正在被写入或保存的内容有误，继续使用原有元数据，下一轮再检查；同一错误只提示一次
+            message = f'元数据文件加载失败，继续使用原有配置: {e}'
+            if message != self.metadata_error:
+                self.metadata_error = message
+                messagebox.showwarning('元数据错误', message)
         else:
-            # 向后兼容：旧格式
-            form = root.find('Form')
-            if form is not None:
-                self.form_name = form.get('name')
-                self.load_fields(form.find('FieldList'))
-    
-    def load_modules(self, modules_elem):
-        """加载模块结构"""
-        for module_elem in modules_elem.findall('Module'):
-            module_name = module_elem.get('name')
-            self.modules[module_name] = {}
-            
-            forms_elem = module_elem.find('Forms')
-            if forms_elem is not None:
-                for form_elem in forms_elem.findall('Form'):
-                    form_name = form_elem.get('name')
-                    self.modules[module_name][form_name] = {
-                        'fields': {}
-                    }
-                    
-                    field_list = form_elem.find('FieldList')
-                    if field_list is not None:
-                        for field_elem in field_list:
-                            field_type = field_elem.tag
-                            field_name = field_elem.get('name')
-                            field_info = {
-                                'type': field_type,
-                                'left': int(field_elem.get('Left', 10)),
-                                'top': int(field_elem.get('Top', 10)),
-                                'width': int(field_elem.get('Width', 200)),
-                                'height': int(field_elem.get('Height', 30)),
-                                'visible_ext': field_elem.get('VisibleExt', '111')
-                            }
-                            
-                            if field_type == 'TextField':
-                                field_info['length'] = int(field_elem.get('Length', 200))
-                            elif field_type == 'ComboBox':
-                                field_info['options'] = [opt.text for opt in field_elem.find('Options').findall('Option')]
-                            elif field_type == 'MoneyField':
-                                field_info['length'] = int(field_elem.get('Length', 10))
-                            
-                            validation = field_elem.find('Validation')
-                            if validation is not None:
-                                field_info['validation'] = {}
-                                if validation.find('Required') is not None:
-                                    field_info['validation']['required'] = validation.find('Required').text == '1'
-                                if validation.find('Number') is not None:
-                                    field_info['validation']['number'] = validation.find('Number').text == '1'
-                            
-                            self.modules[module_name][form_name]['fields'][field_name] = field_info
-                    
-                    # 加载明细表格配置
-                    detail_table = form_elem.find('DetailTable')
-                    if detail_table is not None:
-                        self.modules[module_name][form_name]['detail_columns'] = []
-                        for column_elem in detail_table.findall('Column'):
-                            column_info = {
-                                'name': column_elem.get('name'),
-                                'width': int(column_elem.get('width', 100)),
-                                'type': column_elem.get('type', 'TextField')
-                            }
-                            self.modules[module_name][form_name]['detail_columns'].append(column_info)
-    
-    def load_fields(self, field_list_elem):
-        """加载字段（旧格式）"""
-        for field_elem in field_list_elem:
-            field_type = field_elem.tag
-            field_name = field_elem.get('name')
-            field_info = {
-                'type': field_type,
-                'left': int(field_elem.get('Left', 10)),
-                'top': int(field_elem.get('Top', 10)),
-                'width': int(field_elem.get('Width', 200)),
-                'height': int(field_elem.get('Height', 30)),
-                'visible_ext': field_elem.get('VisibleExt', '111')
-            }
-            
-            if field_type == 'TextField':
-                field_info['length'] = int(field_elem.get('Length', 200))
-            elif field_type == 'ComboBox':
-                field_info['options'] = [opt.text for opt in field_elem.find('Options').findall('Option')]
-            elif field_type == 'MoneyField':
-                field_info['length'] = int(field_elem.get('Length', 10))
-            
-            validation = field_elem.find('Validation')
-            if validation is not None:
-                field_info['validation'] = {}
-                if validation.find('Required') is not None:
-                    field_info['validation']['required'] = validation.find('Required').text == '1'
-                if validation.find('Number') is not None:
-                    field_info['validation']['number'] = validation.find('Number').text == '1'
-            
-            self.fields[field_name] = field_info
+            self.metadata_error = None
+        self.root.after(self.watch_interval, self.poll_metadata)
     
     def set_current_form(self, module_name, form_name):
         """设置当前表单"""
@@ -127,23 +132,35 @@ class MDAFormEngine:
         self.form_name = form_name
         
         # 加载当前表单的字段
-        if module_name in self.modules and form_name in self.modules[module_name]:
-            self.fields = self.modules[module_name][form_name]['fields']
+        form_config = self.get_form_config(module_name, form_name)
+        self.fields = form_config.get('fields', {})
+        if hasattr(form_config, 'get_visible_fields'):
+            self.visible_fields = form_config.get_visible_fields(self.device)
         else:
-            self.fields = {}
+            self.visible_fields = visible_field_items(self.fields, self.device)
+        self.compile_validator()
     
-    def is_visible(self, visible_ext):
-        return visible_ext[0] == '1'  # 简化处理，只考虑PC端
+    def compile_validator(self):
+        """编译当前表单可见字段的验证流水线"""
+        # 子类重写了custom_validation时按字段绑定调用，否则使用编译好的内置规则
+        custom_validation = None
+        if type(self).custom_validation is not MDAFormEngine.custom_validation:
+            custom_validation = self.custom_validation
+        self.validator = compile_form_validator(self.visible_fields, custom_validation)
+    
+    def get_form_config(self, module_name, form_name):
+        """获取表单配置"""
+        return self.model.get_form(module_name, form_name) or {}
+    
+    def is_visible(self, visible_ext, device=None):
+        """判断字段在目标终端（默认为引擎的终端）上是否可见"""
+        return is_visible_on(visible_ext, device or self.device)
     
     def validate_form(self):
         """验证表单数据"""
-        errors = []
-        
-        # 验证主表数据
-        for field_name, field_info in self.fields.items():
-            if not self.is_visible(field_info['visible_ext']):
-                continue
-            
+        # 验证主表数据：只读取有验证规则的字段控件的值
+        values = {}
+        for field_name in self.validator.field_names:
             widget = self.field_widgets.get(field_name)
             if not widget:
                 continue
@@ -158,33 +175,9 @@ class MDAFormEngine:
                         value = value.strip()
             else:
                 value = ''
-            
-            # 验证规则
-            validation = field_info.get('validation', {})
-            
-            # 非空验证
-            if validation.get('required'):
-                if not value:
-                    errors.append(f'{field_name} 不能为空')
-            
-            # 数字验证
-            if validation.get('number'):
-                if value:
-                    try:
-                        float(value)
-                    except ValueError:
-                        errors.append(f'{field_name} 必须是数字')
-            
-            # 长度验证
-            if field_info.get('length'):
-                max_length = field_info['length']
-                if len(value) > max_length:
-                    errors.append(f'{field_name} 长度不能超过 {max_length} 个字符')
-            
-            # 自定义验证规则
-            custom_error = self.custom_validation(field_name, value, field_info)
-            if custom_error:
-                errors.append(custom_error)
+            values[field_name] = value
+        
+        errors = self.validator.validate(values)
         
         # 验证明细数据
         if hasattr(self, 'detail_tree') and self.detail_tree:
@@ -208,7 +201,7 @@ class MDAFormEngine:
         
         # 获取明细列配置
         if self.current_module and self.current_form:
-            form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+            form_config = self.get_form_config(self.current_module, self.current_form)
             detail_columns = form_config.get('detail_columns', [])
             if detail_columns:
                 # 检查是否有数据
@@ -245,7 +238,7 @@ class MDAFormEngine:
         if hasattr(self, 'detail_tree') and self.detail_tree:
             # 获取明细列配置
             if self.current_module and self.current_form:
-                form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                form_config = self.get_form_config(self.current_module, self.current_form)
                 detail_columns = form_config.get('detail_columns', [])
                 if detail_columns:
                     # 查找数量、单价、金额列的索引
@@ -316,7 +309,7 @@ class MDAFormEngine:
                 if values:
                     # 获取明细列配置
                     if self.current_module and self.current_form:
-                        form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                        form_config = self.get_form_config(self.current_module, self.current_form)
                         detail_columns = form_config.get('detail_columns', [])
                         if detail_columns:
                             row_data = {}
@@ -327,42 +320,24 @@ class MDAFormEngine:
             data['details'] = detail_data
         
         # 为每个单据创建独立的数据文件
-        if self.current_module and self.current_form:
-            filename = f'data_{self.current_module}_{self.current_form}.json'
-        else:
-            filename = 'form_data.json'
+        filename = self.get_data_filename()
         
         # 检查是否有ID字段，判断是新增还是更新
         record_id = data.get('id')
         
-        # 加载现有数据
-        records = self.get_records(filename)
-        
         if record_id:
-            # 更新现有记录
-            updated = False
-            for i, record in enumerate(records):
-                if record.get('id') == record_id:
-                    records[i] = data
-                    updated = True
-                    break
-            if not updated:
-                # 如果没找到记录，添加为新记录
-                records.append(data)
+            # 更新现有记录，如果没找到记录，添加为新记录
             message = '记录已更新'
         else:
             # 新增记录，生成唯一ID
-            import time
-            import random
-            new_id = f'{int(time.time())}{random.randint(1000, 9999)}'
-            data['id'] = new_id
+            data['id'] = self.new_record_id()
             data['created_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
-            records.append(data)
             message = '记录已添加'
         
-        # 保存数据
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(records, f, ensure_ascii=False, indent=2)
+        # 保存数据：明细行单独保存，先写明细再写表头
+        details = data.pop('details', None)
+        self.store_records(filename, [(data, details)])
+        self.editing = False
         
         # 只在GUI环境中显示消息框
         if hasattr(self, 'root') and self.root is not None:
@@ -376,14 +351,201 @@ class MDAFormEngine:
         # if hasattr(self, 'fields_frame'):
         #     self.fields_frame.pack_forget()
     
+    def new_record_id(self):
+        """生成新记录的ID：按生成时间递增，多个进程同时生成也不会重复"""
+        return new_record_id()
+    
+    def save_records(self, module_name, form_name, records):
+        """无界面批量保存记录，整批验证通过后在一次事务中写入，返回各记录的ID
+        
+        没有ID的记录分配新ID并补上created_at，有ID的记录按ID更新；
+        按表单的全部字段验证（不区分终端），任何一条验证失败时抛出RecordValidationError，整批都不写入
+        """
+        form_config = self.get_form_config(module_name, form_name)
+        if not form_config:
+            raise ValueError(f'表单不存在: {module_name}/{form_name}')
+        custom_validation = None
+        if type(self).custom_validation is not MDAFormEngine.custom_validation:
+            custom_validation = self.custom_validation
+        validator = compile_form_validator(form_config.get('fields', {}), custom_validation)
+        
+        created_at = time.strftime('%Y-%m-%d %H:%M:%S')
+        store = self.get_form_store(module_name, form_name)
+        batch = []
+        errors = []
+        for index, record in enumerate(records):
+            data = {}
+            for field_name, value in record.items():
+                data[field_name] = value.strip() if isinstance(value, str) else value
+            # 与界面保存一致：缺少的字段按空值验证，其他类型按文本验证
+            values = {}
+            for field_name in validator.field_names:
+                value = data.get(field_name)
+                values[field_name] = '' if value is None else str(value)
+            record_errors = validator.validate(values)
+            if record_errors:
+                errors.append((index, record_errors))
+                continue
+            if not data.get('id'):
+                data['id'] = self.new_record_id()
+                data.setdefault('created_at', created_at)
+            batch.append((data, data.pop('details', None)))
+        if errors:
+            raise RecordValidationError(errors)
+        self.store_records(store.filename, batch)
+        return [data['id'] for data, _ in batch]
+    
+    def store_records(self, filename, entries):
+        """保存一批(表头记录, 明细行)，明细行为None表示不修改明细；返回每条记录是否为更新
+        
+        经数据文件的组提交器写入：同一进程内同时到达的保存、删除合并为一批，在变更日志的文件锁内一起写入
+        """
+        return self.get_committer(filename).submit(('put', list(entries)))
+    
+    def remove_records(self, filename, record_ids):
+        """删除一批记录及其明细，记录变更日志、版本历史，更新全文检索索引；返回每条记录是否找到并删除
+        
+        JSON文件存储整批只追加一次墓碑，不重写数据文件
+        """
+        return self.get_committer(filename).submit(('del', list(record_ids)))
+    
+    def get_committer(self, filename):
+        """获取数据文件的组提交器，每个文件一个"""
+        committer = self.committers.get(filename)
+        if committer is None:
+            committer = GroupCommitter(lambda ops: self.commit_changes(filename, ops), self.commit_window)
+            self.committers[filename] = committer
+        return committer
+    
+    def commit_changes(self, filename, ops):
+        """组提交器的提交函数：在变更日志的文件锁内依次写入一批操作，连续的保存（删除）合并为一次写入
+        
+        ops为[('put', [(表头记录, 明细行), ...]) 、('del', [记录ID, ...])或('split', [记录ID, ...]), ...]，
+        返回每个操作的结果列表
+        """
+        def write():
+            results = []
+            events = []
+            for kind, group in groupby(ops, key=lambda op: op[0]):
+                group = [items for _, items in group]
+                batch = [item for items in group for item in items]
+                if kind == 'put':
+                    batch_results, batch_events = self.write_entries(filename, batch)
+                elif kind == 'split':
+                    batch_results, batch_events = self.write_splits(filename, batch)
+                else:
+                    batch_results, batch_events = self.write_removals(filename, batch)
+                events.extend(batch_events)
+                position = 0
+                for items in group:
+                    results.append(batch_results[position:position + len(items)])
+                    position += len(items)
+            return results, events
+        
+        return self.get_change_log(filename).write(write)
+    
+    def write_entries(self, filename, entries):
+        """写入一批(表头记录, 明细行)（调用方持有变更日志的文件锁），返回(每条记录是否为更新, 变更事件)
+        
+        先写明细再写表头，再追加版本历史、更新全文检索索引
+        """
+        versions = []
+        if self.keep_history:
+            # 版本中包含明细行，不修改明细时沿用已保存的明细
+            for data, details in entries:
+                if details is None:
+                    details = self.get_record_details(filename, data)
+                versions.append((data['id'], dict(data, details=details)))
+        detail_batch = [self.detail_entry(data, details) for data, details in entries if details is not None]
+        if detail_batch:
+            self.get_detail_store(filename).put_records(detail_batch)
+        updated = self.get_store(filename).put_records([data for data, _ in entries])
+        events = []
+        for (data, details), is_update in zip(entries, updated):
+            record = data if details is None else dict(data, details=details)
+            events.append(change_event('update' if is_update else 'insert', data['id'], record))
+        if versions:
+            self.get_record_history(filename).append(versions)
+        self.update_search_index(filename, entries)
+        return updated, events
+    
+    def write_splits(self, filename, record_ids):
+        """把旧数据中嵌套的明细行移到明细存储（调用方持有变更日志的文件锁），返回(每条记录是否拆分, 变更事件)
+        
+        在锁内重新读取记录，只拆分仍带有details的记录，读取之后其他线程、进程保存的内容不会被覆盖
+        """
+        store = self.get_store(filename)
+        entries = []
+        results = []
+        for record_id in record_ids:
+            record = store.get_record(record_id)
+            split = record is not None and 'details' in record
+            if split:
+                header = dict(record)
+                entries.append((header, header.pop('details')))
+            results.append(split)
+        if not entries:
+            return results, []
+        _, events = self.write_entries(filename, entries)
+        return results, events
+    
+    def write_removals(self, filename, record_ids):
+        """删除一批记录（调用方持有变更日志的文件锁），返回(每条记录是否找到并删除, 变更事件)"""
+        results = self.get_store(filename).delete_records(record_ids)
+        deleted = [record_id for record_id, result in zip(record_ids, results) if result]
+        if deleted:
+            detail_store = self.get_detail_store(filename)
+            if detail_store.exists():
+                detail_store.delete_records(deleted)
+            if self.keep_history:
+                self.get_record_history(filename).append([(record_id, None) for record_id in deleted])
+            search_index = self.get_search_index(filename)
+            if search_index.exists():
+                search_index.delete(deleted)
+        return results, [change_event('delete', record_id) for record_id in deleted]
+    
+    def delete_records(self, module_name, form_name, record_ids):
+        """无界面批量删除记录，返回每条记录是否找到并删除"""
+        return self.remove_records(self.data_filename_for(module_name, form_name), record_ids)
+    
+    def get_record_history(self, filename):
+        """获取数据文件对应的版本历史，每个文件只打开一次"""
+        history = self.histories.get(filename)
+        if history is None:
+            history = self.histories[filename] = RecordHistory(history_file_for(filename))
+        return history
+    
+    def get_record_versions(self, module_name, form_name, record_id):
+        """记录的全部版本：[{'version': 版本号, 'timestamp': 时间戳, 'op': 'full'/'delta'/'delete'}, ...]"""
+        return self.get_record_history(self.data_filename_for(module_name, form_name)).get_versions(record_id)
+    
+    def get_record_as_of(self, module_name, form_name, record_id, version=None, timestamp=None):
+        """读取记录的历史版本（含明细行）：按版本号或时间（时间戳或'2026-01-01 12:00:00'），已删除或尚未创建时返回None
+        
+        需要以keep_history=True保存过记录
+        """
+        history = self.get_record_history(self.data_filename_for(module_name, form_name))
+        return history.get_record_as_of(record_id, version, timestamp)
+    
+    def get_change_log(self, filename):
+        """数据文件对应的变更日志"""
+        return ChangeLog(change_log_file_for(filename))
+    
+    def change_consumer(self, module_name, form_name, name):
+        """单据变更日志的消费者，偏移量保存在data_{模块}_{单据}.changes.{name}.offset，不同的name各自独立
+        
+        例如：consumer = engine.change_consumer('采购管理', '采购入库', 'sync')；
+        events = consumer.poll()处理后consumer.commit()，重启后从上次提交的位置继续
+        """
+        filename = self.data_filename_for(module_name, form_name)
+        offset_file = f'{os.path.splitext(filename)[0]}.changes.{name}.offset'
+        return ChangeConsumer(self.get_change_log(filename), offset_file)
+    
     def load_data(self, record_id=None):
         # 为每个单据创建独立的数据文件
-        if self.current_module and self.current_form:
-            filename = f'data_{self.current_module}_{self.current_form}.json'
-        else:
-            filename = 'form_data.json'
+        filename = self.get_data_filename()
         
-        if os.path.exists(filename):
+        if self.get_store(filename).exists():
             try:
                 if record_id:
                     # 加载特定记录
@@ -401,8 +563,8 @@ class MDAFormEngine:
                                 elif hasattr(widget, 'set'):
                                     widget.set(value)
                         
-                        # 加载明细数据
-                        detail_data = record.get('details', [])
+                        # 加载明细数据：只读取这一条记录的明细
+                        detail_data = self.get_record_details(filename, record)
                         if detail_data and hasattr(self, 'detail_tree') and self.detail_tree:
                             # 清空现有明细数据
                             for item in self.detail_tree.get_children():
@@ -410,7 +572,7 @@ class MDAFormEngine:
                             # 添加明细数据
                             for i, detail_row in enumerate(detail_data):
                                 # 获取明细列配置
-                                form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                                form_config = self.get_form_config(self.current_module, self.current_form)
                                 detail_columns = form_config.get('detail_columns', [])
                                 if detail_columns:
                                     values = []
@@ -431,30 +593,164 @@ class MDAFormEngine:
             # 首次使用，显示空列表
             self.refresh_data_list()
     
+    def get_data_filename(self):
+        """当前单据的数据文件名"""
+        if self.current_module and self.current_form:
+            return self.data_filename_for(self.current_module, self.current_form)
+        return 'form_data.json'
+    
+    def data_filename_for(self, module_name, form_name):
+        """单据的数据文件名"""
+        return f'data_{module_name}_{form_name}.json'
+    
+    def get_form_store(self, module_name, form_name):
+        """获取单据的记录存储，并按元数据中Indexed="1"的字段设置二级索引"""
+        store = self.get_store(self.data_filename_for(module_name, form_name))
+        fields = self.get_form_config(module_name, form_name).get('fields', {})
+        store.set_indexes([field_name for field_name, field_info in fields.items() if field_info.get('indexed')])
+        return store
+    
+    def find_records(self, module_name, form_name, **criteria):
+        """按表头字段查找记录：字段名=值为相等条件，字段名__prefix=值为前缀条件
+        
+        例如find_records('采购管理', '采购入库', 供应商名称='华为', 入库单号__prefix='RK2026')；
+        有Indexed="1"的字段使用索引，其余条件在候选记录中过滤
+        """
+        equals, prefixes = parse_criteria(criteria)
+        return self.get_form_store(module_name, form_name).find_records(equals, prefixes)
+    
+    def get_store(self, filename):
+        """获取数据文件对应的记录存储，每个文件只打开一次"""
+        store = self.stores.get(filename)
+        if store is None:
+            store = open_record_store(filename, self.storage, **self.storage_options)
+            self.stores[filename] = store
+            self.record_cache.track(store)
+        return store
+    
+    def close_stores(self):
+        """关闭所有打开的记录存储"""
+        self.record_cache.clear()
+        for store in self.stores.values():
+            store.close()
+        self.stores.clear()
+        self.search_indexes.clear()
+        self.histories.clear()
+        self.committers.clear()
+    
     def get_records(self, filename):
-        """获取记录列表"""
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    records = json.load(f)
-                # 确保返回的是列表
-                if isinstance(records, list):
-                    return records
-                else:
-                    # 兼容旧格式，将单个对象转换为列表
-                    return [records]
-            except:
-                return []
-        else:
-            return []
+        """获取记录列表，存储未变化时使用缓存"""
+        records = self.record_cache.get_records(self.get_store(filename))
+        if filename not in self.details_checked:
+            self.details_checked.add(filename)
+            if self.split_legacy_details(filename, records):
+                records = self.record_cache.get_records(self.get_store(filename))
+        return records
+    
+    def split_legacy_details(self, filename, records):
+        """把旧数据中嵌套在表头记录里的明细行移到明细存储，返回是否有改动
+        
+        与保存一样经组提交在变更日志的文件锁内写入，并记录变更事件
+        """
+        record_ids = [record['id'] for record in records if 'details' in record and record.get('id')]
+        if not record_ids:
+            return False
+        return any(self.get_committer(filename).submit(('split', record_ids)))
+    
+    def iter_records(self, module_name, form_name):
+        """逐条产出单据的全部记录（表头），JSON数据文件流式读取，内存占用与文件大小无关"""
+        return self.get_store(self.data_filename_for(module_name, form_name)).iter_records()
+    
+    def get_records_between(self, module_name, form_name, start=None, end=None):
+        """获取单据中created_at在[start, end)内的记录"""
+        return self.get_form_store(module_name, form_name).get_records_between(start, end)
+    
+    def detail_filename_for(self, filename):
+        """表头数据文件对应的明细数据文件，如data_采购管理_采购订单.details.json"""
+        base, ext = os.path.splitext(filename)
+        return f'{base}.details{ext}'
+    
+    def get_detail_store(self, filename):
+        """获取明细行的记录存储：每条记录的明细行保存为一项{'id': 表头记录ID, 'details': [...]}"""
+        return self.get_store(self.detail_filename_for(filename))
+    
+    def detail_entry(self, record, details):
+        """明细存储中的一项，带上表头的created_at，按月分片时与表头在同一月份"""
+        entry = {'id': record['id'], 'details': details}
+        if 'created_at' in record:
+            entry['created_at'] = record['created_at']
+        return entry
+    
+    def get_record_details(self, filename, record):
+        """获取一条记录的明细行；旧数据的明细嵌套在表头记录中"""
+        if 'details' in record:
+            return record['details']
+        entry = self.get_detail_store(filename).get_record(record.get('id'))
+        return entry['details'] if entry else []
+    
+    def get_search_index(self, filename):
+        """获取数据文件对应的全文检索索引，每个文件只打开一次"""
+        index = self.search_indexes.get(filename)
+        if index is None:
+            index = self.search_indexes[filename] = FullTextIndex(search_file_for(filename))
+        return index
+    
+    def update_search_index(self, filename, entries):
+        """保存后更新全文检索索引，entries为[(表头记录, 明细行), ...]，明细行为None表示沿用已保存的明细
+        
+        索引尚未建立时不更新，首次检索时按全部记录建立
+        """
+        index = self.get_search_index(filename)
+        if not index.exists():
+            return
+        items = []
+        for record, details in entries:
+            if details is None:
+                details = self.get_record_details(filename, record)
+            items.append((record['id'], record_text(record, details)))
+        index.update(items)
+    
+    def rebuild_search_index(self, module_name, form_name):
+        """按单据的全部记录（含明细行）重新建立全文检索索引
+        
+        在变更日志的文件锁内读取记录，重建期间的保存等到重建完成后再写入并更新索引，不会遗漏
+        """
+        filename = self.data_filename_for(module_name, form_name)
+        store = self.get_store(filename)
+        
+        def rebuild():
+            self.get_search_index(filename).rebuild(
+                (record['id'], record_text(record, self.get_record_details(filename, record)))
+                for record in store.iter_records() if record.get('id'))
+            return None, []
+        
+        self.get_change_log(filename).write(rebuild)
+    
+    def search_records(self, module_name, form_name, text, limit=20):
+        """全文检索：返回表头或明细中包含text的记录ID，按相关度从高到低，最多limit条
+        
+        例如search_records('采购管理', '采购入库', '华为 螺丝')；中文按字符二元组匹配，输入名称的一部分即可
+        """
+        filename = self.data_filename_for(module_name, form_name)
+        index = self.get_search_index(filename)
+        if not index.exists():
+            self.rebuild_search_index(module_name, form_name)
+        return index.search(text, limit)
+    
+    def get_list_records(self, filename):
+        """数据列表显示的记录：设置了list_limit时只取最近的记录（按月分片时只打开最近的分片）"""
+        if self.list_limit:
+            store = self.get_store(filename)
+            records = store.get_recent_records(self.list_limit)
+            # 只检查取出的最近记录，其中旧数据嵌套的明细行同样移到明细存储，较早的记录在读取全部记录时处理
+            if self.split_legacy_details(filename, records):
+                records = store.get_recent_records(self.list_limit)
+            return records
+        return self.get_records(filename)
     
     def get_record_by_id(self, filename, record_id):
         """根据ID获取记录"""
-        records = self.get_records(filename)
-        for record in records:
-            if record.get('id') == record_id:
-                return record
-        return None
+        return self.get_store(filename).get_record(record_id)
     
     def refresh_data_list(self):
         """刷新数据列表"""
@@ -469,13 +765,14 @@ class MDAFormEngine:
                 
                 # 清空fields_frame并重新渲染表格
                 if hasattr(self, 'fields_frame'):
-                    # 清空现有内容
+                    # 清空现有内容，编辑界面随之关闭
                     for widget in self.fields_frame.winfo_children():
                         widget.destroy()
+                    self.editing = False
                     
                     # 加载并显示实际数据列表
-                    filename = f'data_{self.current_module}_{self.current_form}.json'
-                    records = self.get_records(filename)
+                    filename = self.get_data_filename()
+                    records = self.get_list_records(filename)
                     
                     if records:
                         # 显示数据列表
@@ -496,25 +793,13 @@ class MDAFormEngine:
             return
         
         # 为每个单据创建独立的数据文件
-        if self.current_module and self.current_form:
-            filename = f'data_{self.current_module}_{self.current_form}.json'
-        else:
-            filename = 'form_data.json'
+        filename = self.get_data_filename()
+        store = self.get_store(filename)
         
-        if os.path.exists(filename):
+        if store.exists():
             try:
-                # 加载现有数据
-                records = self.get_records(filename)
-                
                 # 找到并删除记录
-                original_count = len(records)
-                records = [record for record in records if record.get('id') != record_id]
-                
-                if len(records) < original_count:
-                    # 保存数据
-                    with open(filename, 'w', encoding='utf-8') as f:
-                        json.dump(records, f, ensure_ascii=False, indent=2)
-                    
+                if self.remove_records(filename, [record_id])[0]:
                     messagebox.showinfo('操作成功', '记录已删除')
                     # 刷新数据列表
                     self.refresh_data_list()
@@ -529,6 +814,7 @@ class MDAFormEngine:
         """添加新记录"""
         # 重置表单，准备添加新记录
         self.reset_form()
+        self.editing = True
         # 清空fields_frame并显示字段编辑区域
         if hasattr(self, 'fields_frame'):
             # 清空现有内容
@@ -540,10 +826,7 @@ class MDAFormEngine:
             fields_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
             
             # 为每个字段创建一行
-            for field_name, field_info in self.fields.items():
-                if not self.is_visible(field_info['visible_ext']):
-                    continue
-                
+            for field_name, field_info in self.visible_fields:
                 # 创建行框架
                 field_row = tk.Frame(fields_container, bg='#ffffff')
                 field_row.pack(fill=tk.X, pady=8, padx=10)
@@ -580,7 +863,7 @@ class MDAFormEngine:
             
             # 添加明细表格
             if self.current_module and self.current_form:
-                form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                form_config = self.get_form_config(self.current_module, self.current_form)
                 detail_columns = form_config.get('detail_columns', [])
                 if detail_columns:
                     # 创建明细表格区域
@@ -851,6 +1134,10 @@ class MDAFormEngine:
         
         # 初始化显示第一个表单
         self.initialize_first_form()
+        
+        # 启动元数据热加载
+        if self.watch_interval:
+            self.root.after(self.watch_interval, self.poll_metadata)
     
     def populate_nav_tree(self):
         """填充导航树"""
@@ -910,10 +1197,11 @@ class MDAFormEngine:
                 for widget in self.fields_frame.winfo_children():
                     widget.destroy()
             self.field_widgets.clear()
+            self.editing = False
             
             # 加载并显示实际数据列表
-            filename = f'data_{self.current_module}_{self.current_form}.json'
-            records = self.get_records(filename)
+            filename = self.get_data_filename()
+            records = self.get_list_records(filename)
             
             if records:
                 # 显示数据列表
@@ -1075,6 +1363,7 @@ class MDAFormEngine:
     def run(self):
         self.create_form()
         self.root.mainloop()
+        self.close_stores()
     
     def show_help(self):
         """显示使用指南"""
@@ -1172,6 +1461,7 @@ class MDAFormEngine:
         if tags:
             record_id = tags[0]
             if record_id:
+                self.editing = True
                 # 清空fields_frame并显示字段编辑区域
                 if hasattr(self, 'fields_frame'):
                     # 清空现有内容
@@ -1183,10 +1473,7 @@ class MDAFormEngine:
                     fields_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
                     
                     # 为每个字段创建一行
-                    for field_name, field_info in self.fields.items():
-                        if not self.is_visible(field_info['visible_ext']):
-                            continue
-                        
+                    for field_name, field_info in self.visible_fields:
                         # 创建行框架
                         field_row = tk.Frame(fields_container, bg='#ffffff')
                         field_row.pack(fill=tk.X, pady=8, padx=10)
@@ -1223,7 +1510,7 @@ class MDAFormEngine:
                     
                     # 添加明细表格
                     if self.current_module and self.current_form:
-                        form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                        form_config = self.get_form_config(self.current_module, self.current_form)
                         detail_columns = form_config.get('detail_columns', [])
                         if detail_columns:
                             # 创建明细表格区域
@@ -1293,7 +1580,7 @@ class MDAFormEngine:
         if hasattr(self, 'detail_tree') and self.detail_tree:
             # 获取明细列配置
             if self.current_module and self.current_form:
-                form_config = self.modules.get(self.current_module, {}).get(self.current_form, {})
+                form_config = self.get_form_config(self.current_module, self.current_form)
                 detail_columns = form_config.get('detail_columns', [])
                 if detail_columns:
                     # 创建空行数据
@@ -1313,30 +1600,32 @@ class MDAFormEngine:
             else:
                 messagebox.showinfo('提示', '请选择要删除的行')
     
-    def export_data(self):
-        """导出数据"""
+    def export_data(self, start=None, end=None):
+        """导出数据，可以只导出created_at在[start, end)内的记录，如start='2026-01', end='2026-04'"""
         # 为每个单据创建独立的数据文件
-        if self.current_module and self.current_form:
-            filename = f'data_{self.current_module}_{self.current_form}.json'
-        else:
-            filename = 'form_data.json'
+        filename = self.get_data_filename()
         
-        if os.path.exists(filename):
+        if self.get_store(filename).exists():
             try:
-                # 加载数据
-                records = self.get_records(filename)
+                # 逐条读取数据，大数据文件导出时不把全部记录读入内存
+                if start is None and end is None:
+                    records = self.get_store(filename).iter_records()
+                else:
+                    records = iter(self.get_store(filename).get_records_between(start, end))
                 
                 # 导出为CSV文件
                 import csv
                 export_filename = f'export_{self.current_module}_{self.current_form}.csv'
                 
-                if records:
+                first_record = next(records, None)
+                if first_record is not None:
                     # 获取所有字段名
-                    fieldnames = list(records[0].keys())
+                    fieldnames = list(first_record.keys())
                     
                     with open(export_filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
                         writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                         writer.writeheader()
+                        writer.writerow(first_record)
                         writer.writerows(records)
                     
                     messagebox.showinfo('导出成功', f'数据已导出到 {export_filename}')
@@ -1405,5 +1694,7 @@ class MDAFormEngine:
         self.root.wait_window(guide_window)
 
 if __name__ == '__main__':
+    # 打包为exe后，多文件元数据并行解析的子进程在这里执行解析任务后退出，不会再次启动程序
+    multiprocessing.freeze_support()
     engine = MDAFormEngine('erp_form_metadata.xml')
     engine.run()
\ No newline at end of file
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import xml.etree.ElementTree as ET
 import os
+import multiprocessing
+from metadata_model import MetadataModel
 
 class MetadataEditor:
     def __init__(self):
@@ -9,6 +11,7 @@ class MetadataEditor:
         self.fields = {}
         self.field_frames = {}
         self.modules = {}
+        self.model = None
         self.current_module = None
         self.current_form = None
         self.dragged_control = None  # 存储当前拖拽的控件名称
@@ -525,69 +528,9 @@ class MetadataEditor:
             return
         
         try:
-            tree = ET.parse(self.metadata_file)
-            root = tree.getroot()
-            
-            # 加载模块结构
-            modules_elem = root.find('Modules')
-            if modules_elem:
-                for module_elem in modules_elem.findall('Module'):
-                    module_name = module_elem.get('name')
-                    self.modules[module_name] = {}
-                    
-                    forms_elem = module_elem.find('Forms')
-                    if forms_elem:
-                        for form_elem in forms_elem.findall('Form'):
-                            form_name = form_elem.get('name')
-                            # 初始化表单配置
-                            self.modules[module_name][form_name] = {
-                                'fields': {},
-                                'detail_columns': []
-                            }
-                            
-                            # 加载字段列表
-                            field_list = form_elem.find('FieldList')
-                            if field_list is not None:
-                                for field_elem in field_list:
-                                    field_type = field_elem.tag
-                                    field_name = field_elem.get('name')
-                                    field_info = {
-                                        'type': field_type,
-                                        'left': int(field_elem.get('Left', 10)),
-                                        'top': int(field_elem.get('Top', 10)),
-                                        'width': int(field_elem.get('Width', 200)),
-                                        'height': int(field_elem.get('Height', 30)),
-                                        'visible_ext': field_elem.get('VisibleExt', '111')
-                                    }
-                                    
-                                    if field_type == 'TextField':
-                                        field_info['length'] = int(field_elem.get('Length', 200))
-                                    elif field_type == 'ComboBox':
-                                        if field_elem.find('Options'):
-                                            field_info['options'] = [opt.text for opt in field_elem.find('Options').findall('Option')]
-                                    elif field_type == 'MoneyField':
-                                        field_info['length'] = int(field_elem.get('Length', 10))
-                                    
-                                    validation = field_elem.find('Validation')
-                                    if validation is not None:
-                                        field_info['validation'] = {}
-                                        if validation.find('Required') is not None:
-                                            field_info['validation']['required'] = validation.find('Required').text == '1'
-                                        if validation.find('Number') is not None:
-                                            field_info['validation']['number'] = validation.find('Number').text == '1'
-                                    
-                                    self.modules[module_name][form_name]['fields'][field_name] = field_info
-                            
-                            # 加载明细表格配置
-                            detail_table = form_elem.find('DetailTable')
-                            if detail_table is not None:
-                                for column_elem in detail_table.findall('Column'):
-                                    column_info = {
-                                        'name': column_elem.get('name'),
-                                        'width': int(column_elem.get('width', 100)),
-                                        'type': column_elem.get('type', 'TextField')
-                                    }
-                                    self.modules[module_name][form_name]['detail_columns'].append(column_info)
+            # 加载模块结构，解析结果常驻内存供切换表单时使用
+            self.model = MetadataModel(self.metadata_file)
+            self.modules = self.model.modules
             
             # 填充导航树
             self.populate_nav_tree()
@@ -878,56 +821,43 @@ class MetadataEditor:
         self.fields = {}
         self.field_frames = {}
         
-        # 加载选中表单的字段
+        # 从内存中的元数据模型加载选中表单的字段，不读取文件
         try:
-            tree = ET.parse(self.metadata_file)
-            root = tree.getroot()
-            
-            # 查找指定的模块和表单
-            modules_elem = root.find('Modules')
-            if modules_elem:
-                for module_elem in modules_elem.findall('Module'):
-                    if module_elem.get('name') == module_name:
-                        forms_elem = module_elem.find('Forms')
-                        if forms_elem:
-                            for form_elem in forms_elem.findall('Form'):
-                                if form_elem.get('name') == form_name:
-                                    field_list = form_elem.find('FieldList')
-                                    if field_list:
-                                        row = 0
-                                        for field_elem in field_list:
-                                            field_name = field_elem.get('name')
-                                            field_type = field_elem.tag
-                                            
-                                            field_frame = tk.Frame(self.scrollable_frame, relief=tk.RAISED, bd=1, bg='#f8f9fa')
-                                            field_frame.grid(row=row, column=0, columnspan=6, padx=10, pady=10, sticky=tk.W+tk.E)
-                                            
-                                            name_var = tk.StringVar(value=field_name)
-                                            type_var = tk.StringVar(value=field_type)
-                                            
-                                            tk.Label(field_frame, text='字段名称:', font=('SimHei', 10), bg='#f8f9fa', width=10).grid(row=0, column=0, padx=10, pady=5, sticky=tk.W)
-                                            tk.Entry(field_frame, textvariable=name_var, width=25, font=('SimHei', 10)).grid(row=0, column=1, padx=10, pady=5, sticky=tk.W)
-                                            
-                                            tk.Label(field_frame, text='字段类型:', font=('SimHei', 10), bg='#f8f9fa', width=10).grid(row=0, column=2, padx=10, pady=5, sticky=tk.W)
-                                            ttk.Combobox(field_frame, textvariable=type_var, values=['TextField', 'ComboBox', 'MoneyField'], width=18, font=('SimHei', 10)).grid(row=0, column=3, padx=10, pady=5, sticky=tk.W)
-                                            
-                                            var = tk.BooleanVar(value=False)
-                                            checkbox = tk.Checkbutton(field_frame, text='选中', variable=var, font=('SimHei', 10), bg='#f8f9fa')
-                                            checkbox.var = var
-                                            checkbox.grid(row=0, column=4, padx=10, pady=5, sticky=tk.W)
-                                            
-                                            # 编辑按钮
-                                            edit_btn = tk.Button(field_frame, text='编辑', width=8, height=1, bg='#17a2b8', fg='white', font=('SimHei', 9, 'bold'), command=lambda fn=field_name: self.edit_field(fn))
-                                            edit_btn.grid(row=0, column=5, padx=10, pady=5, sticky=tk.E)
-                                            
-                                            self.fields[field_name] = {
-                                                'type': type_var,
-                                                'name': name_var,
-                                                'checkbox': checkbox
-                                            }
-                                            self.field_frames[field_name] = field_frame
-                                            
-                                            row += 1
+            form_config = self.model.get_form(module_name, form_name) if self.model else None
+            if form_config:
+                row = 0
+                for field_name, field_info in form_config['fields'].items():
+                    field_type = field_info['type']
+                    
+                    field_frame = tk.Frame(self.scrollable_frame, relief=tk.RAISED, bd=1, bg='#f8f9fa')
+                    field_frame.grid(row=row, column=0, columnspan=6, padx=10, pady=10, sticky=tk.W+tk.E)
+                    
+                    name_var = tk.StringVar(value=field_name)
+                    type_var = tk.StringVar(value=field_type)
+                    
+                    tk.Label(field_frame, text='字段名称:', font=('SimHei', 10), bg='#f8f9fa', width=10).grid(row=0, column=0, padx=10, pady=5, sticky=tk.W)
+                    tk.Entry(field_frame, textvariable=name_var, width=25, font=('SimHei', 10)).grid(row=0, column=1, padx=10, pady=5, sticky=tk.W)
+                    
+                    tk.Label(field_frame, text='字段类型:', font=('SimHei', 10), bg='#f8f9fa', width=10).grid(row=0, column=2, padx=10, pady=5, sticky=tk.W)
+                    ttk.Combobox(field_frame, textvariable=type_var, values=['TextField', 'ComboBox', 'MoneyField'], width=18, font=('SimHei', 10)).grid(row=0, column=3, padx=10, pady=5, sticky=tk.W)
+                    
+                    var = tk.BooleanVar(value=False)
+                    checkbox = tk.Checkbutton(field_frame, text='选中', variable=var, font=('SimHei', 10), bg='#f8f9fa')
+                    checkbox.var = var
+                    checkbox.grid(row=0, column=4, padx=10, pady=5, sticky=tk.W)
+                    
+                    # 编辑按钮
+                    edit_btn = tk.Button(field_frame, text='编辑', width=8, height=1, bg='#17a2b8', fg='white', font=('SimHei', 9, 'bold'), command=lambda fn=field_name: self.edit_field(fn))
+                    edit_btn.grid(row=0, column=5, padx=10, pady=5, sticky=tk.E)
+                    
+                    self.fields[field_name] = {
+                        'type': type_var,
+                        'name': name_var,
+                        'checkbox': checkbox
+                    }
+                    self.field_frames[field_name] = field_frame
+                    
+                    row += 1
             
         except Exception as e:
             messagebox.showerror('错误', f'加载表单字段失败: {e}')
@@ -997,6 +927,10 @@ class MetadataEditor:
                                     column_elem.set('name', col_name)
                                     column_elem.set('width', '100')
                                     column_elem.set('type', 'TextField')
+                                
+                                # 同步内存中的元数据模型，切换表单时无需重新读取文件
+                                if self.model:
+                                    self.model.set_form(self.current_module, self.current_form, self.model.parse_form(form_elem))
                                 break
                     break
             
@@ -3044,5 +2978,7 @@ class MetadataEditor:
         cancel_btn.pack(side=tk.RIGHT, padx=10, pady=5)
 
 if __name__ == '__main__':
+    # 打包为exe后，多文件元数据并行解析的子进程在这里执行解析任务后退出，不会再次启动程序
+    multiprocessing.freeze_support()
     app = MetadataEditor()
     app.root.mainloop()
\ No newline at end of file
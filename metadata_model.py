@@ -0,0 +1,977 @@
+import xml.etree.ElementTree as ET
+import os
+import hashlib
+import gc
+import json
+import pickle
+import re
+import html
+import sys
+import threading
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+# 元数据模型：解析erp_form_metadata.xml并常驻内存，
+# 表单引擎和元数据编辑器共用同一份解析代码和解析结果
+
+# 元数据快照格式版本，快照结构变化时递增以使旧快照失效
+SNAPSHOT_VERSION = 5
+
+# 懒加载扫描用的结构标签：注释/CDATA/处理指令整体匹配后跳过，
+# 属性值允许包含'>'，只关心Modules/Module/Forms/Form/Include五种标签
+STRUCTURE_TAG = re.compile(
+    rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>'
+    rb'|<(/?)(Modules|Module|Forms|Form|Include)\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*?)(/?)>',
+    re.DOTALL)
+NAME_ATTR = re.compile(rb'\bname\s*=\s*(["\'])(.*?)\1', re.DOTALL)
+FILE_ATTR = re.compile(rb'\bfile\s*=\s*(["\'])(.*?)\1', re.DOTALL)
+# 紧凑格式：与XML等价的JSON表示，字段按FieldSpec槽位顺序存为数组，加载时无需XML解析
+COMPACT_FORMAT = 'mda-form-metadata'
+COMPACT_VERSION = 1
+XML_DECL_ENCODING = re.compile(rb'<\?xml[^>]*?encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
+
+
+def unescape_attr(value, encoding):
+    """解码属性值并还原XML实体"""
+    return html.unescape(value.decode(encoding))
+
+
+
+# 终端类型，顺序与VisibleExt三位编码（PC端、平板端、移动端）一致
+DEVICES = ('pc', 'tablet', 'mobile')
+
+# 重复出现的整数（坐标、宽高、长度）共用同一个对象
+_int_cache = {}
+
+
+def intern_int(value):
+    """整数驻留，避免每个字段各自持有相同取值的int对象"""
+    value = int(value)
+    return _int_cache.setdefault(value, value)
+
+
+def intern_str(value):
+    """字符串驻留，字段类型、VisibleExt编码、常见字段名等只保留一份"""
+    return sys.intern(value) if value is not None else None
+
+
+def is_visible_on(visible_ext, device):
+    """判断VisibleExt编码在指定终端上是否可见，缺少的位按不可见处理"""
+    index = DEVICES.index(device)
+    return len(visible_ext) > index and visible_ext[index] == '1'
+
+
+def visible_field_items(fields, device):
+    """按字段定义顺序返回指定终端可见的(字段名, 字段信息)列表"""
+    return [item for item in fields.items() if is_visible_on(item[1]['visible_ext'], device)]
+
+
+def intern_forms(modules):
+    """重新驻留字段中的重复字符串（子进程解析的结果经序列化后不再共用对象）"""
+    for forms in modules.values():
+        for form_spec in forms.values():
+            if form_spec is None:
+                continue
+            for field_spec in form_spec['fields'].values():
+                field_spec.type = intern_str(field_spec.type)
+                field_spec.visible_ext = intern_str(field_spec.visible_ext)
+
+
+def is_compact_file(metadata_file):
+    """根据文件开头判断是否为紧凑格式（JSON以'{'开头，XML以'<'开头）"""
+    with open(metadata_file, 'rb') as f:
+        head = f.read(64).lstrip(b'\xef\xbb\xbf \t\r\n')
+    return head.startswith(b'{')
+
+
+def field_to_row(field_name, field_spec):
+    """字段转换为紧凑格式的数组"""
+    validation = field_spec.validation
+    row = [field_name, field_spec.type, field_spec.left, field_spec.top, field_spec.width, field_spec.height,
+           field_spec.visible_ext, field_spec.length, field_spec.options,
+           [validation.required, validation.number] if validation is not None else None]
+    # 后来增加的槽位只在有值时追加，旧文件仍可读取
+    if field_spec.indexed:
+        row.append(True)
+    return row
+
+
+def row_to_field(row):
+    """紧凑格式的数组还原为(字段名, FieldSpec)"""
+    name, field_type, left, top, width, height, visible_ext, length, options, validation = row[:10]
+    # JSON中的取值已是int/str，直接查驻留表，省去intern_int中的类型转换
+    ints = _int_cache.setdefault
+    field_spec = FieldSpec(sys.intern(field_type), ints(left, left), ints(top, top), ints(width, width),
+                           ints(height, height), sys.intern(visible_ext),
+                           ints(length, length) if length is not None else None,
+                           [intern_str(option) for option in options] if options is not None else None,
+                           ValidationSpec(*validation) if validation is not None else None)
+    if len(row) > 10:
+        field_spec.indexed = row[10]
+    return sys.intern(name), field_spec
+
+
+def field_to_xml(parent, field_name, field_spec):
+    """字段转换为XML元素，属性与parse_field读取的属性一一对应"""
+    field_elem = ET.SubElement(parent, field_spec.type)
+    field_elem.set('name', field_name)
+    if field_spec.length is not None:
+        field_elem.set('Length', str(field_spec.length))
+    field_elem.set('Left', str(field_spec.left))
+    field_elem.set('Top', str(field_spec.top))
+    field_elem.set('Width', str(field_spec.width))
+    field_elem.set('Height', str(field_spec.height))
+    field_elem.set('VisibleExt', field_spec.visible_ext)
+    if field_spec.indexed:
+        field_elem.set('Indexed', '1')
+    if field_spec.options is not None:
+        options_elem = ET.SubElement(field_elem, 'Options')
+        for option in field_spec.options:
+            ET.SubElement(options_elem, 'Option').text = option
+    if field_spec.validation is not None:
+        validation_elem = ET.SubElement(field_elem, 'Validation')
+        if field_spec.validation.required is not None:
+            ET.SubElement(validation_elem, 'Required').text = '1' if field_spec.validation.required else '0'
+        if field_spec.validation.number is not None:
+            ET.SubElement(validation_elem, 'Number').text = '1' if field_spec.validation.number else '0'
+
+
+def load_source_model(metadata_file, use_snapshot, lazy, streaming):
+    """加载单个来源文件，作为进程池任务时在子进程中执行"""
+    return MetadataModel(metadata_file, use_snapshot=use_snapshot, lazy=lazy, streaming=streaming, workers=1)
+
+
+class SpecMapping(Mapping):
+    """紧凑规格对象的只读字典视图，兼容原有field_info['...']写法
+    
+    取值为None的槽位视为不存在的键，与原先字典中省略该键的行为一致
+    """
+    __slots__ = ()
+    _keys = ()
+    
+    def __getitem__(self, key):
+        if key in self._keys:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+    
+    def __iter__(self):
+        for key in self._keys:
+            if getattr(self, key) is not None:
+                yield key
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+    
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+    
+    def to_dict(self):
+        """转换为普通字典（嵌套规格对象一并转换）"""
+        result = {}
+        for key in self:
+            value = getattr(self, key)
+            if isinstance(value, SpecMapping):
+                value = value.to_dict()
+            elif isinstance(value, dict):
+                value = {k: v.to_dict() if isinstance(v, SpecMapping) else v for k, v in value.items()}
+            elif isinstance(value, list):
+                value = [dict(v) if isinstance(v, dict) else v for v in value]
+            result[key] = value
+        return result
+
+
+class ValidationSpec(SpecMapping):
+    """字段验证规则"""
+    __slots__ = ('required', 'number')
+    _keys = __slots__
+    
+    def __init__(self, required=None, number=None):
+        self.required = required
+        self.number = number
+
+
+class FieldSpec(SpecMapping):
+    """字段元数据"""
+    __slots__ = ('type', 'left', 'top', 'width', 'height', 'visible_ext', 'length', 'options', 'validation',
+                 'indexed')
+    _keys = __slots__
+    
+    def __init__(self, type, left=10, top=10, width=200, height=30, visible_ext='111',
+                 length=None, options=None, validation=None, indexed=None):
+        self.type = type
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.visible_ext = visible_ext
+        self.length = length
+        self.options = options
+        self.validation = validation
+        # Indexed="1"：为该字段建立二级索引，供按字段值查询记录
+        self.indexed = indexed
+
+
+class FormSpec(SpecMapping):
+    """表单元数据：字段（按定义顺序）、明细表格列和各终端的可见字段列表"""
+    __slots__ = ('fields', 'detail_columns', 'visible_fields')
+    _keys = ('fields', 'detail_columns')
+    
+    def __init__(self, fields=None, detail_columns=None):
+        self.fields = fields if fields is not None else {}
+        self.detail_columns = detail_columns
+        self.visible_fields = None
+    
+    def build_visible_fields(self):
+        """预先计算每种终端的可见字段列表，内容相同的列表共用同一个对象"""
+        items = list(self.fields.items())
+        visible_fields = []
+        for device in DEVICES:
+            visible = [item for item in items if is_visible_on(item[1]['visible_ext'], device)]
+            for previous in visible_fields:
+                if previous == visible:
+                    visible = previous
+                    break
+            visible_fields.append(visible)
+        self.visible_fields = tuple(visible_fields)
+    
+    def get_visible_fields(self, device):
+        """获取指定终端的可见字段列表"""
+        if self.visible_fields is None:
+            self.build_visible_fields()
+        return self.visible_fields[DEVICES.index(device)]
+
+
+class MetadataModel:
+    """元数据模型，解析一次后按模块、表单名称O(1)查找"""
+    
+    def __init__(self, metadata_file, use_snapshot=True, lazy=False, streaming=False, workers=None):
+        # 元数据文件，或存放按模块拆分的多个XML文件的目录
+        self.metadata_file = metadata_file
+        self.use_snapshot = use_snapshot
+        self.lazy = lazy
+        # 流式解析：逐个Form增量加载，适合超大元数据文件
+        self.streaming = streaming
+        # 模块 -> 表单 -> 表单配置；懒加载模式下未访问的表单为None
+        self.modules = {}
+        # 旧格式（单个Form）的字段和表单名称
+        self.fields = {}
+        self.form_name = None
+        # 懒加载模式下每个表单在文件中的位置：(模块, 表单) -> (偏移, 长度)
+        self.form_index = {}
+        self.metadata_encoding = None
+        # 热加载：上次检查时的文件状态(大小, 修改时间)及每个Form子树的哈希
+        self.file_state = None
+        self.form_hashes = {}
+        # 多文件目录：本文件中的<Include file="..."/>，记录为(前面的模块数, 文件路径)
+        self.include_files = []
+        # 来源文件的子模型列表[(插入位置, 子模型)]，单文件时为None
+        self.sources = None
+        # 多文件时本文件自身的模块，以及每个表单来自哪个子模型
+        self.own_modules = None
+        self.form_sources = {}
+        # 并行解析的进程数，None表示使用全部CPU核心
+        self.workers = workers
+        # 元数据文件是否为紧凑格式（JSON）
+        self.compact = False
+        self.load()
+    
+    def reload(self):
+        """重新加载元数据文件（原地更新，引用modules/fields的对象无需重新获取）"""
+        self.modules.clear()
+        self.fields.clear()
+        self.form_name = None
+        self.form_index = {}
+        self.form_hashes = {}
+        self.include_files = []
+        self.sources = None
+        self.own_modules = None
+        self.form_sources = {}
+        self.load()
+    
+    def load(self):
+        """加载元数据：目录中的每个文件、Include引用的每个文件作为独立来源并行加载"""
+        if os.path.isdir(self.metadata_file):
+            self.load_sources([(0, path) for path in self.list_directory_files()])
+            return
+        self.load_file()
+        if self.include_files:
+            base_dir = os.path.dirname(self.metadata_file)
+            self.load_sources([(position, os.path.join(base_dir, path)) for position, path in self.include_files])
+    
+    def list_directory_files(self):
+        """目录中的元数据文件，按文件名排序保证合并顺序确定"""
+        return [os.path.join(self.metadata_file, filename)
+                for filename in sorted(os.listdir(self.metadata_file)) if filename.endswith(('.xml', '.json'))]
+    
+    def load_sources(self, entries):
+        """加载各来源文件并与本文件的模块合并"""
+        self.own_modules = {module_name: dict(forms) for module_name, forms in self.modules.items()}
+        models = self.load_source_models([path for _, path in entries])
+        self.sources = [(position, model) for (position, _), model in zip(entries, models)]
+        self.merge_sources()
+    
+    def load_source_models(self, paths):
+        """加载多个来源文件，多于一个文件时使用进程池并行解析；每个文件各自使用快照缓存"""
+        args = (self.use_snapshot, self.lazy, self.streaming)
+        workers = self.workers or os.cpu_count() or 1
+        if len(paths) > 1 and workers > 1:
+            try:
+                with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as executor:
+                    models = list(executor.map(load_source_model, paths, *[repeat(arg) for arg in args]))
+                for model in models:
+                    intern_forms(model.modules)
+                return models
+            except (OSError, NotImplementedError, BrokenProcessPool):
+                # 无法创建子进程的环境下退回单进程解析
+                pass
+        return [load_source_model(path, *args) for path in paths]
+    
+    def merge_sources(self):
+        """按确定顺序合并模块：目录按文件名排序，Include按在文档中出现的位置"""
+        merged = {}
+        form_sources = {}
+        
+        def add(modules, source):
+            for module_name, forms in modules.items():
+                target = merged.setdefault(module_name, {})
+                for form_name, form_spec in forms.items():
+                    target[form_name] = form_spec
+                    form_sources[(module_name, form_name)] = source
+        
+        own_names = list(self.own_modules)
+        for position in range(len(own_names) + 1):
+            for source_position, source in self.sources:
+                if source_position == position:
+                    add(source.modules, source)
+            if position < len(own_names):
+                add({own_names[position]: self.own_modules[own_names[position]]}, None)
+        
+        # 原地更新，保证引用self.modules的调用方看到最新结果
+        for module_name in list(self.modules):
+            if module_name not in merged:
+                del self.modules[module_name]
+        for module_name, forms in merged.items():
+            self.modules[module_name] = forms
+        if list(self.modules) != list(merged):
+            for module_name in merged:
+                self.modules[module_name] = self.modules.pop(module_name)
+        self.form_sources = form_sources
+    
+    def load_file(self):
+        """加载单个元数据文件，快照有效时跳过XML解析"""
+        self.compact = is_compact_file(self.metadata_file)
+        if self.compact:
+            # 紧凑格式本身加载很快，不使用快照、懒加载和流式解析
+            self.load_compact()
+            return
+        if self.lazy and self.build_form_index():
+            return
+        if self.use_snapshot and self.load_snapshot():
+            return
+        if self.streaming:
+            self.iterparse_metadata()
+        else:
+            self.parse_metadata()
+        if self.use_snapshot:
+            self.save_snapshot()
+    
+    def get_snapshot_file(self):
+        """快照文件与元数据文件放在同一目录"""
+        return self.metadata_file + '.snapshot'
+    
+    def get_metadata_signature(self):
+        """元数据文件签名：大小、修改时间和内容哈希"""
+        stat = os.stat(self.metadata_file)
+        with open(self.metadata_file, 'rb') as f:
+            content_hash = hashlib.sha256(f.read()).hexdigest()
+        return (stat.st_size, stat.st_mtime_ns, content_hash)
+    
+    def load_snapshot(self):
+        """加载编译好的元数据快照，快照不存在或已过期时返回False"""
+        snapshot_file = self.get_snapshot_file()
+        if not os.path.exists(snapshot_file):
+            return False
+        try:
+            with open(snapshot_file, 'rb') as f:
+                snapshot = pickle.load(f)
+            if snapshot.get('version') != SNAPSHOT_VERSION:
+                return False
+            if tuple(snapshot.get('signature', ())) != self.get_metadata_signature():
+                return False
+        except Exception:
+            # 快照损坏时按过期处理，重新解析XML
+            return False
+        
+        self.modules.update(snapshot['modules'])
+        self.fields.update(snapshot['fields'])
+        self.form_name = snapshot['form_name']
+        self.include_files = snapshot['include_files']
+        return True
+    
+    def save_snapshot(self):
+        """将解析结果写入快照文件"""
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'signature': self.get_metadata_signature(),
+            'modules': self.modules,
+            'fields': self.fields,
+            'form_name': self.form_name,
+            'include_files': self.include_files
+        }
+        snapshot_file = self.get_snapshot_file()
+        temp_file = snapshot_file + '.tmp'
+        try:
+            with open(temp_file, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, snapshot_file)
+        except OSError:
+            # 目录只读等情况下不影响正常使用，下次启动仍解析XML
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+    
+    def load_compact(self):
+        """加载紧凑格式的元数据文件"""
+        # 加载过程只创建大量互不成环的小对象，暂停循环垃圾回收避免反复扫描
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.load_compact_data()
+        finally:
+            if gc_enabled:
+                gc.enable()
+    
+    def load_compact_data(self):
+        """读取紧凑格式文件并构建模型"""
+        with open(self.metadata_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('format') != COMPACT_FORMAT or data.get('version') != COMPACT_VERSION:
+            raise ValueError(f'不支持的元数据格式：{self.metadata_file}')
+        
+        for module_name, forms in data.get('modules', []):
+            module_forms = self.modules[intern_str(module_name)] = {}
+            for form_name, field_rows, detail_columns in forms:
+                form_spec = FormSpec(dict(row_to_field(row) for row in field_rows))
+                if detail_columns is not None:
+                    form_spec.detail_columns = [
+                        {'name': intern_str(name), 'width': intern_int(width), 'type': intern_str(column_type)}
+                        for name, width, column_type in detail_columns
+                    ]
+                form_spec.build_visible_fields()
+                module_forms[intern_str(form_name)] = form_spec
+        self.include_files = [tuple(include) for include in data.get('includes', [])]
+        if 'form_name' in data:
+            # 旧格式（单个Form）
+            self.form_name = data['form_name']
+            self.fields.update(row_to_field(row) for row in data['fields'])
+    
+    def export_modules(self):
+        """导出用的模块：Include模式下只导出本文件自身的模块，Include引用原样保留"""
+        modules = self.own_modules if self.own_modules is not None and self.include_files else self.modules
+        for module_name, forms in modules.items():
+            yield module_name, [(form_name, self.get_form(module_name, form_name)) for form_name in forms]
+    
+    def save_compact(self, filename):
+        """将元数据导出为紧凑格式，可直接作为MDAFormEngine的元数据文件"""
+        data = {'format': COMPACT_FORMAT, 'version': COMPACT_VERSION}
+        if self.modules or not self.fields:
+            data['modules'] = [
+                [module_name, [[form_name, [field_to_row(name, spec) for name, spec in form_spec.fields.items()],
+                                [[column['name'], column['width'], column['type']] for column in form_spec.detail_columns]
+                                if form_spec.detail_columns is not None else None]
+                               for form_name, form_spec in forms]]
+                for module_name, forms in self.export_modules()
+            ]
+            if self.include_files and self.own_modules is not None:
+                data['includes'] = [list(include) for include in self.include_files]
+        else:
+            data['form_name'] = self.form_name
+            data['fields'] = [field_to_row(name, spec) for name, spec in self.fields.items()]
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    
+    def save_xml(self, filename):
+        """将元数据导出为XML，重新加载后与当前模型完全一致"""
+        root = ET.Element('FormMetadata')
+        if self.modules or not self.fields:
+            modules_elem = ET.SubElement(root, 'Modules')
+            includes = list(self.include_files) if self.own_modules is not None else []
+            for position, (module_name, forms) in enumerate(list(self.export_modules()) + [(None, None)]):
+                for include_position, include_file in includes:
+                    if include_position == position:
+                        ET.SubElement(modules_elem, 'Include').set('file', include_file)
+                if module_name is None:
+                    break
+                module_elem = ET.SubElement(modules_elem, 'Module')
+                module_elem.set('name', module_name)
+                forms_elem = ET.SubElement(module_elem, 'Forms')
+                for form_name, form_spec in forms:
+                    form_elem = ET.SubElement(forms_elem, 'Form')
+                    form_elem.set('name', form_name)
+                    field_list = ET.SubElement(form_elem, 'FieldList')
+                    for field_name, field_spec in form_spec.fields.items():
+                        field_to_xml(field_list, field_name, field_spec)
+                    if form_spec.detail_columns is not None:
+                        detail_table = ET.SubElement(form_elem, 'DetailTable')
+                        for column in form_spec.detail_columns:
+                            column_elem = ET.SubElement(detail_table, 'Column')
+                            column_elem.set('name', column['name'])
+                            column_elem.set('width', str(column['width']))
+                            column_elem.set('type', column['type'])
+        else:
+            form_elem = ET.SubElement(root, 'Form')
+            if self.form_name is not None:
+                form_elem.set('name', self.form_name)
+            field_list = ET.SubElement(form_elem, 'FieldList')
+            for field_name, field_spec in self.fields.items():
+                field_to_xml(field_list, field_name, field_spec)
+        tree = ET.ElementTree(root)
+        ET.indent(tree, space='    ')
+        tree.write(filename, encoding='UTF-8', xml_declaration=True)
+    
+    def parse_metadata(self):
+        """解析XML元数据"""
+        tree = ET.parse(self.metadata_file)
+        root = tree.getroot()
+        
+        # 检查是否有Modules节点（新格式）
+        modules_elem = root.find('Modules')
+        if modules_elem is not None:
+            self.load_modules(modules_elem)
+        else:
+            # 向后兼容：旧格式
+            form = root.find('Form')
+            if form is not None:
+                self.form_name = form.get('name')
+                self.load_fields(form.find('FieldList'))
+    
+    def iterparse_metadata(self):
+        """流式解析XML元数据，每处理完一个Form即释放其子树，峰值内存不随文件增长"""
+        stack = []
+        modules_seen = False
+        in_first_modules = False
+        module_name = None
+        legacy_form = None
+        
+        for event, elem in ET.iterparse(self.metadata_file, events=('start', 'end')):
+            if event == 'start':
+                depth = len(stack)
+                if depth == 1 and elem.tag == 'Modules':
+                    # 与load_metadata一致，只加载第一个Modules节点
+                    in_first_modules = not modules_seen
+                    modules_seen = True
+                elif depth == 2 and in_first_modules and elem.tag == 'Module':
+                    module_name = elem.get('name')
+                    self.modules[module_name] = {}
+                stack.append(elem)
+                continue
+            
+            stack.pop()
+            depth = len(stack)
+            if depth == 4 and elem.tag == 'Form' and in_first_modules and stack[2].tag == 'Module' and stack[3].tag == 'Forms':
+                self.modules[module_name][elem.get('name')] = self.parse_form(elem)
+                # 释放已处理的Form子树
+                stack[3].remove(elem)
+            elif depth == 1 and elem.tag == 'Form' and legacy_form is None:
+                # 旧格式：只取第一个Form
+                legacy_form = (elem.get('name'), elem)
+                continue
+            elif depth == 2 and elem.tag == 'Include' and in_first_modules:
+                self.include_files.append((len(self.modules), elem.get('file')))
+            elif depth == 1 and elem.tag == 'Modules':
+                in_first_modules = False
+            
+            if depth >= 1 and elem.tag in ('Module', 'Modules'):
+                elem.clear()
+        
+        if not modules_seen and legacy_form is not None:
+            self.form_name = legacy_form[0]
+            self.load_fields(legacy_form[1].find('FieldList'))
+    
+    def load_modules(self, modules_elem):
+        """加载模块结构"""
+        for module_elem in modules_elem:
+            if module_elem.tag == 'Include':
+                self.include_files.append((len(self.modules), module_elem.get('file')))
+                continue
+            if module_elem.tag != 'Module':
+                continue
+            module_name = module_elem.get('name')
+            self.modules[module_name] = {}
+            
+            forms_elem = module_elem.find('Forms')
+            if forms_elem is not None:
+                for form_elem in forms_elem.findall('Form'):
+                    form_name = form_elem.get('name')
+                    self.modules[module_name][form_name] = self.parse_form(form_elem)
+    
+    def parse_form(self, form_elem):
+        """解析单个表单的字段列表和明细表格配置"""
+        form_spec = FormSpec()
+        
+        field_list = form_elem.find('FieldList')
+        if field_list is not None:
+            for field_elem in field_list:
+                form_spec.fields[intern_str(field_elem.get('name'))] = self.parse_field(field_elem)
+        
+        # 加载明细表格配置
+        detail_table = form_elem.find('DetailTable')
+        if detail_table is not None:
+            form_spec.detail_columns = []
+            for column_elem in detail_table.findall('Column'):
+                column_info = {
+                    'name': intern_str(column_elem.get('name')),
+                    'width': intern_int(column_elem.get('width', 100)),
+                    'type': intern_str(column_elem.get('type', 'TextField'))
+                }
+                form_spec.detail_columns.append(column_info)
+        
+        form_spec.build_visible_fields()
+        return form_spec
+    
+    def parse_field(self, field_elem):
+        """解析单个字段"""
+        field_type = intern_str(field_elem.tag)
+        field_spec = FieldSpec(
+            field_type,
+            left=intern_int(field_elem.get('Left', 10)),
+            top=intern_int(field_elem.get('Top', 10)),
+            width=intern_int(field_elem.get('Width', 200)),
+            height=intern_int(field_elem.get('Height', 30)),
+            visible_ext=intern_str(field_elem.get('VisibleExt', '111'))
+        )
+        if field_elem.get('Indexed') == '1':
+            field_spec.indexed = True
+        
+        if field_type == 'TextField':
+            field_spec.length = intern_int(field_elem.get('Length', 200))
+        elif field_type == 'ComboBox':
+            options_elem = field_elem.find('Options')
+            field_spec.options = [intern_str(opt.text) for opt in options_elem.findall('Option')] if options_elem is not None else []
+        elif field_type == 'MoneyField':
+            field_spec.length = intern_int(field_elem.get('Length', 10))
+        
+        validation = field_elem.find('Validation')
+        if validation is not None:
+            field_spec.validation = ValidationSpec()
+            if validation.find('Required') is not None:
+                field_spec.validation.required = validation.find('Required').text == '1'
+            if validation.find('Number') is not None:
+                field_spec.validation.number = validation.find('Number').text == '1'
+        
+        return field_spec
+    
+    def load_fields(self, field_list_elem):
+        """加载字段（旧格式）"""
+        for field_elem in field_list_elem:
+            self.fields[intern_str(field_elem.get('name'))] = self.parse_field(field_elem)
+    
+    def build_form_index(self):
+        """懒加载：只记录模块、表单名称及每个Form元素在文件中的位置
+        
+        旧格式（没有Modules节点）返回False，由调用方走完整解析
+        """
+        with open(self.metadata_file, 'rb') as f:
+            data = f.read()
+        
+        has_modules, modules, form_index, include_files = self.scan_forms(data)
+        if not has_modules:
+            return False
+        
+        self.modules.update(modules)
+        self.form_index = form_index
+        self.include_files = include_files
+        return True
+    
+    def scan_forms(self, data):
+        """扫描元数据文件内容，返回(是否新格式, 模块->表单骨架, 表单位置索引, Include列表)
+        
+        只扫描Modules/Module/Forms/Form/Include五种标签，不为字段创建任何对象
+        """
+        decl = XML_DECL_ENCODING.match(data)
+        self.metadata_encoding = decl.group(1).decode('ascii') if decl else None
+        encoding = self.metadata_encoding or 'utf-8'
+        
+        modules = {}
+        form_index = {}
+        path = []
+        module_name = None
+        form_name = None
+        form_offset = 0
+        has_modules = False
+        include_files = []
+        
+        for match in STRUCTURE_TAG.finditer(data):
+            closing, tag, attrs, empty = match.group(1, 2, 3, 4)
+            if tag is None:
+                # 注释、CDATA、处理指令中的内容不参与结构扫描
+                continue
+            if closing:
+                if path and path[-1] == tag:
+                    path.pop()
+                if tag == b'Form' and form_name is not None and path == [b'Modules', b'Module', b'Forms']:
+                    modules[module_name][form_name] = None
+                    form_index[(module_name, form_name)] = (form_offset, match.end() - form_offset)
+                    form_name = None
+                continue
+            
+            name_match = NAME_ATTR.search(attrs)
+            name = unescape_attr(name_match.group(2), encoding) if name_match else None
+            if tag == b'Modules' and not path:
+                has_modules = True
+            elif tag == b'Module' and path == [b'Modules']:
+                module_name = name
+                modules[module_name] = {}
+            elif tag == b'Include' and path == [b'Modules']:
+                file_match = FILE_ATTR.search(attrs)
+                include_files.append((len(modules), unescape_attr(file_match.group(2), encoding) if file_match else None))
+            elif tag == b'Form' and path == [b'Modules', b'Module', b'Forms']:
+                if empty:
+                    modules[module_name][name] = None
+                    form_index[(module_name, name)] = (match.start(), match.end() - match.start())
+                    continue
+                form_name = name
+                form_offset = match.start()
+            if not empty:
+                path.append(tag)
+        
+        return has_modules, modules, form_index, include_files
+    
+    def start_tracking(self):
+        """记录当前文件状态和每个Form子树的哈希，作为热加载比较的基准
+        
+        目录模式下记录目录中的文件列表，各来源文件由子模型分别记录
+        """
+        if self.sources is not None:
+            for _, source in self.sources:
+                source.start_tracking()
+            if os.path.isdir(self.metadata_file):
+                self.file_state = tuple(self.list_directory_files())
+                return
+        stat = os.stat(self.metadata_file)
+        if self.compact:
+            self.file_state = (stat.st_size, stat.st_mtime_ns)
+            return
+        with open(self.metadata_file, 'rb') as f:
+            data = f.read()
+        _, _, form_index, _ = self.scan_forms(data)
+        self.file_state = (stat.st_size, stat.st_mtime_ns)
+        self.form_hashes = self.hash_forms(data, form_index)
+    
+    def hash_forms(self, data, form_index):
+        """计算每个Form子树原始内容的哈希"""
+        return {key: hashlib.sha1(data[offset:offset + length]).digest()
+                for key, (offset, length) in form_index.items()}
+    
+    def check_for_changes(self):
+        """检查元数据文件是否变化，只重新解析内容有变化的表单
+        
+        文件未变化时返回None；否则返回{'added', 'changed', 'removed'}三个(模块, 表单)列表，
+        旧格式文件整体重新加载时'reloaded'为True。未变化表单的配置对象保持不变。
+        """
+        if self.file_state is None:
+            self.start_tracking()
+            return None
+        if self.sources is not None:
+            return self.check_sources_for_changes()
+        
+        stat = os.stat(self.metadata_file)
+        file_state = (stat.st_size, stat.st_mtime_ns)
+        if file_state == self.file_state:
+            return None
+        if self.compact or is_compact_file(self.metadata_file):
+            # 紧凑格式没有Form子树可比较，整体重新加载
+            return self.reload_tracked(file_state)
+        
+        with open(self.metadata_file, 'rb') as f:
+            data = f.read()
+        
+        has_modules, skeleton, form_index, include_files = self.scan_forms(data)
+        if not has_modules or include_files:
+            # 旧格式只有一个表单、新增了Include引用，直接整体重新加载
+            return self.reload_tracked(file_state)
+        
+        form_hashes = self.hash_forms(data, form_index)
+        changes = {'added': [], 'changed': [], 'removed': [], 'reloaded': False}
+        
+        # 先解析新增和内容变化的表单，全部成功后再替换，避免文件写到一半时留下不一致的模型
+        parsed = {}
+        for module_name, forms in skeleton.items():
+            current_forms = self.modules.get(module_name, {})
+            for form_name in forms:
+                key = (module_name, form_name)
+                if form_name not in current_forms:
+                    changes['added'].append(key)
+                elif form_hashes[key] != self.form_hashes.get(key):
+                    changes['changed'].append(key)
+                else:
+                    continue
+                if self.lazy and current_forms.get(form_name) is None:
+                    # 懒加载模式下尚未访问的表单保持未解析
+                    parsed[key] = None
+                else:
+                    offset, length = form_index[key]
+                    parsed[key] = self.parse_form_xml(data[offset:offset + length])
+        
+        # 删除已不存在的表单和模块
+        for module_name in list(self.modules):
+            for form_name in list(self.modules[module_name]):
+                if form_name not in skeleton.get(module_name, {}):
+                    del self.modules[module_name][form_name]
+                    changes['removed'].append((module_name, form_name))
+            if module_name not in skeleton:
+                del self.modules[module_name]
+        
+        for (module_name, form_name), form_spec in parsed.items():
+            self.modules.setdefault(module_name, {})[form_name] = form_spec
+        
+        # 保持与文件中一致的模块和表单顺序
+        for module_name, forms in skeleton.items():
+            current_forms = self.modules.setdefault(module_name, {})
+            if list(current_forms) != list(forms):
+                for form_name in forms:
+                    current_forms[form_name] = current_forms.pop(form_name)
+        if list(self.modules) != list(skeleton):
+            for module_name in skeleton:
+                self.modules[module_name] = self.modules.pop(module_name)
+        
+        self.form_index = form_index
+        self.form_hashes = form_hashes
+        self.file_state = file_state
+        return changes
+    
+    def reload_tracked(self, file_state):
+        """整体重新加载并重新记录各来源文件的状态"""
+        self.reload()
+        if self.sources is not None:
+            for _, source in self.sources:
+                source.start_tracking()
+        self.file_state = file_state
+        return {'added': [], 'changed': [], 'removed': [], 'reloaded': True}
+    
+    def check_sources_for_changes(self):
+        """多文件模式：各来源文件分别增量检查后重新合并
+        
+        Include模式下主文件本身变化时整体重新加载（来源文件仍命中各自的快照）
+        """
+        is_directory = os.path.isdir(self.metadata_file)
+        if not is_directory:
+            stat = os.stat(self.metadata_file)
+            file_state = (stat.st_size, stat.st_mtime_ns)
+            if file_state != self.file_state:
+                return self.reload_tracked(file_state)
+        
+        old_forms = {(module_name, form_name): form_spec
+                     for module_name, forms in self.modules.items() for form_name, form_spec in forms.items()}
+        reported = set()
+        reloaded = False
+        
+        if is_directory:
+            paths = self.list_directory_files()
+            if tuple(paths) != self.file_state:
+                # 文件增减时只加载新增的文件，已有文件沿用原来的子模型
+                existing = {source.metadata_file: source for _, source in self.sources}
+                new_paths = [path for path in paths if path not in existing]
+                for path, model in zip(new_paths, self.load_source_models(new_paths)):
+                    model.start_tracking()
+                    existing[path] = model
+                self.sources = [(0, existing[path]) for path in paths]
+                self.file_state = tuple(paths)
+        
+        for _, source in self.sources:
+            if source.file_state is None:
+                continue
+            changes = source.check_for_changes()
+            if changes:
+                reloaded = reloaded or changes['reloaded']
+                for kind in ('added', 'changed', 'removed'):
+                    reported.update(changes[kind])
+        
+        self.merge_sources()
+        new_forms = {(module_name, form_name): form_spec
+                     for module_name, forms in self.modules.items() for form_name, form_spec in forms.items()}
+        changes = {
+            'added': [key for key in new_forms if key not in old_forms],
+            'changed': [key for key in new_forms if key in old_forms
+                        and (new_forms[key] is not old_forms[key] or key in reported)],
+            'removed': [key for key in old_forms if key not in new_forms],
+            'reloaded': reloaded
+        }
+        if not reloaded and not any(changes[kind] for kind in ('added', 'changed', 'removed')):
+            return None
+        return changes
+    
+    def get_form(self, module_name, form_name):
+        """按模块和表单名称获取表单配置，懒加载模式下首次访问时解析该表单"""
+        forms = self.modules.get(module_name)
+        if forms is None or form_name not in forms:
+            return None
+        if forms[form_name] is None:
+            source = self.form_sources.get((module_name, form_name))
+            if source is not None:
+                # 多文件模式下由表单所在文件的子模型负责解析
+                forms[form_name] = source.get_form(module_name, form_name)
+            else:
+                forms[form_name] = self.load_form(module_name, form_name)
+                if self.own_modules is not None:
+                    self.own_modules[module_name][form_name] = forms[form_name]
+        return forms[form_name]
+    
+    def set_form(self, module_name, form_name, form_config):
+        """替换单个表单的配置，用于编辑器保存后同步内存模型"""
+        self.modules.setdefault(module_name, {})[form_name] = form_config
+    
+    def load_form(self, module_name, form_name):
+        """按索引位置只读取并解析单个Form元素"""
+        offset, length = self.form_index[(module_name, form_name)]
+        with open(self.metadata_file, 'rb') as f:
+            f.seek(offset)
+            form_xml = f.read(length)
+        return self.parse_form_xml(form_xml)
+    
+    def parse_form_xml(self, form_xml):
+        """解析单个Form元素的原始内容"""
+        parser = ET.XMLParser(encoding=self.metadata_encoding)
+        parser.feed(form_xml)
+        return self.parse_form(parser.close())
+
+
+class MetadataWatcher:
+    """以轮询方式监视元数据文件变化并增量加载，不依赖平台的文件通知机制"""
+    
+    def __init__(self, model, interval=1.0, on_change=None):
+        self.model = model
+        self.interval = interval
+        # 回调参数为check_for_changes返回的变化列表
+        self.on_change = on_change
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    def start(self):
+        """开始后台轮询"""
+        if self.model.file_state is None:
+            self.model.start_tracking()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        """停止轮询"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+    
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                changes = self.model.check_for_changes()
+            except (OSError, ET.ParseError):
+                # 文件正在被写入或暂时不完整，下一轮再检查
+                continue
+            if changes and self.on_change:
+                self.on_change(changes)
+    
@@ -0,0 +1,104 @@
+import sys
+from collections import OrderedDict
+
+# 记录缓存：数据列表、切换单据、导出等共用的各单据记录列表，
+# 以存储的版本标识（文件修改时间和大小、数据库修改计数等）判断是否过期，
+# 总内存超过上限时按最近最少使用淘汰其他单据的记录
+
+
+def deep_sizeof(value):
+    """估算记录占用的内存（字典、列表、字符串等）"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + deep_sizeof(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += deep_sizeof(item)
+    return size
+
+
+def estimate_records_size(records, samples=64):
+    """抽样估算记录列表占用的内存，不逐条计算"""
+    if not records:
+        return sys.getsizeof(records)
+    step = max(1, len(records) // samples)
+    sampled = records[::step]
+    average = sum(deep_sizeof(record) for record in sampled) / len(sampled)
+    return int(average * len(records)) + sys.getsizeof(records)
+
+
+class CacheEntry:
+    __slots__ = ('store', 'version', 'records', 'size')
+
+    def __init__(self, store, version, records, size):
+        self.store = store
+        self.version = version
+        self.records = records
+        self.size = size
+
+
+class RecordCache:
+    """按单据缓存记录列表，带内存上限的LRU缓存"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        # 数据文件名 -> CacheEntry，按最近使用排序
+        self.entries = OrderedDict()
+        self.total_size = 0
+        # 数据文件名 -> 已打开的存储，包括不经缓存读写（保存、按ID查找等）的存储
+        self.stores = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_records(self, store):
+        """获取单据的全部记录，存储未变化时直接返回缓存（返回列表的副本，调用方修改不影响缓存）"""
+        version = store.get_version()
+        entry = self.entries.get(store.filename)
+        if entry is not None and version is not None and entry.version == version:
+            self.entries.move_to_end(store.filename)
+            self.hits += 1
+            return list(entry.records)
+
+        self.misses += 1
+        self.discard(store.filename)
+        records = store.get_records()
+        if version is not None:
+            # 读取前取得的版本：读取期间发生的修改会使下次访问重新加载
+            self.add(CacheEntry(store, version, records, estimate_records_size(records)))
+        return list(records)
+
+    def track(self, store):
+        """登记已打开的存储：它常驻内存的记录不计入缓存大小，缓存超过上限时一并释放"""
+        self.stores[store.filename] = store
+
+    def add(self, entry):
+        self.entries[entry.store.filename] = entry
+        self.total_size += entry.size
+        if self.total_size > self.max_bytes:
+            # 不在缓存中的存储的常驻记录无法计入上限，内存紧张时先释放它们，需要时重新加载
+            for filename, store in self.stores.items():
+                if filename not in self.entries:
+                    store.release()
+        # 超过上限时淘汰最久未使用的单据，刚加载的单据即使单独超过上限也保留
+        while self.total_size > self.max_bytes and len(self.entries) > 1:
+            filename = next(iter(self.entries))
+            self.evict(filename)
+
+    def discard(self, filename):
+        """移除缓存项"""
+        entry = self.entries.pop(filename, None)
+        if entry is not None:
+            self.total_size -= entry.size
+        return entry
+
+    def evict(self, filename):
+        """淘汰缓存项，同时释放存储自身常驻内存的记录"""
+        entry = self.discard(filename)
+        if entry is not None:
+            entry.store.release()
+
+    def clear(self):
+        for filename in list(self.entries):
+            self.evict(filename)
+        self.stores.clear()
@@ -0,0 +1,193 @@
+import json
+import os
+import time
+from bisect import bisect_right
+from write_coordinator import FileLock, lock_file_for
+
+# 记录版本历史：每次保存、删除记录时追加一个版本到data_{模块}_{单据}.history.jsonl，
+# 每行{"id": 记录ID, "v": 版本号, "ts": 时间戳, "op": "full"/"delta"/"delete", ...}。
+# 同一记录每snapshot_interval个版本保存一次完整内容（"record"），其余版本只保存与上一版本相比改变的字段
+# （"set"）和去掉的字段（"unset"）；读取任一版本最多读取snapshot_interval行。
+# 内存中只保留每个版本的文件位置，读取历史版本时按位置读取对应的行
+
+SNAPSHOT_INTERVAL = 10
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def history_file_for(filename):
+    """data_采购管理_采购订单.json对应的版本历史data_采购管理_采购订单.history.jsonl"""
+    return os.path.splitext(filename)[0] + '.history.jsonl'
+
+
+def to_timestamp(value):
+    """时间戳（秒）或'2026-01-01 12:00:00'格式的时间"""
+    if isinstance(value, str):
+        return time.mktime(time.strptime(value, TIME_FORMAT))
+    return value
+
+
+def record_delta(old, new):
+    """new相对于old改变的字段和去掉的字段"""
+    changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+class VersionInfo:
+    """一个版本在历史文件中的位置"""
+    __slots__ = ('version', 'timestamp', 'op', 'position')
+
+    def __init__(self, version, timestamp, op, position):
+        self.version = version
+        self.timestamp = timestamp
+        self.op = op
+        self.position = position
+
+
+class RecordHistory:
+    """一个单据全部记录的版本历史"""
+
+    def __init__(self, filename, snapshot_interval=SNAPSHOT_INTERVAL):
+        self.filename = filename
+        self.lock_file = lock_file_for(filename)
+        self.snapshot_interval = snapshot_interval
+        # 记录ID -> 版本列表（按版本号升序）
+        self.versions = {}
+        self.offset = 0
+        self.file_id = None
+
+    def refresh(self):
+        """读取其他进程追加的版本；历史文件被替换后从头重读"""
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            self.versions = {}
+            self.offset = 0
+            self.file_id = None
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self.file_id or stat.st_size < self.offset:
+            self.versions = {}
+            self.offset = 0
+            self.file_id = file_id
+        if stat.st_size == self.offset:
+            return
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            position = self.offset
+            for line in f:
+                # 只处理完整的行，写到一半的最后一行留到下次
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    self.add_version(json.loads(line), position)
+                position += len(line)
+        self.offset = position
+
+    def add_version(self, entry, position):
+        info = VersionInfo(entry['v'], entry['ts'], entry['op'], position)
+        self.versions.setdefault(entry['id'], []).append(info)
+
+    def read_entry(self, f, info):
+        f.seek(info.position)
+        return json.loads(f.readline())
+
+    def reconstruct(self, f, versions, index):
+        """还原versions[index]版本的记录：从之前最近的完整版本开始依次应用差异，已删除时返回None"""
+        start = index
+        while versions[start].op == 'delta':
+            start -= 1
+        record = None
+        for info in versions[start:index + 1]:
+            entry = self.read_entry(f, info)
+            if entry['op'] == 'full':
+                record = entry['record']
+            elif entry['op'] == 'delete':
+                record = None
+            else:
+                record = dict(record)
+                record.update(entry['set'])
+                for key in entry['unset']:
+                    record.pop(key, None)
+        return record
+
+    def append(self, changes):
+        """追加一批记录的新版本，changes为[(记录ID, 保存后的完整记录), ...]，记录为None表示删除"""
+        if not changes:
+            return
+        with FileLock(self.lock_file):
+            self.refresh()
+            now = time.time()
+            data = bytearray()
+            entries = []
+            # 同一批中同一记录的多个版本依次计算差异
+            latest = {}
+            with open(self.filename, 'ab+') as f:
+                for record_id, record in changes:
+                    versions = self.versions.get(record_id, [])
+                    if record_id in latest:
+                        previous, version, timestamp = latest[record_id]
+                    elif versions:
+                        previous = self.reconstruct(f, versions, len(versions) - 1)
+                        version, timestamp = versions[-1].version, versions[-1].timestamp
+                    else:
+                        previous, version, timestamp = None, 0, now
+                    if record is None and previous is None:
+                        continue
+                    version += 1
+                    # 时钟回拨时沿用上一版本的时间，同一记录的版本时间不减小
+                    entry = {'id': record_id, 'v': version, 'ts': max(now, timestamp)}
+                    if record is None:
+                        entry['op'] = 'delete'
+                    elif previous is None or version % self.snapshot_interval == 1:
+                        entry['op'] = 'full'
+                        entry['record'] = record
+                    else:
+                        entry['op'] = 'delta'
+                        entry['set'], entry['unset'] = record_delta(previous, record)
+                    latest[record_id] = (record, version, entry['ts'])
+                    entries.append(entry)
+                if not entries:
+                    return
+                position = f.seek(0, os.SEEK_END)
+                if position != self.offset:
+                    # 最后一行不完整（写入时进程中断），从该处覆盖
+                    f.truncate(self.offset)
+                    position = self.offset
+                for entry in entries:
+                    line = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+                    self.add_version(entry, position + len(data))
+                    data += line
+                f.write(data)
+            self.offset += len(data)
+            if self.file_id is None:
+                stat = os.stat(self.filename)
+                self.file_id = (stat.st_dev, stat.st_ino)
+
+    def get_versions(self, record_id):
+        """记录的全部版本：[{'version': 版本号, 'timestamp': 时间戳, 'op': 'full'/'delta'/'delete'}, ...]"""
+        self.refresh()
+        return [{'version': info.version, 'timestamp': info.timestamp, 'op': info.op}
+                for info in self.versions.get(record_id, ())]
+
+    def get_record_as_of(self, record_id, version=None, timestamp=None):
+        """记录在指定版本或时间（时间戳或'2026-01-01 12:00:00'）的内容，都不指定时为最新版本
+
+        该版本已删除、指定的时间记录尚未创建或版本不存在时返回None
+        """
+        self.refresh()
+        versions = self.versions.get(record_id)
+        if not versions:
+            return None
+        if version is not None:
+            index = version - versions[0].version
+            if not 0 <= index < len(versions):
+                return None
+        elif timestamp is not None:
+            index = bisect_right([info.timestamp for info in versions], to_timestamp(timestamp)) - 1
+            if index < 0:
+                return None
+        else:
+            index = len(versions) - 1
+        with open(self.filename, 'rb') as f:
+            return self.reconstruct(f, versions, index)
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+
+# 记录ID生成：类似ULID的26位字符串，前10位为毫秒时间戳，后16位为随机数，均为Crockford Base32编码
+# ID按字符串排序即按生成时间排序；同一毫秒内生成的ID把随机部分加一，进程内严格递增。
+# 不同进程的随机部分各自独立（80位），同时生成也不会重复，存储可以直接按ID做范围查询和倒序分页。
+# 旧数据的ID为"秒级时间戳+4位随机数"的纯数字，不参与这里的排序约定
+
+ENCODING = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+TIME_LENGTH = 10
+RANDOM_LENGTH = 16
+RANDOM_BITS = 80
+ID_LENGTH = TIME_LENGTH + RANDOM_LENGTH
+
+
+def encode_base32(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(ENCODING[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def decode_base32(text):
+    value = 0
+    for char in text:
+        value = (value << 5) | ENCODING.index(char)
+    return value
+
+
+def is_record_id(record_id):
+    """是否为本模块生成的ID（旧数据的纯数字ID返回False）"""
+    return (isinstance(record_id, str) and len(record_id) == ID_LENGTH
+            and all(char in ENCODING for char in record_id))
+
+
+def id_timestamp(record_id):
+    """ID的生成时间（秒，浮点数）"""
+    return decode_base32(record_id[:TIME_LENGTH]) / 1000
+
+
+def id_lower_bound(timestamp):
+    """不晚于timestamp（秒）生成的ID都不小于该值，用于按时间范围查询：lower_bound(开始) <= ID < lower_bound(结束)"""
+    return encode_base32(int(timestamp * 1000), TIME_LENGTH) + '0' * RANDOM_LENGTH
+
+
+class RecordIdGenerator:
+    """单调递增的记录ID生成器，线程安全，fork出的子进程自动重新取随机数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_time = 0
+        self.last_random = 0
+        self.pid = None
+
+    def new_id(self):
+        with self.lock:
+            now = int(time.time() * 1000)
+            if self.pid != os.getpid() or now > self.last_time:
+                self.pid = os.getpid()
+                # 时钟回拨时沿用上次的时间，保证递增
+                self.last_time = max(now, self.last_time)
+                # 随机部分最高位留空，同一毫秒内连续加一也不会溢出
+                self.last_random = int.from_bytes(os.urandom(10), 'big') >> 1
+            else:
+                self.last_random += 1
+                if self.last_random >> RANDOM_BITS:
+                    self.last_time += 1
+                    self.last_random = int.from_bytes(os.urandom(10), 'big') >> 1
+            return encode_base32(self.last_time, TIME_LENGTH) + encode_base32(self.last_random, RANDOM_LENGTH)
+
+
+# 进程内共用的生成器
+default_generator = RecordIdGenerator()
+
+
+def new_record_id():
+    """生成新的记录ID"""
+    return default_generator.new_id()
@@ -0,0 +1,130 @@
+import json
+from bisect import bisect_left, insort
+
+# 记录二级索引：元数据中标记Indexed="1"的表头字段，按字段值 -> 记录键建立内存索引，
+# 按字段值相等和前缀查询时不再逐条扫描全部记录。
+# 索引与存储中常驻内存的记录一起维护：保存、删除时增量更新，记录重新加载后按需重建
+
+
+def index_value(value):
+    """索引中的取值统一为字符串，查询条件按同样的方式转换：文本不变，null为None（不匹配任何条件），
+    其余取值为紧凑的JSON文本（true、5、2.5），与SQLite存储中field_expression的结果一致
+    """
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def parse_criteria(criteria):
+    """把find_records的关键字参数拆分为相等条件和前缀条件：字段名__prefix表示前缀匹配"""
+    equals = {}
+    prefixes = {}
+    for key, value in criteria.items():
+        if key.endswith('__prefix'):
+            prefixes[key[:-len('__prefix')]] = index_value(value)
+        else:
+            equals[key] = index_value(value)
+    return equals, prefixes
+
+
+def record_matches(record, equals, prefixes):
+    """记录是否满足全部查询条件"""
+    for field_name, value in equals.items():
+        if value is None or index_value(record.get(field_name)) != value:
+            return False
+    for field_name, prefix in prefixes.items():
+        value = index_value(record.get(field_name))
+        if prefix is None or value is None or not value.startswith(prefix):
+            return False
+    return True
+
+
+class FieldIndex:
+    """单个字段的索引：取值 -> 记录键（按添加顺序），另有排好序的取值列表供前缀查询"""
+    __slots__ = ('keys', 'sorted_values')
+
+    def __init__(self):
+        self.keys = {}
+        self.sorted_values = []
+
+    def add(self, value, key):
+        keys = self.keys.get(value)
+        if keys is None:
+            keys = self.keys[value] = {}
+            insort(self.sorted_values, value)
+        keys[key] = None
+
+    def remove(self, value, key):
+        keys = self.keys.get(value)
+        if keys is None:
+            return
+        keys.pop(key, None)
+        if not keys:
+            del self.keys[value]
+            del self.sorted_values[bisect_left(self.sorted_values, value)]
+
+    def lookup(self, value):
+        return list(self.keys.get(value, ()))
+
+    def lookup_prefix(self, prefix):
+        result = []
+        position = bisect_left(self.sorted_values, prefix)
+        while position < len(self.sorted_values) and self.sorted_values[position].startswith(prefix):
+            result.extend(self.keys[self.sorted_values[position]])
+            position += 1
+        return result
+
+
+class RecordIndex:
+    """一个单据的全部字段索引"""
+
+    def __init__(self, field_names, records=None):
+        self.fields = {field_name: FieldIndex() for field_name in field_names}
+        if records:
+            for key, record in records.items():
+                self.add(key, record)
+
+    def add(self, key, record):
+        for field_name, field_index in self.fields.items():
+            value = index_value(record.get(field_name))
+            if value is not None:
+                field_index.add(value, key)
+
+    def remove(self, key, record):
+        for field_name, field_index in self.fields.items():
+            value = index_value(record.get(field_name))
+            if value is not None:
+                field_index.remove(value, key)
+
+    def replace(self, key, old_record, record):
+        """记录更新：旧记录的取值移出索引，新记录的取值加入"""
+        if old_record is not None:
+            self.remove(key, old_record)
+        self.add(key, record)
+
+    def find(self, records, equals, prefixes):
+        """在ID索引records（记录键 -> 记录）中查找满足条件的记录
+
+        有索引的条件中先取候选最少的一个，再用其余条件过滤候选；没有可用索引时逐条扫描
+        """
+        if None in equals.values() or None in prefixes.values():
+            return []
+        candidates = None
+        for field_name, value in equals.items():
+            if field_name in self.fields:
+                keys = self.fields[field_name].lookup(value)
+                if candidates is None or len(keys) < len(candidates):
+                    candidates = keys
+        for field_name, prefix in prefixes.items():
+            if field_name in self.fields and (candidates is None or len(candidates) > 1):
+                keys = self.fields[field_name].lookup_prefix(prefix)
+                if candidates is None or len(keys) < len(candidates):
+                    candidates = keys
+        if candidates is None:
+            return [record for record in records.values() if record_matches(record, equals, prefixes)]
+        result = []
+        for key in candidates:
+            record = records.get(key)
+            if record is not None and record_matches(record, equals, prefixes):
+                result.append(record)
+        return result
@@ -0,0 +1,419 @@
+import json
+import os
+import threading
+from json_stream import iter_json_array
+from record_index import RecordIndex, record_matches
+from write_coordinator import FileLock, GroupCommitter, atomic_write, lock_file_for
+
+# 表单记录存储：引擎通过统一接口读写单据记录，存储方式可以替换
+# 每个存储实例对应一个单据，以原来的数据文件名data_{模块}_{单据}.json作为标识
+
+
+class RecordStore:
+    """记录存储接口"""
+
+    def __init__(self, filename):
+        # 单据的数据文件名，其他存储方式也用它区分不同单据
+        self.filename = filename
+        self.anonymous_count = 0
+        # 建立二级索引的字段（元数据中Indexed="1"），内存索引在首次查询时建立
+        self.indexed_fields = ()
+        self.index = None
+
+    def exists(self):
+        """是否已有该单据的数据"""
+        raise NotImplementedError
+
+    def get_records(self):
+        """获取全部记录，按添加顺序"""
+        raise NotImplementedError
+
+    def iter_records(self):
+        """逐条产出全部记录，按添加顺序；导出、迁移等只需遍历一次的场景使用，不把全部记录读入内存"""
+        yield from self.get_records()
+
+    def get_record(self, record_id):
+        """根据ID获取记录，不存在时返回None"""
+        for record in self.get_records():
+            if record.get('id') == record_id:
+                return record
+        return None
+
+    def get_records_between(self, start=None, end=None):
+        """获取created_at在[start, end)内的记录，start、end可以是'2026-01'、'2026-01-15'等日期前缀"""
+        records = []
+        for record in self.get_records():
+            created_at = record.get('created_at')
+            if not isinstance(created_at, str):
+                continue
+            if (start is None or created_at >= start) and (end is None or created_at < end):
+                records.append(record)
+        return records
+
+    def get_recent_records(self, limit):
+        """获取最近添加的limit条记录，按添加顺序"""
+        return self.get_records()[-limit:] if limit else []
+
+    def scan_records(self, start=None, end=None, reverse=False, limit=None):
+        """按ID范围获取记录：start <= ID < end，按ID升序（reverse=True时降序，即最新的在前），最多limit条
+
+        新记录的ID按生成时间递增（见record_id），按时间范围查询和倒序分页都可以直接按ID进行；
+        记录按添加顺序保存时ID基本有序，这里的排序接近线性
+        """
+        records = []
+        for record in self.get_records():
+            record_id = record.get('id')
+            if not isinstance(record_id, str):
+                continue
+            if (start is None or record_id >= start) and (end is None or record_id < end):
+                records.append(record)
+        records.sort(key=lambda record: record['id'], reverse=reverse)
+        return records if limit is None else records[:limit]
+
+    def set_indexes(self, field_names):
+        """设置建立二级索引的字段"""
+        field_names = tuple(field_names)
+        if field_names != self.indexed_fields:
+            self.indexed_fields = field_names
+            self.index = None
+
+    def find_records(self, equals=None, prefixes=None):
+        """查找字段值等于equals、以prefixes开头的记录，有索引的字段使用索引"""
+        equals = equals or {}
+        prefixes = prefixes or {}
+        return [record for record in self.get_records() if record_matches(record, equals, prefixes)]
+
+    def get_index(self, records):
+        """常驻内存的记录（记录键 -> 记录）对应的索引，尚未建立时按当前记录建立"""
+        if self.index is None and self.indexed_fields:
+            self.index = RecordIndex(self.indexed_fields, records)
+        return self.index
+
+    def put_record(self, record):
+        """保存记录：ID已存在时原位置更新，否则追加；返回是否为更新"""
+        raise NotImplementedError
+
+    def put_records(self, records):
+        """批量保存记录，整批在一次写入（事务）中完成；返回每条记录是否为更新"""
+        return [self.put_record(record) for record in records]
+
+    def delete_record(self, record_id):
+        """删除记录，返回是否找到并删除"""
+        raise NotImplementedError
+
+    def delete_records(self, record_ids):
+        """批量删除记录，整批在一次写入（事务）中完成；返回每条记录是否找到并删除"""
+        return [self.delete_record(record_id) for record_id in record_ids]
+
+    def get_version(self):
+        """数据版本标识，数据变化后随之变化，供记录缓存判断是否过期；None表示不支持缓存"""
+        return None
+
+    def release(self):
+        """释放常驻内存的记录，之后访问时重新加载"""
+        pass
+
+    def close(self):
+        """释放存储占用的资源"""
+        pass
+
+    def record_key(self, record_id, records=None):
+        """记录在ID索引中的键；没有ID或ID重复的记录（旧数据）用内部键保存，不会互相覆盖"""
+        if record_id and (records is None or record_id not in records):
+            return record_id
+        self.anonymous_count += 1
+        return ('', self.anonymous_count)
+
+
+def duplicate_ids_error(filename, duplicates):
+    """原有数据文件中记录ID重复、不能迁移到其他存储方式时的错误"""
+    return ValueError(f'{filename}中的记录ID重复，无法迁移：{", ".join(map(str, duplicates))}')
+
+
+def check_unique_ids(filename, records):
+    """迁移原有数据文件前检查记录ID，有重复时抛出ValueError（不迁移，原文件保持不变）；返回记录数
+
+    没有ID的记录不算重复，迁移时都保留
+    """
+    seen = set()
+    duplicates = {}
+    count = 0
+    for record in records:
+        count += 1
+        record_id = record.get('id')
+        if not record_id:
+            continue
+        if record_id in seen:
+            duplicates[record_id] = None
+        else:
+            seen.add(record_id)
+    if duplicates:
+        raise duplicate_ids_error(filename, duplicates)
+    return count
+
+
+def tombstone_file_for(filename):
+    """data_采购管理_采购订单.json对应的墓碑文件data_采购管理_采购订单.tombstones"""
+    return os.path.splitext(filename)[0] + '.tombstones'
+
+
+class JsonRecordStore(RecordStore):
+    """JSON文件存储：整个单据的记录保存为一个JSON数组
+    
+    记录加载后常驻内存，并按ID建立索引（ID -> 记录，保持文件中的顺序），
+    按ID读取和更新时不再逐条查找；文件被其他程序修改后自动重新加载。
+    保存和删除在文件锁内先载入其他进程的修改再写回，多个引擎进程同时保存不会互相覆盖。
+    删除不重写数据文件，只把ID追加到墓碑文件，读取时跳过；墓碑较多时整理（vacuum）：
+    重写一次数据文件并清除墓碑，之后的保存本来就要重写数据文件，也会顺带清除
+    """
+
+    def __init__(self, filename, commit_window=0.0, vacuum_ratio=0.1, min_tombstones=1000, background=True):
+        super().__init__(filename)
+        self.records = None
+        # 加载时数据文件的状态(修改时间, 大小, inode)
+        self.file_state = None
+        self.lock_file = lock_file_for(filename)
+        # 组提交：commit_window秒内到达的保存合并为一次写入
+        self.committer = GroupCommitter(self.commit, commit_window)
+        # 墓碑文件第一行为所属数据文件的状态，数据文件重写后原有的墓碑自动失效；之后每行一个已删除的ID
+        self.tombstone_file = tombstone_file_for(filename)
+        # 已读取到的墓碑文件位置（0表示没有属于当前数据文件的墓碑）和墓碑数
+        self.tombstone_offset = 0
+        self.tombstone_count = 0
+        # 墓碑数不少于min_tombstones且超过记录数的vacuum_ratio倍时整理
+        self.vacuum_ratio = vacuum_ratio
+        self.min_tombstones = min_tombstones
+        # 在后台线程中整理，不阻塞删除操作
+        self.background = background
+        self.vacuum_thread = None
+        # 后台整理线程与其他线程的加载互斥
+        self.lock = threading.RLock()
+
+    def exists(self):
+        return os.path.exists(self.filename)
+
+    def get_file_state(self):
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def load(self):
+        """返回ID索引，数据文件自上次加载或写入后没有变化时直接使用内存中的记录，只读入新增的墓碑"""
+        with self.lock:
+            file_state = self.get_file_state()
+            if self.records is None or file_state != self.file_state:
+                records = {}
+                for record in self.read_records():
+                    records[self.record_key(record.get('id'), records)] = record
+                self.records = records
+                self.file_state = file_state
+                self.tombstone_offset = 0
+                self.tombstone_count = 0
+                self.index = None
+            record_ids, self.tombstone_offset = self.read_tombstones(self.file_state, self.tombstone_offset)
+            for record_id in record_ids:
+                self.tombstone_count += 1
+                self.apply(self.records, ('del', record_id))
+            return self.records
+
+    def read_tombstones(self, file_state, offset=0):
+        """读取墓碑文件中offset之后的ID，返回(ID列表, 读到的位置)；墓碑文件不属于该状态的数据文件时返回([], 0)"""
+        try:
+            f = open(self.tombstone_file, 'rb')
+        except FileNotFoundError:
+            return [], 0
+        with f:
+            if offset == 0:
+                header = f.readline()
+                if not header.endswith(b'\n') or json.loads(header) != {'data': list(file_state or ())}:
+                    return [], 0
+                offset = len(header)
+            f.seek(offset)
+            data = f.read()
+        # 只处理完整的行，写到一半的最后一行留到下次
+        end = data.rfind(b'\n') + 1
+        return [json.loads(line) for line in data[:end].splitlines() if line.strip()], offset + end
+
+    def write_tombstones(self, record_ids):
+        """把删除的ID追加到墓碑文件（调用方持有文件锁并已载入最新数据）"""
+        data = b''.join((json.dumps(record_id, ensure_ascii=False) + '\n').encode('utf-8') for record_id in record_ids)
+        if self.tombstone_offset == 0:
+            # 当前数据文件还没有墓碑：新建墓碑文件，原有的过期墓碑一并丢弃
+            header = (json.dumps({'data': list(self.file_state)}) + '\n').encode('utf-8')
+            with open(self.tombstone_file, 'wb') as f:
+                f.write(header + data)
+            self.tombstone_offset = len(header) + len(data)
+        else:
+            with open(self.tombstone_file, 'r+b') as f:
+                # 截掉写到一半（进程中断）的最后一行
+                f.seek(self.tombstone_offset)
+                f.truncate()
+                f.write(data)
+            self.tombstone_offset += len(data)
+        self.tombstone_count += len(record_ids)
+
+    def get_version(self):
+        try:
+            tombstone_size = os.path.getsize(self.tombstone_file)
+        except FileNotFoundError:
+            tombstone_size = None
+        return (self.get_file_state(), tombstone_size)
+
+    def release(self):
+        self.records = None
+        self.file_state = None
+        self.index = None
+
+    def get_records(self):
+        return list(self.load().values())
+
+    def get_record(self, record_id):
+        return self.load().get(record_id) if record_id else None
+
+    def iter_records(self):
+        # 记录已常驻内存且文件没有变化时直接遍历，否则流式读取文件，不建立ID索引也不常驻内存
+        if self.records is not None and self.get_version() == self.loaded_version():
+            yield from list(self.records.values())
+        elif os.path.exists(self.filename):
+            deleted = set(self.read_tombstones(self.get_file_state())[0])
+            for record in iter_json_array(self.filename):
+                if not deleted or record.get('id') not in deleted:
+                    yield record
+
+    def loaded_version(self):
+        """内存中的记录对应的版本标识"""
+        return (self.file_state, self.tombstone_offset or None)
+
+    def find_records(self, equals=None, prefixes=None):
+        records = self.load()
+        index = self.get_index(records)
+        if index is None:
+            return super().find_records(equals, prefixes)
+        return index.find(records, equals or {}, prefixes or {})
+
+    def read_records(self):
+        """从数据文件读取全部记录"""
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+                # 确保返回的是列表
+                if isinstance(records, list):
+                    return records
+                else:
+                    # 兼容旧格式，将单个对象转换为列表
+                    return [records]
+            except:
+                return []
+        else:
+            return []
+
+    def put_record(self, record):
+        return self.committer.submit(('put', record))
+
+    def put_records(self, records):
+        # 整批已经是一次写入，不经过组提交；与提交者之间由文件锁互斥
+        return self.commit([('put', record) for record in records])
+
+    def delete_record(self, record_id):
+        deleted = self.committer.submit(('del', record_id))
+        self.maybe_vacuum()
+        return deleted
+
+    def delete_records(self, record_ids):
+        deleted = self.commit([('del', record_id) for record_id in record_ids])
+        self.maybe_vacuum()
+        return deleted
+
+    def commit(self, ops):
+        """在文件锁内载入最新数据，依次应用一批保存、删除操作，整体只写一次
+
+        只有删除时追加墓碑，不重写数据文件
+        """
+        with FileLock(self.lock_file), self.lock:
+            records = self.load()
+            results = [self.apply(records, op) for op in ops]
+            if any(kind == 'put' for kind, _ in ops):
+                self.write_records(records.values())
+            else:
+                deleted = [value for (_, value), result in zip(ops, results) if result]
+                if deleted:
+                    self.write_tombstones(deleted)
+        return results
+
+    def apply(self, records, op):
+        """应用单个操作：put返回是否为更新，del返回是否找到并删除"""
+        kind, value = op
+        if kind == 'put':
+            record_id = value.get('id')
+            updated = bool(record_id) and record_id in records
+            key = self.record_key(record_id)
+            if self.index is not None:
+                self.index.replace(key, records.get(key), value)
+            # 已有的键赋值保持原位置，新键追加到末尾
+            records[key] = value
+            return updated
+        if not value or value not in records:
+            return False
+        old_record = records.pop(value)
+        if self.index is not None:
+            self.index.remove(value, old_record)
+        return True
+
+    def write_records(self, records):
+        """整体写回数据文件（原子替换），并记录写入后的文件状态，内存中的记录无需重新加载
+
+        写入的是去掉已删除记录后的当前状态，原有的墓碑随之失效并被清除
+        """
+        data = json.dumps(list(records), ensure_ascii=False, indent=2).encode('utf-8')
+        atomic_write(self.filename, data)
+        if self.records is not None:
+            self.file_state = self.get_file_state()
+        if self.tombstone_offset or os.path.exists(self.tombstone_file):
+            try:
+                os.remove(self.tombstone_file)
+            except FileNotFoundError:
+                pass
+        self.tombstone_offset = 0
+        self.tombstone_count = 0
+
+    def needs_vacuum(self):
+        return (self.tombstone_count >= self.min_tombstones
+                and self.tombstone_count > len(self.records or ()) * self.vacuum_ratio)
+
+    def maybe_vacuum(self):
+        """墓碑超过阈值时整理"""
+        if not self.needs_vacuum():
+            return
+        if not self.background:
+            self.vacuum()
+        elif self.vacuum_thread is None or not self.vacuum_thread.is_alive():
+            self.vacuum_thread = threading.Thread(target=self.vacuum, daemon=True)
+            self.vacuum_thread.start()
+
+    def vacuum(self):
+        """物理删除墓碑标记的记录：重写一次数据文件，返回清除的墓碑数"""
+        with FileLock(self.lock_file), self.lock:
+            records = self.load()
+            count = self.tombstone_count
+            if count:
+                self.write_records(records.values())
+        return count
+
+
+def open_record_store(filename, backend='json', **options):
+    """按存储方式创建单据的记录存储"""
+    if backend == 'json':
+        return JsonRecordStore(filename, **options)
+    if backend == 'sqlite':
+        from sqlite_record_store import SqliteRecordStore
+        return SqliteRecordStore(filename, **options)
+    if backend == 'journal':
+        from journal_record_store import JournalRecordStore
+        return JournalRecordStore(filename, **options)
+    if backend == 'sharded':
+        from sharded_record_store import ShardedRecordStore
+        return ShardedRecordStore(filename, **options)
+    raise ValueError(f'未知的存储方式：{backend}')
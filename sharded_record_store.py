@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import shutil
+import time
+from itertools import islice
+from record_store import RecordStore, JsonRecordStore, check_unique_ids, open_record_store
+from record_id import is_record_id, id_timestamp
+from write_coordinator import FileLock, atomic_write, lock_file_for, temp_file_for
+
+# 按月分片的记录存储：单据的记录按created_at所在月份保存到data_{模块}_{单据}.shards/目录下的
+# 2026-01.json等分片文件，目录中的manifest.json记录每个分片的记录数和ID范围。
+# 数据列表只看最近的记录、导出和查询某个时间段时只打开涉及的分片，历史数据再多也不影响最近数据的访问。
+# 没有created_at的旧数据放在0000-00分片
+
+MANIFEST_VERSION = 1
+UNDATED_SHARD = '0000-00'
+MONTH_PATTERN = re.compile(r'\d{4}-\d{2}')
+# 拆分原有数据文件时每批的记录数
+MIGRATE_BATCH_SIZE = 10000
+
+
+def shard_directory_for(filename):
+    """data_采购管理_采购订单.json对应的分片目录data_采购管理_采购订单.shards"""
+    return os.path.splitext(filename)[0] + '.shards'
+
+
+def shard_month(created_at):
+    """created_at所在的月份（分片名），取值不是日期时归入0000-00"""
+    if isinstance(created_at, str) and MONTH_PATTERN.match(created_at):
+        return created_at[:7]
+    return UNDATED_SHARD
+
+
+class ShardedRecordStore(RecordStore):
+    """按月分片的存储，每个分片是一个独立的记录存储（默认为JSON文件），首次打开时自动拆分原有的JSON数据文件"""
+
+    def __init__(self, filename, shard_backend='json', **shard_options):
+        super().__init__(filename)
+        self.directory = shard_directory_for(filename)
+        self.manifest_file = os.path.join(self.directory, 'manifest.json')
+        # 保存、删除在清单的文件锁内进行，分片和清单一起更新
+        self.lock_file = lock_file_for(self.manifest_file)
+        # 分片的存储方式及其参数
+        self.shard_backend = shard_backend
+        self.shard_options = shard_options
+        # 月份 -> {'count': 记录数, 'min_id': 最小ID, 'max_id': 最大ID}
+        self.shards = {}
+        self.revision = 0
+        self.manifest_state = None
+        # 已打开的分片：月份 -> 记录存储
+        self.stores = {}
+        self.migrate()
+
+    def migrate(self):
+        """分片目录不存在而JSON数据文件存在时，把原有记录按月份拆分到分片
+
+        在原数据文件的文件锁内进行，多个进程同时首次打开时只有一个进程拆分；
+        先拆分到临时目录，全部完成后再改名为分片目录，中途中断不会留下只有部分记录的分片目录
+        """
+        if os.path.exists(self.manifest_file) or not os.path.exists(self.filename):
+            return
+        legacy = JsonRecordStore(self.filename)
+        with FileLock(legacy.lock_file):
+            if os.path.exists(self.manifest_file) or not os.path.exists(self.filename):
+                return
+            # 记录ID重复时不拆分，否则后面的记录会覆盖前面的
+            check_unique_ids(self.filename, legacy.iter_records())
+            base, ext = os.path.splitext(self.filename)
+            builder = ShardedRecordStore(temp_file_for(base) + ext, self.shard_backend, **self.shard_options)
+            try:
+                # 流式读取原有文件，每次拆分一批，导入大文件时不把全部记录读入内存
+                records = legacy.iter_records()
+                while True:
+                    batch = list(islice(records, MIGRATE_BATCH_SIZE))
+                    if not batch:
+                        break
+                    builder.put_records(batch)
+                builder.close()
+                os.replace(builder.directory, self.directory)
+            except BaseException:
+                builder.close()
+                shutil.rmtree(builder.directory, ignore_errors=True)
+                raise
+            # 拆分完成后保留原文件作为备份，避免与分片中的数据混淆
+            os.replace(self.filename, self.filename + '.migrated')
+
+    def exists(self):
+        return os.path.exists(self.manifest_file)
+
+    def get_manifest_state(self):
+        try:
+            stat = os.stat(self.manifest_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def load_manifest(self):
+        """清单自上次读取后有变化（其他进程写入）时重新读取"""
+        state = self.get_manifest_state()
+        if state == self.manifest_state:
+            return
+        if state is None:
+            self.shards = {}
+            self.revision = 0
+        else:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.shards = manifest['shards']
+            self.revision = manifest['revision']
+        self.manifest_state = state
+
+    def write_manifest(self):
+        # 每次写入都递增修订号，清单文件随之变化，可作为整个单据的版本标识
+        self.revision += 1
+        manifest = {'version': MANIFEST_VERSION, 'revision': self.revision,
+                    'shards': {month: self.shards[month] for month in sorted(self.shards)}}
+        atomic_write(self.manifest_file, json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+        self.manifest_state = self.get_manifest_state()
+
+    def shard_store(self, month):
+        """打开（或复用）月份对应的分片存储"""
+        store = self.stores.get(month)
+        if store is None:
+            filename = os.path.join(self.directory, f'{month}.json')
+            store = open_record_store(filename, self.shard_backend, **self.shard_options)
+            store.set_indexes(self.indexed_fields)
+            self.stores[month] = store
+        return store
+
+    def months(self, reverse=False):
+        """已有的分片月份，按时间排序"""
+        self.load_manifest()
+        return sorted(self.shards, reverse=reverse)
+
+    def candidate_months(self, record_id, preferred=None):
+        """可能包含该ID的分片，最可能的在前：指定的月份、ID生成时间所在的月份、ID范围包含该ID的月份（新的在前）"""
+        candidates = []
+        if preferred is not None:
+            candidates.append(preferred)
+        if is_record_id(record_id):
+            candidates.append(time.strftime('%Y-%m', time.localtime(id_timestamp(record_id))))
+        for month in self.months(reverse=True):
+            shard = self.shards[month]
+            if shard['min_id'] is not None and shard['min_id'] <= record_id <= shard['max_id']:
+                candidates.append(month)
+        return [month for month in dict.fromkeys(candidates) if month in self.shards]
+
+    def locate(self, record_id, preferred=None):
+        """查找记录所在的分片，返回(月份, 记录)，不存在时返回(None, None)"""
+        if not record_id:
+            return None, None
+        for month in self.candidate_months(record_id, preferred):
+            record = self.shard_store(month).get_record(record_id)
+            if record is not None:
+                return month, record
+        return None, None
+
+    def get_version(self):
+        return self.get_manifest_state()
+
+    def release(self):
+        for store in self.stores.values():
+            store.release()
+
+    def close(self):
+        for store in self.stores.values():
+            store.close()
+        self.stores.clear()
+
+    def set_indexes(self, field_names):
+        super().set_indexes(field_names)
+        for store in self.stores.values():
+            store.set_indexes(self.indexed_fields)
+
+    def get_records(self):
+        records = []
+        for month in self.months():
+            records.extend(self.shard_store(month).get_records())
+        return records
+
+    def iter_records(self):
+        for month in self.months():
+            yield from self.shard_store(month).iter_records()
+
+    def get_record(self, record_id):
+        self.load_manifest()
+        return self.locate(record_id)[1]
+
+    def get_records_between(self, start=None, end=None):
+        records = []
+        for month in self.months():
+            # 分片覆盖[month, 下个月)，与[start, end)没有交集的分片不打开
+            if start is not None and (month == UNDATED_SHARD or month < start[:7]):
+                continue
+            if end is not None and month >= end:
+                continue
+            records.extend(self.shard_store(month).get_records_between(start, end))
+        return records
+
+    def get_recent_records(self, limit):
+        groups = []
+        count = 0
+        for month in self.months(reverse=True):
+            if count >= limit:
+                break
+            shard_records = self.shard_store(month).get_records()
+            groups.append(shard_records)
+            count += len(shard_records)
+        records = [record for shard_records in reversed(groups) for record in shard_records]
+        return records[-limit:] if limit else []
+
+    def find_records(self, equals=None, prefixes=None):
+        records = []
+        for month in self.months():
+            records.extend(self.shard_store(month).find_records(equals, prefixes))
+        return records
+
+    def put_record(self, record):
+        return self.put_records([record])[0]
+
+    def put_records(self, records):
+        """按created_at分组后每个分片写入一次；已有记录的created_at改变时从原分片移到新分片"""
+        os.makedirs(self.directory, exist_ok=True)
+        with FileLock(self.lock_file):
+            self.load_manifest()
+            batches = {}
+            moved = {}
+            results = []
+            for record in records:
+                record_id = record.get('id')
+                target = shard_month(record.get('created_at')) if 'created_at' in record else None
+                month, existing = self.locate(record_id, target)
+                results.append(month is not None)
+                if target is None:
+                    # 更新时没有带上created_at的记录沿用原来的创建时间，留在原分片
+                    if existing is not None and 'created_at' in existing:
+                        record = dict(record, created_at=existing['created_at'])
+                    target = month if month is not None else UNDATED_SHARD
+                if month is not None and month != target:
+                    moved.setdefault(month, []).append(record_id)
+                batches.setdefault(target, []).append(record)
+            for month, record_ids in moved.items():
+                store = self.shard_store(month)
+                for record_id in record_ids:
+                    store.delete_record(record_id)
+                self.shards[month]['count'] -= len(record_ids)
+            for month, batch in batches.items():
+                updated = self.shard_store(month).put_records(batch)
+                shard = self.shards.setdefault(month, {'count': 0, 'min_id': None, 'max_id': None})
+                shard['count'] += updated.count(False)
+                record_ids = [record['id'] for record in batch if isinstance(record.get('id'), str)]
+                if record_ids:
+                    shard['min_id'] = min(record_ids + [shard['min_id'] or record_ids[0]])
+                    shard['max_id'] = max(record_ids + [shard['max_id'] or record_ids[0]])
+            self.write_manifest()
+        return results
+
+    def delete_record(self, record_id):
+        if not record_id or not self.exists():
+            return False
+        with FileLock(self.lock_file):
+            self.load_manifest()
+            month, _ = self.locate(record_id)
+            if month is None or not self.shard_store(month).delete_record(record_id):
+                return False
+            self.shards[month]['count'] -= 1
+            self.write_manifest()
+        return True
+
+    def delete_records(self, record_ids):
+        """按所在分片分组，每个分片删除一次"""
+        results = [False] * len(record_ids)
+        if not self.exists():
+            return results
+        with FileLock(self.lock_file):
+            self.load_manifest()
+            batches = {}
+            for position, record_id in enumerate(record_ids):
+                month, _ = self.locate(record_id)
+                if month is not None:
+                    batches.setdefault(month, []).append(position)
+            for month, positions in batches.items():
+                deleted = self.shard_store(month).delete_records([record_ids[position] for position in positions])
+                for position, result in zip(positions, deleted):
+                    results[position] = result
+                self.shards[month]['count'] -= sum(deleted)
+            if any(results):
+                self.write_manifest()
+        return results
@@ -0,0 +1,239 @@
+import json
+import os
+import sqlite3
+import threading
+from record_store import RecordStore, JsonRecordStore, duplicate_ids_error
+
+# SQLite记录存储：所有单据共用一个数据库文件，每个单据一张表，ID为带索引的主键，
+# 保存、删除单条记录只改动该行，不随单据记录数增长
+
+
+def table_name_for(filename):
+    """数据文件名去掉目录和扩展名作为表名，如data_采购管理_采购订单"""
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def quote_identifier(name):
+    """SQL标识符加引号，表名中含中文和特殊字符"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def field_expression(field_name):
+    """取记录中字段值（按文本）的SQL表达式；查询必须使用与建索引时完全相同的表达式才会用到索引
+
+    取值与record_index.index_value一致：文本不变，null为NULL，其余为紧凑的JSON文本（true、5、2.5）；
+    只有->运算符能取得小数在JSON中的原文，打开存储时检查SQLite版本（MIN_SQLITE_VERSION）
+    """
+    path = '$."' + field_name.replace('"', '\\"') + '"'
+    path = "'" + path.replace("'", "''") + "'"
+    return (f"CASE json_type(data, {path}) WHEN 'text' THEN json_extract(data, {path}) "
+            f"WHEN 'null' THEN NULL ELSE data -> {path} END")
+
+
+# 字段表达式中的->运算符需要SQLite 3.38及以上版本
+MIN_SQLITE_VERSION = (3, 38, 0)
+# 逐条遍历记录时每批读取的行数
+ITER_BATCH_SIZE = 1000
+# 前缀查询的上界：前缀后接最大的Unicode字符，UTF-8按字节比较时大于任何以该前缀开头的字符串
+PREFIX_END = '\U0010ffff'
+
+
+class SqliteRecordStore(RecordStore):
+    """SQLite存储，首次打开时自动迁移原有的JSON数据文件"""
+
+    def __init__(self, filename, database=None):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(f'SQLite存储需要SQLite {".".join(map(str, MIN_SQLITE_VERSION))}及以上版本，'
+                               f'当前Python使用的是{sqlite3.sqlite_version}，请升级Python或改用其他存储方式')
+        super().__init__(filename)
+        # 数据库文件默认与数据文件放在同一目录
+        self.database = database or os.path.join(os.path.dirname(filename), 'form_data.db')
+        self.table_name = table_name_for(filename)
+        self.table = quote_identifier(self.table_name)
+        # 组提交时由先到达的线程代其他线程写入，连接允许跨线程使用，所有操作在self.lock内串行进行
+        self.connection = sqlite3.connect(self.database, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        try:
+            self.ensure_table()
+        except Exception:
+            self.connection.close()
+            raise
+
+    def ensure_table(self):
+        """建表；表不存在而JSON数据文件存在时，在同一事务中导入原有记录"""
+        if self.table_exists():
+            return
+        with self.connection:
+            # 显式开启写事务，建表和导入要么都完成，要么都不生效；
+            # 多个进程同时首次打开时，后取得写锁的进程在事务内重新检查，不会重复导入
+            self.connection.execute('BEGIN IMMEDIATE')
+            if self.table_exists():
+                return
+            # rowid保持添加顺序，更新记录时不变，与JSON数组中的位置一致
+            self.connection.execute(f'CREATE TABLE IF NOT EXISTS {self.table} (id TEXT PRIMARY KEY, data TEXT NOT NULL)')
+            migrated = os.path.exists(self.filename)
+            if migrated:
+                self.import_records(JsonRecordStore(self.filename).iter_records())
+        if migrated:
+            # 迁移完成后保留原文件作为备份，避免与数据库中的数据混淆
+            os.replace(self.filename, self.filename + '.migrated')
+
+    def table_exists(self):
+        return self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.table_name,)).fetchone() is not None
+
+    def import_records(self, records):
+        """逐条导入原有记录（流式读取，不把全部记录读入内存）；没有ID的记录ID列为空，都保留
+
+        ID重复时无法导入同一张表，抛出ValueError，调用方的事务回滚，原文件保持不变
+        """
+        duplicates = []
+        for record in records:
+            try:
+                self.connection.execute(f'INSERT INTO {self.table} (id, data) VALUES (?, ?)',
+                                        (record.get('id') or None, json.dumps(record, ensure_ascii=False)))
+            except sqlite3.IntegrityError:
+                duplicates.append(record.get('id'))
+        if duplicates:
+            raise duplicate_ids_error(self.filename, dict.fromkeys(duplicates))
+
+    def exists(self):
+        return True
+
+    def get_version(self):
+        with self.lock:
+            # data_version在其他连接提交后变化，total_changes统计本连接的修改
+            data_version = self.connection.execute('PRAGMA data_version').fetchone()[0]
+            return (data_version, self.connection.total_changes)
+
+    def get_records(self):
+        with self.lock:
+            rows = self.connection.execute(f'SELECT data FROM {self.table} ORDER BY rowid')
+            return [json.loads(data) for data, in rows]
+
+    def iter_records(self):
+        # 按rowid分批读取，不一次取出全部结果；每批在锁内读取，遍历期间其他线程仍可读写
+        last_rowid = 0
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f'SELECT rowid, data FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                    (last_rowid, ITER_BATCH_SIZE)).fetchall()
+            if not rows:
+                return
+            for last_rowid, data in rows:
+                yield json.loads(data)
+
+    def get_record(self, record_id):
+        with self.lock:
+            row = self.connection.execute(f'SELECT data FROM {self.table} WHERE id = ?', (record_id,)).fetchone()
+            return json.loads(row[0]) if row else None
+
+    def scan_records(self, start=None, end=None, reverse=False, limit=None):
+        with self.lock:
+            # 直接按主键索引的顺序读取，不需要排序
+            conditions = ['id IS NOT NULL']
+            params = []
+            if start is not None:
+                conditions.append('id >= ?')
+                params.append(start)
+            if end is not None:
+                conditions.append('id < ?')
+                params.append(end)
+            sql = f'SELECT data FROM {self.table} WHERE {" AND ".join(conditions)} ORDER BY id {"DESC" if reverse else "ASC"}'
+            if limit is not None:
+                sql += ' LIMIT ?'
+                params.append(limit)
+            return [json.loads(data) for data, in self.connection.execute(sql, params)]
+
+    def set_indexes(self, field_names):
+        """为字段建立表达式索引，保存、删除时由SQLite自动维护"""
+        with self.lock:
+            field_names = tuple(field_names)
+            if field_names == self.indexed_fields:
+                return
+            with self.connection:
+                for field_name in field_names:
+                    name = f'{self.table_name}__{field_name}'
+                    expression = field_expression(field_name)
+                    row = self.connection.execute(
+                        "SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+                    if row is not None and expression not in row[0]:
+                        # 旧版本按其他表达式建立的索引查询时用不到，重建
+                        self.connection.execute(f'DROP INDEX {quote_identifier(name)}')
+                    self.connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS {quote_identifier(name)} ON {self.table} ({expression})')
+            self.indexed_fields = field_names
+
+    def find_records(self, equals=None, prefixes=None):
+        with self.lock:
+            if None in (equals or {}).values() or None in (prefixes or {}).values():
+                # 与null比较的条件不匹配任何记录
+                return []
+            conditions = []
+            params = []
+            for field_name, value in (equals or {}).items():
+                conditions.append(f'{field_expression(field_name)} = ?')
+                params.append(value)
+            for field_name, prefix in (prefixes or {}).items():
+                expression = field_expression(field_name)
+                conditions.append(f'{expression} >= ? AND {expression} < ?')
+                params.extend([prefix, prefix + PREFIX_END])
+            sql = f'SELECT data FROM {self.table}'
+            if conditions:
+                sql += ' WHERE ' + ' AND '.join(conditions)
+            return [json.loads(data) for data, in self.connection.execute(sql + ' ORDER BY rowid', params)]
+
+    def put_record(self, record):
+        with self.lock:
+            record_id = record.get('id')
+            data = json.dumps(record, ensure_ascii=False)
+            with self.connection:
+                if record_id:
+                    cursor = self.connection.execute(f'UPDATE {self.table} SET data = ? WHERE id = ?', (data, record_id))
+                    if cursor.rowcount:
+                        return True
+                self.connection.execute(f'INSERT INTO {self.table} (id, data) VALUES (?, ?)', (record_id, data))
+            return False
+
+    def put_records(self, records):
+        with self.lock:
+            ids = [record.get('id') for record in records]
+            rows = [(record_id, json.dumps(record, ensure_ascii=False)) for record_id, record in zip(ids, records)]
+            existing = set()
+            with self.connection:
+                # 查询已有的ID和写入在同一个写事务中，其他连接不能在两者之间插入同一ID
+                self.connection.execute('BEGIN IMMEDIATE')
+                # 分批查询已有的ID，避免超过SQL参数个数上限
+                for start in range(0, len(ids), 500):
+                    chunk = [record_id for record_id in ids[start:start + 500] if record_id]
+                    if chunk:
+                        placeholders = ','.join('?' * len(chunk))
+                        existing.update(record_id for record_id, in self.connection.execute(
+                            f'SELECT id FROM {self.table} WHERE id IN ({placeholders})', chunk))
+                # 已有的ID原位更新（rowid不变，保持添加顺序），其余插入
+                self.connection.executemany(
+                    f'INSERT INTO {self.table} (id, data) VALUES (?, ?) '
+                    f'ON CONFLICT(id) DO UPDATE SET data = excluded.data', rows)
+            return [bool(record_id) and record_id in existing for record_id in ids]
+
+    def delete_record(self, record_id):
+        with self.lock:
+            with self.connection:
+                cursor = self.connection.execute(f'DELETE FROM {self.table} WHERE id = ?', (record_id,))
+            return cursor.rowcount > 0
+
+    def delete_records(self, record_ids):
+        with self.lock:
+            results = []
+            with self.connection:
+                for record_id in record_ids:
+                    cursor = self.connection.execute(f'DELETE FROM {self.table} WHERE id = ?', (record_id,))
+                    results.append(cursor.rowcount > 0)
+            return results
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,91 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from multiprocessing import Process
+from change_log import ChangeLog, ChangeConsumer, change_event
+
+
+def append_in_process(filename, process, count):
+    """子进程中逐个追加变更事件"""
+    log = ChangeLog(filename)
+    for i in range(count):
+        log.write(lambda: (None, [change_event('insert', f'{process}-{i}')]))
+
+
+class TestChangeLog(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'data.changes.jsonl')
+        self.offset_file = os.path.join(self.temp_dir, 'data.changes.sync.offset')
+        self.log = ChangeLog(self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def append(self, *events):
+        return self.log.write(lambda: (len(events), list(events)))
+
+    def test_sequence(self):
+        """测试事件按追加顺序连续编号，operation的结果原样返回"""
+        self.assertEqual(self.append(change_event('insert', '1', {'id': '1'}), change_event('delete', '1')), 2)
+        self.log.write(lambda: (None, []))
+        self.append(change_event('insert', '2', {'id': '2'}))
+        events, _ = self.log.read()
+        self.assertEqual([(e['seq'], e['op'], e['id']) for e in events],
+                         [(1, 'insert', '1'), (2, 'delete', '1'), (3, 'insert', '2')])
+        self.assertEqual(events[0]['record'], {'id': '1'})
+        self.assertNotIn('record', events[1])
+
+    def test_torn_tail(self):
+        """测试写入中断留下的不完整行不被读取，下次追加前截掉"""
+        self.append(change_event('insert', '1'))
+        with open(self.filename, 'ab') as f:
+            f.write(b'{"op":"insert","id":"2"')
+        self.assertEqual(len(self.log.read()[0]), 1)
+        self.append(change_event('insert', '3'))
+        self.assertEqual([(e['seq'], e['id']) for e in self.log.read()[0]], [(1, '1'), (2, '3')])
+
+    def test_consumer_resume(self):
+        """测试消费者提交后从保存的偏移量继续，未提交时重复取到同样的事件"""
+        for i in range(5):
+            self.append(change_event('insert', str(i)))
+        consumer = ChangeConsumer(self.log, self.offset_file)
+        self.assertEqual([e['seq'] for e in consumer.poll(3)], [1, 2, 3])
+        self.assertEqual([e['seq'] for e in consumer.poll(3)], [1, 2, 3])
+        consumer.commit()
+        self.append(change_event('delete', '0'))
+        consumer = ChangeConsumer(self.log, self.offset_file)
+        self.assertEqual([e['seq'] for e in consumer.poll()], [4, 5, 6])
+        consumer.commit()
+        self.assertEqual(consumer.poll(), [])
+
+    def test_consumer_relocates(self):
+        """测试日志被替换后按序号重新定位"""
+        for i in range(4):
+            self.append(change_event('insert', str(i)))
+        consumer = ChangeConsumer(self.log, self.offset_file)
+        consumer.poll(2)
+        consumer.commit()
+        # 去掉已消费的事件后文件位置失效
+        events, _ = self.log.read()
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            for event in events[1:]:
+                f.write(json.dumps(event) + '\n')
+        self.assertEqual([e['seq'] for e in consumer.poll()], [3, 4])
+
+    def test_concurrent_processes(self):
+        """测试多个进程同时追加时序号不重复、不跳号"""
+        processes = [Process(target=append_in_process, args=(self.filename, p, 30)) for p in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        events, _ = self.log.read()
+        self.assertEqual([e['seq'] for e in events], list(range(1, 121)))
+        self.assertEqual(len({e['id'] for e in events}), 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
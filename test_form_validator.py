@@ -0,0 +1,105 @@
+import unittest
+import os
+from mda_form_engine import MDAFormEngine
+from metadata_model import MetadataModel
+from form_validator import compile_form_validator
+
+class TestFormValidator(unittest.TestCase):
+    def setUp(self):
+        self.metadata_file = 'test_validator_metadata.xml'
+        with open(self.metadata_file, 'w', encoding='utf-8') as f:
+            f.write('''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Modules>
+        <Module name="客户管理">
+            <Forms>
+                <Form name="客户档案">
+                    <FieldList>
+                        <TextField name="客户名称" Length="10" Left="10" Top="10" Width="200" Height="30" VisibleExt="111">
+                            <Validation>
+                                <Required>1</Required>
+                            </Validation>
+                        </TextField>
+                        <MoneyField name="信用额度" Length="12" Left="10" Top="50" Width="200" Height="30" VisibleExt="110">
+                            <Validation>
+                                <Required>1</Required>
+                                <Number>1</Number>
+                            </Validation>
+                        </MoneyField>
+                        <TextField name="联系邮箱" Length="50" Left="10" Top="90" Width="200" Height="30" VisibleExt="111" />
+                        <TextField name="手机号码" Length="20" Left="10" Top="130" Width="200" Height="30" VisibleExt="111" />
+                        <ComboBox name="客户等级" Left="10" Top="170" Width="200" Height="30" VisibleExt="111">
+                            <Options>
+                                <Option>A</Option>
+                            </Options>
+                        </ComboBox>
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+    </Modules>
+</FormMetadata>''')
+        self.model = MetadataModel(self.metadata_file, use_snapshot=False)
+        self.form_config = self.model.get_form('客户管理', '客户档案')
+
+    def tearDown(self):
+        if os.path.exists(self.metadata_file):
+            os.remove(self.metadata_file)
+
+    def test_valid_values(self):
+        """测试合法数据没有错误"""
+        validator = compile_form_validator(self.form_config['fields'])
+        values = {'客户名称': '华为', '信用额度': '1000', '联系邮箱': 'a@b.com', '手机号码': '13800138000', '客户等级': 'A'}
+        self.assertEqual(validator.validate(values), [])
+
+    def test_error_messages_in_field_order(self):
+        """测试各项规则的错误信息与顺序"""
+        validator = compile_form_validator(self.form_config['fields'])
+        errors = validator.validate({'客户名称': '超过十个字符的客户名称', '信用额度': 'abc',
+                                     '联系邮箱': 'abc', '手机号码': '123'})
+        self.assertEqual(errors, [
+            '客户名称 长度不能超过 10 个字符',
+            '信用额度 必须是数字',
+            '联系邮箱 格式不正确，必须包含 @ 符号',
+            '手机号码 格式不正确，必须是11位数字'
+        ])
+        self.assertEqual(validator.validate({'客户名称': '', '信用额度': ''}),
+                         ['客户名称 不能为空', '信用额度 不能为空'])
+
+    def test_missing_values_skipped(self):
+        """测试没有提供值的字段（未显示的控件）不参与验证"""
+        validator = compile_form_validator(self.form_config['fields'])
+        self.assertEqual(validator.validate({}), [])
+
+    def test_fields_without_rules_omitted(self):
+        """测试没有任何规则的字段不进入流水线"""
+        validator = compile_form_validator(self.form_config['fields'])
+        self.assertNotIn('客户等级', validator.field_names)
+        self.assertEqual(validator.field_names, ('客户名称', '信用额度', '联系邮箱', '手机号码'))
+
+    def test_device_visible_fields(self):
+        """测试按终端可见字段编译，移动端不验证信用额度"""
+        validator = compile_form_validator(self.form_config.get_visible_fields('mobile'))
+        self.assertEqual(validator.validate({'客户名称': '华为', '信用额度': ''}), [])
+
+    def test_engine_compiles_on_form_switch(self):
+        """测试引擎切换表单时编译验证流水线"""
+        engine = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        engine.set_current_form('客户管理', '客户档案')
+        self.assertEqual(engine.validator.field_names, ('客户名称', '信用额度', '联系邮箱', '手机号码'))
+
+    def test_engine_custom_validation_override(self):
+        """测试子类重写的custom_validation仍然生效"""
+        class StrictEngine(MDAFormEngine):
+            def custom_validation(self, field_name, value, field_info):
+                if field_name == '客户等级' and value != 'A':
+                    return '客户等级 只能是A'
+                return None
+
+        engine = StrictEngine(self.metadata_file, use_snapshot=False)
+        engine.set_current_form('客户管理', '客户档案')
+        self.assertEqual(engine.validator.validate({'客户名称': '华为', '客户等级': 'B', '联系邮箱': 'abc'}),
+                         ['客户等级 只能是A'])
+
+if __name__ == '__main__':
+    unittest.main()
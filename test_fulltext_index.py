@@ -0,0 +1,94 @@
+import unittest
+import os
+import shutil
+import tempfile
+from fulltext_index import FullTextIndex, tokenize, record_text
+
+
+class TestFullTextIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.search')
+        self.index = FullTextIndex(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_tokenize(self):
+        """测试按字符二元组切分，全角字符转半角、英文转小写"""
+        self.assertEqual(tokenize('华为技术'), ['华为', '为技', '技术'])
+        self.assertEqual(tokenize('ＡＢ-c 螺'), ['ab', 'c', '螺'])
+        self.assertEqual(tokenize('  '), [])
+
+    def test_record_text(self):
+        """测试表头和明细行的文本都参与检索，ID和创建时间不参与"""
+        text = record_text({'id': 'X1', 'created_at': '2026', '供应商名称': '华为', '金额': 1.5},
+                           [{'物料名称': '螺丝'}])
+        self.assertEqual(text, '华为 1.5 螺丝')
+
+    def test_search_ranked(self):
+        """测试检索结果包含全部检索词，相关度高的在前"""
+        self.index.rebuild([('1', '华为技术有限公司 螺丝'), ('2', '中兴通讯 螺母'), ('3', '华为 华为终端 螺丝')])
+        self.assertEqual(self.index.search('华为'), ['3', '1'])
+        self.assertEqual(self.index.search('华为 螺丝'), ['3', '1'])
+        self.assertEqual(sorted(self.index.search('螺')), ['1', '2', '3'])
+        self.assertEqual(self.index.search('华为螺母'), [])
+        self.assertEqual(self.index.search('不存在'), [])
+        self.assertEqual(self.index.search('华为', limit=1), ['3'])
+
+    def test_exact_word_first(self):
+        """测试完整输入单号时完全匹配的记录排在最前，部分输入仍能匹配"""
+        self.index.rebuild([('1', 'RK00012340'), ('2', 'RK00001234'), ('3', 'RK00012341')])
+        self.assertEqual(self.index.search('RK00001234')[0], '2')
+        self.assertIn('3', self.index.search('rk0001234'))
+
+    def test_document_frequency(self):
+        """测试文档频率为包含该词的未删除文档数，同一文档中重复出现只计一次"""
+        self.index.rebuild([('1', '螺丝 螺丝 螺丝 螺丝'), ('2', '华为 螺丝'), ('3', '华为')])
+        frequency = lambda: self.index.document_frequency(self.index.postings['螺丝'], self.index.term_counts, '螺丝')
+        self.assertEqual(frequency(), 2)
+        self.index.delete(['1'])
+        self.assertEqual(frequency(), 1)
+        self.index.update([('4', '螺丝螺丝'), ('2', '华为')])
+        self.assertEqual(frequency(), 1)
+        self.assertEqual(self.index.search('螺丝'), ['4'])
+
+    def test_single_char_query(self):
+        """测试单个字符的查询词匹配包含该字符的二元组，之后新增的二元组同样能查到"""
+        self.index.rebuild([('1', '六角螺丝'), ('2', '螺母'), ('3', '华为')])
+        self.assertEqual(sorted(self.index.search('螺')), ['1', '2'])
+        self.index.update([('4', '自攻螺钉')])
+        self.assertEqual(sorted(self.index.search('螺')), ['1', '2', '4'])
+        self.assertEqual(self.index.search('钉'), ['4'])
+        other = FullTextIndex(self.path)
+        self.assertEqual(other.search('钉'), ['4'])
+
+    def test_incremental_update(self):
+        """测试增量更新和删除，重新打开时从快照和日志恢复"""
+        self.index.rebuild([('1', '华为技术')])
+        self.index.update([('2', '华为终端'), ('1', '中兴通讯')])
+        self.index.delete(['2'])
+        self.assertEqual(self.index.search('华为'), [])
+        self.assertEqual(self.index.search('中兴'), ['1'])
+        other = FullTextIndex(self.path)
+        self.assertEqual(other.search('中兴'), ['1'])
+        # 其他实例的修改在检索时读入
+        other.update([('3', '华为云')])
+        self.assertEqual(self.index.search('华为'), ['3'])
+
+    def test_checkpoint(self):
+        """测试日志超过阈值时重写快照，已删除的文档重新编号"""
+        index = FullTextIndex(self.path, checkpoint_entries=5)
+        index.rebuild([])
+        for i in range(6):
+            index.update([(str(i), f'供应商{i}')])
+            index.delete([str(i - 1)])
+        self.assertEqual(os.path.getsize(self.path + '.log'), 0)
+        self.assertLess(len(index.doc_ids), 6)
+        self.assertEqual(index.search('供应商'), ['5'])
+        other = FullTextIndex(self.path)
+        self.assertEqual(other.search('供应商5'), ['5'])
+
+
+if __name__ == '__main__':
+    unittest.main()
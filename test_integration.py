@@ -42,6 +42,8 @@ class TestIntegration(unittest.TestCase):
     def tearDown(self):
         if os.path.exists('test_integration_metadata.xml'):
             os.remove('test_integration_metadata.xml')
+        if os.path.exists('test_integration_metadata.xml.snapshot'):
+            os.remove('test_integration_metadata.xml.snapshot')
         if os.path.exists('form_data.json'):
             os.remove('form_data.json')
     
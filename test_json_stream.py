@@ -0,0 +1,63 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from json_stream import iter_json_array
+
+
+class TestJsonStream(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'data.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write(self, text):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_matches_json_load(self):
+        """测试各种块大小下与json.load结果一致，包括跨块的中文和转义字符"""
+        records = [{'id': str(i), '供应商名称': '华为技术' * (i % 7), '备注': 'a"b\\\\c]', '金额': i * 1.5,
+                    'details': [{'数量': i}], '空': None} for i in range(200)]
+        for indent in (None, 2):
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=indent)
+            for chunk_size in (1, 3, 17, 4096):
+                self.assertEqual(list(iter_json_array(self.filename, chunk_size)), records)
+
+    def test_number_at_chunk_boundary(self):
+        """测试块末尾的数字不会被截断"""
+        self.write('[123456789, 987654321]')
+        for chunk_size in range(1, 12):
+            self.assertEqual(list(iter_json_array(self.filename, chunk_size)), [123456789, 987654321])
+
+    def test_empty_and_single_object(self):
+        """测试空文件、空数组和旧格式的单个对象"""
+        self.write('')
+        self.assertEqual(list(iter_json_array(self.filename)), [])
+        self.write(' [ ] ')
+        self.assertEqual(list(iter_json_array(self.filename)), [])
+        self.write('\ufeff{"id": "1"}')
+        self.assertEqual(list(iter_json_array(self.filename)), [{'id': '1'}])
+
+    def test_yields_before_reading_whole_file(self):
+        """测试读到第一条记录即可产出，不必等整个文件解析完"""
+        self.write('[{"id": "1"}, {"id": "2"}, 这里是损坏的内容')
+        records = iter_json_array(self.filename, chunk_size=8)
+        self.assertEqual(next(records), {'id': '1'})
+        self.assertEqual(next(records), {'id': '2'})
+        with self.assertRaises(ValueError):
+            next(records)
+
+    def test_truncated_file(self):
+        """测试文件被截断时报错"""
+        self.write('[{"id": "1"}, {"id": "2"')
+        with self.assertRaises(ValueError):
+            list(iter_json_array(self.filename, chunk_size=4))
+
+
+if __name__ == '__main__':
+    unittest.main()
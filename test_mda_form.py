@@ -39,6 +39,8 @@ class TestMDAFormEngine(unittest.TestCase):
     def tearDown(self):
         if os.path.exists('test_metadata.xml'):
             os.remove('test_metadata.xml')
+        if os.path.exists('test_metadata.xml.snapshot'):
+            os.remove('test_metadata.xml.snapshot')
         if os.path.exists('form_data.json'):
             os.remove('form_data.json')
     
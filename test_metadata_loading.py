@@ -0,0 +1,615 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from unittest import mock
+from mda_form_engine import MDAFormEngine
+from metadata_model import MetadataModel, MetadataWatcher, FieldSpec
+
+class TestMetadataLoading(unittest.TestCase):
+    def setUp(self):
+        self.metadata_file = 'test_loading_metadata.xml'
+        self.compact_file = 'test_loading_metadata.json'
+        self.exported_file = 'test_loading_exported.xml'
+        self.test_metadata = '''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Modules>
+        <Module name="采购管理">
+            <Forms>
+                <Form name="采购订单">
+                    <FieldList>
+                        <TextField name="订单编号" Length="50" Left="10" Top="10" Width="200" Height="30" VisibleExt="111">
+                            <Validation>
+                                <Required>1</Required>
+                            </Validation>
+                        </TextField>
+                        <ComboBox name="付款方式" Left="10" Top="50" Width="200" Height="30" VisibleExt="110">
+                            <Options>
+                                <Option>现金</Option>
+                                <Option>转账</Option>
+                            </Options>
+                        </ComboBox>
+                        <MoneyField name="订单金额" Length="12" Left="10" Top="90" Width="200" Height="30" VisibleExt="100">
+                            <Validation>
+                                <Required>1</Required>
+                                <Number>1</Number>
+                            </Validation>
+                        </MoneyField>
+                    </FieldList>
+                    <DetailTable>
+                        <Column name="物料编码" width="120" type="TextField"/>
+                        <Column name="数量" width="80" type="MoneyField"/>
+                    </DetailTable>
+                </Form>
+                <Form name="采购入库">
+                    <FieldList>
+                        <TextField name="入库单号" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" Length="200" />
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+        <Module name="销售管理">
+            <Forms>
+                <Form name="销售订单">
+                    <FieldList>
+                        <TextField name="客户名称" Left="10" Top="10" Width="200" Height="30" VisibleExt="011" Length="100" />
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+    </Modules>
+</FormMetadata>'''
+        self.write_metadata(self.test_metadata)
+
+    def tearDown(self):
+        for filename in [self.metadata_file, self.metadata_file + '.snapshot',
+                         self.compact_file, self.exported_file]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def write_metadata(self, content):
+        with open(self.metadata_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def rewrite_metadata(self, content):
+        """改写元数据文件并把修改时间推后，避免同一时间片内的两次写入无法区分"""
+        mtime_ns = os.stat(self.metadata_file).st_mtime_ns
+        self.write_metadata(content)
+        os.utime(self.metadata_file, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+
+    def test_snapshot_created(self):
+        """测试首次加载后生成快照"""
+        MDAFormEngine(self.metadata_file)
+        self.assertTrue(os.path.exists(self.metadata_file + '.snapshot'))
+
+    def test_snapshot_matches_xml(self):
+        """测试快照加载结果与XML解析结果一致"""
+        parsed = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        MDAFormEngine(self.metadata_file)
+
+        engine = MDAFormEngine(self.metadata_file)
+        self.assertEqual(engine.modules, parsed.modules)
+
+    def test_snapshot_skips_xml_parsing(self):
+        """测试快照有效时不解析XML"""
+        MDAFormEngine(self.metadata_file)
+
+        class NoParseModel(MetadataModel):
+            def parse_metadata(self):
+                raise AssertionError('快照有效时不应解析XML')
+
+        engine = MDAFormEngine(self.metadata_file, model=NoParseModel(self.metadata_file))
+        self.assertIn('采购订单', engine.modules['采购管理'])
+
+    def test_stale_snapshot_rebuilt(self):
+        """测试元数据变化后快照失效并重建"""
+        MDAFormEngine(self.metadata_file)
+
+        self.write_metadata(self.test_metadata.replace('入库单号', '入库编号'))
+        engine = MDAFormEngine(self.metadata_file)
+        self.assertIn('入库编号', engine.modules['采购管理']['采购入库']['fields'])
+
+        # 重建后的快照对新内容有效
+        reloaded = MDAFormEngine(self.metadata_file)
+        self.assertIn('入库编号', reloaded.modules['采购管理']['采购入库']['fields'])
+
+    def test_corrupt_snapshot_ignored(self):
+        """测试损坏的快照按过期处理"""
+        with open(self.metadata_file + '.snapshot', 'wb') as f:
+            f.write(b'not a snapshot')
+
+        engine = MDAFormEngine(self.metadata_file)
+        self.assertIn('销售订单', engine.modules['销售管理'])
+
+    def test_lazy_records_only_names(self):
+        """测试懒加载模式只记录模块和表单名称"""
+        engine = MDAFormEngine(self.metadata_file, lazy=True)
+        self.assertEqual(list(engine.modules), ['采购管理', '销售管理'])
+        self.assertEqual(list(engine.modules['采购管理']), ['采购订单', '采购入库'])
+        self.assertIsNone(engine.modules['采购管理']['采购订单'])
+        self.assertEqual(len(engine.model.form_index), 3)
+
+    def test_lazy_materializes_on_access(self):
+        """测试懒加载模式首次访问时解析表单，结果与完整解析一致"""
+        eager = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        engine = MDAFormEngine(self.metadata_file, lazy=True)
+
+        engine.set_current_form('采购管理', '采购订单')
+        self.assertEqual(engine.fields, eager.modules['采购管理']['采购订单']['fields'])
+        self.assertEqual(engine.modules['采购管理']['采购订单'], eager.modules['采购管理']['采购订单'])
+        # 未访问的表单保持未解析
+        self.assertIsNone(engine.modules['采购管理']['采购入库'])
+        self.assertIsNone(engine.modules['销售管理']['销售订单'])
+
+        # 再次访问直接使用缓存
+        cached = engine.modules['采购管理']['采购订单']
+        engine.set_current_form('采购管理', '采购订单')
+        self.assertIs(engine.get_form_config('采购管理', '采购订单'), cached)
+
+    def test_lazy_all_forms_match(self):
+        """测试懒加载每个表单的结果都与完整解析一致"""
+        eager = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        engine = MDAFormEngine(self.metadata_file, lazy=True)
+        for module_name, forms in eager.modules.items():
+            for form_name, form_config in forms.items():
+                self.assertEqual(engine.get_form_config(module_name, form_name), form_config)
+
+    def test_lazy_unknown_form(self):
+        """测试懒加载模式访问不存在的表单"""
+        engine = MDAFormEngine(self.metadata_file, lazy=True)
+        engine.set_current_form('采购管理', '不存在的单据')
+        self.assertEqual(engine.fields, {})
+
+    def test_streaming_matches_full_parse(self):
+        """测试流式解析结果与完整解析完全一致"""
+        eager = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        engine = MDAFormEngine(self.metadata_file, use_snapshot=False, streaming=True)
+        self.assertEqual(engine.modules, eager.modules)
+        self.assertEqual(list(engine.modules), list(eager.modules))
+        self.assertEqual(engine.fields, eager.fields)
+
+    def test_streaming_legacy_format(self):
+        """测试流式解析支持旧格式的单个Form"""
+        self.write_metadata('''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Form name="旧格式表单">
+        <FieldList>
+            <TextField name="备注" Length="500" Left="10" Top="10" Width="200" Height="60" VisibleExt="100"/>
+            <MoneyField name="金额" Length="10" Left="10" Top="90" Width="200" Height="30" VisibleExt="111">
+                <Validation>
+                    <Number>1</Number>
+                </Validation>
+            </MoneyField>
+        </FieldList>
+    </Form>
+</FormMetadata>''')
+        eager = MDAFormEngine(self.metadata_file, use_snapshot=False)
+        engine = MDAFormEngine(self.metadata_file, use_snapshot=False, streaming=True)
+        self.assertEqual(engine.form_name, '旧格式表单')
+        self.assertEqual(engine.fields, eager.fields)
+        self.assertEqual(engine.modules, {})
+
+    def test_model_form_lookup(self):
+        """测试元数据模型按名称查找表单"""
+        model = MetadataModel(self.metadata_file)
+        form_config = model.get_form('采购管理', '采购订单')
+        self.assertEqual(list(form_config['fields']), ['订单编号', '付款方式', '订单金额'])
+        self.assertEqual(form_config['fields']['付款方式']['options'], ['现金', '转账'])
+        self.assertIsNone(model.get_form('采购管理', '不存在的单据'))
+        self.assertIsNone(model.get_form('不存在的模块', '采购订单'))
+
+    def test_model_set_form(self):
+        """测试替换单个表单配置后立即生效"""
+        model = MetadataModel(self.metadata_file)
+        engine = MDAFormEngine(self.metadata_file, model=model)
+
+        model.set_form('采购管理', '采购入库', {'fields': {}})
+        engine.set_current_form('采购管理', '采购入库')
+        self.assertEqual(engine.fields, {})
+
+    def test_model_combobox_without_options(self):
+        """测试没有Options的下拉框解析为空选项列表"""
+        self.write_metadata(self.test_metadata.replace(
+            '<TextField name="入库单号" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" Length="200" />',
+            '<ComboBox name="仓库" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" />'))
+        model = MetadataModel(self.metadata_file)
+        self.assertEqual(model.get_form('采购管理', '采购入库')['fields']['仓库']['options'], [])
+
+    def test_model_reload(self):
+        """测试重新加载元数据文件"""
+        model = MetadataModel(self.metadata_file)
+        self.write_metadata(self.test_metadata.replace('销售订单', '销售出库'))
+        model.reload()
+        self.assertEqual(list(model.modules['销售管理']), ['销售出库'])
+
+    def test_field_spec_mapping_view(self):
+        """测试FieldSpec兼容原有字典写法"""
+        model = MetadataModel(self.metadata_file)
+        fields = model.get_form('采购管理', '采购订单')['fields']
+
+        order_no = fields['订单编号']
+        self.assertIsInstance(order_no, FieldSpec)
+        self.assertEqual(order_no['type'], 'TextField')
+        self.assertEqual(order_no['length'], 50)
+        self.assertTrue(order_no['validation']['required'])
+        self.assertNotIn('number', order_no['validation'])
+        self.assertEqual(order_no.get('options'), None)
+        self.assertNotIn('options', order_no)
+        self.assertEqual(order_no.length, 50)
+
+        payment = fields['付款方式']
+        self.assertNotIn('length', payment)
+        self.assertNotIn('validation', payment)
+        self.assertEqual(payment.get('validation', {}), {})
+        self.assertEqual(list(payment), ['type', 'left', 'top', 'width', 'height', 'visible_ext', 'options'])
+        with self.assertRaises(KeyError):
+            payment['length']
+
+    def test_field_spec_to_dict(self):
+        """测试FieldSpec转换为原先的嵌套字典结构"""
+        model = MetadataModel(self.metadata_file)
+        amount = model.get_form('采购管理', '采购订单')['fields']['订单金额']
+        self.assertEqual(amount.to_dict(), {
+            'type': 'MoneyField',
+            'left': 10,
+            'top': 90,
+            'width': 200,
+            'height': 30,
+            'visible_ext': '100',
+            'length': 12,
+            'validation': {'required': True, 'number': True}
+        })
+        self.assertEqual(amount, amount.to_dict())
+
+    def test_field_spec_compact(self):
+        """测试字段规格没有实例字典，重复字符串只保留一份"""
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        order_fields = model.get_form('采购管理', '采购订单')['fields']
+        receipt_fields = model.get_form('采购管理', '采购入库')['fields']
+        self.assertFalse(hasattr(order_fields['订单编号'], '__dict__'))
+        self.assertIs(order_fields['订单编号']['type'], receipt_fields['入库单号']['type'])
+        self.assertIs(order_fields['订单编号']['visible_ext'], receipt_fields['入库单号']['visible_ext'])
+
+    def test_visible_fields_per_device(self):
+        """测试按终端预先计算的可见字段列表"""
+        expected = {
+            'pc': ['订单编号', '付款方式', '订单金额'],
+            'tablet': ['订单编号', '付款方式'],
+            'mobile': ['订单编号']
+        }
+        for device, field_names in expected.items():
+            engine = MDAFormEngine(self.metadata_file, device=device)
+            engine.set_current_form('采购管理', '采购订单')
+            self.assertEqual([name for name, _ in engine.visible_fields], field_names)
+
+        engine = MDAFormEngine(self.metadata_file, device='mobile')
+        engine.set_current_form('销售管理', '销售订单')
+        self.assertEqual([name for name, _ in engine.visible_fields], ['客户名称'])
+        self.assertTrue(engine.is_visible('011'))
+        self.assertFalse(engine.is_visible('100'))
+        self.assertTrue(engine.is_visible('100', 'pc'))
+
+    def test_visible_fields_precomputed(self):
+        """测试可见字段列表在加载元数据时计算，内容相同的终端共用同一列表"""
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        form_spec = model.get_form('采购管理', '采购入库')
+        self.assertIsNotNone(form_spec.visible_fields)
+        self.assertIs(form_spec.get_visible_fields('pc'), form_spec.get_visible_fields('mobile'))
+
+    def test_unknown_device(self):
+        """测试不支持的终端类型"""
+        with self.assertRaises(ValueError):
+            MDAFormEngine(self.metadata_file, device='watch')
+
+    def test_hot_reload_no_change(self):
+        """测试元数据文件未变化时不做任何处理"""
+        model = MetadataModel(self.metadata_file)
+        model.start_tracking()
+        self.assertIsNone(model.check_for_changes())
+
+    def test_hot_reload_changed_form_only(self):
+        """测试只替换内容有变化的表单，未变化表单的配置对象保持不变"""
+        model = MetadataModel(self.metadata_file)
+        model.start_tracking()
+        order = model.get_form('采购管理', '采购订单')
+        sales = model.get_form('销售管理', '销售订单')
+
+        self.rewrite_metadata(self.test_metadata.replace('入库单号', '入库编号'))
+        changes = model.check_for_changes()
+        self.assertEqual(changes['changed'], [('采购管理', '采购入库')])
+        self.assertEqual(changes['added'], [])
+        self.assertEqual(changes['removed'], [])
+        self.assertIn('入库编号', model.get_form('采购管理', '采购入库')['fields'])
+        self.assertIs(model.get_form('采购管理', '采购订单'), order)
+        self.assertIs(model.get_form('销售管理', '销售订单'), sales)
+
+        # 结果与完整解析一致
+        self.assertEqual(model.modules, MetadataModel(self.metadata_file, use_snapshot=False).modules)
+        self.assertIsNone(model.check_for_changes())
+
+    def test_hot_reload_added_and_removed_forms(self):
+        """测试新增和删除表单"""
+        model = MetadataModel(self.metadata_file)
+        model.start_tracking()
+
+        content = self.test_metadata.replace('<Form name="销售订单">', '<Form name="销售出库">')
+        self.rewrite_metadata(content)
+        changes = model.check_for_changes()
+        self.assertEqual(changes['added'], [('销售管理', '销售出库')])
+        self.assertEqual(changes['removed'], [('销售管理', '销售订单')])
+        self.assertEqual(list(model.modules['销售管理']), ['销售出库'])
+
+    def test_hot_reload_lazy_mode(self):
+        """测试懒加载模式下热加载更新表单位置，未访问的表单保持未解析"""
+        model = MetadataModel(self.metadata_file, lazy=True)
+        model.start_tracking()
+        model.get_form('销售管理', '销售订单')
+
+        # 前面的表单变长后，后面表单在文件中的位置随之变化
+        self.rewrite_metadata(self.test_metadata.replace('入库单号', '采购入库单号'))
+        changes = model.check_for_changes()
+        self.assertEqual(changes['changed'], [('采购管理', '采购入库')])
+        self.assertIsNone(model.modules['采购管理']['采购入库'])
+        self.assertIn('客户名称', model.get_form('销售管理', '销售订单')['fields'])
+        self.assertIn('采购入库单号', model.get_form('采购管理', '采购入库')['fields'])
+
+    def test_hot_reload_engine_current_form(self):
+        """测试引擎当前表单变化后字段随之更新"""
+        engine = MDAFormEngine(self.metadata_file, watch_interval=1000)
+        engine.set_current_form('采购管理', '采购入库')
+
+        self.rewrite_metadata(self.test_metadata.replace('入库单号', '入库编号'))
+        changes = engine.check_metadata_changes()
+        self.assertEqual(changes['changed'], [('采购管理', '采购入库')])
+        self.assertIn('入库编号', engine.fields)
+        self.assertEqual([name for name, _ in engine.visible_fields], ['入库编号'])
+
+    def test_hot_reload_refreshes_list_unless_editing(self):
+        """测试打开过表单后热加载仍刷新数据列表，正在编辑记录时不刷新"""
+        engine = MDAFormEngine(self.metadata_file, watch_interval=1000)
+        engine.set_current_form('采购管理', '采购入库')
+        engine.root = mock.Mock()
+        engine.refresh_data_list = mock.Mock()
+        engine.field_widgets = {'入库单号': mock.Mock()}
+
+        self.rewrite_metadata(self.test_metadata.replace('入库单号', '入库编号'))
+        engine.check_metadata_changes()
+        self.assertEqual(engine.refresh_data_list.call_count, 1)
+
+        engine.editing = True
+        self.rewrite_metadata(self.test_metadata.replace('入库单号', '入库单编号'))
+        engine.check_metadata_changes()
+        self.assertEqual(engine.refresh_data_list.call_count, 1)
+
+    def test_hot_reload_reports_error_once(self):
+        """测试保存了有误的元数据时只提示一次并继续轮询，修正后恢复加载"""
+        engine = MDAFormEngine(self.metadata_file, watch_interval=1000)
+        engine.set_current_form('采购管理', '采购入库')
+        engine.root = mock.Mock()
+        engine.refresh_data_list = mock.Mock()
+
+        self.rewrite_metadata(self.test_metadata.replace('name="入库单号"', 'name="入库单号" <'))
+        with mock.patch('mda_form_engine.messagebox') as messagebox:
+            engine.poll_metadata()
+            engine.poll_metadata()
+            self.assertEqual(messagebox.showwarning.call_count, 1)
+            self.assertEqual(engine.root.after.call_count, 2)
+            self.assertIn('入库单号', engine.fields)
+
+            self.rewrite_metadata(self.test_metadata.replace('入库单号', '入库编号'))
+            engine.poll_metadata()
+            self.assertIsNone(engine.metadata_error)
+            self.assertIn('入库编号', engine.fields)
+            self.assertEqual(messagebox.showwarning.call_count, 1)
+
+        # 其他异常（程序错误）不被吞掉
+        engine.check_metadata_changes = mock.Mock(side_effect=AttributeError)
+        with self.assertRaises(AttributeError):
+            engine.poll_metadata()
+
+    def test_compact_matches_xml(self):
+        """测试紧凑格式加载结果与XML完全一致"""
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        model.save_compact(self.compact_file)
+        compact = MetadataModel(self.compact_file)
+        self.assertTrue(compact.compact)
+        self.assertEqual(compact.modules, model.modules)
+        self.assertEqual(list(compact.modules), list(model.modules))
+        self.assertFalse(os.path.exists(self.compact_file + '.snapshot'))
+
+    def test_compact_xml_round_trip(self):
+        """测试紧凑格式转换回XML后不丢失信息"""
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        model.save_compact(self.compact_file)
+        MetadataModel(self.compact_file).save_xml(self.exported_file)
+        exported = MetadataModel(self.exported_file, use_snapshot=False)
+        self.assertEqual(exported.modules, model.modules)
+        form_config = exported.get_form('采购管理', '采购订单')
+        self.assertEqual(form_config['fields']['订单金额']['validation'], {'required': True, 'number': True})
+        self.assertEqual(form_config['detail_columns'][1], {'name': '数量', 'width': 80, 'type': 'MoneyField'})
+
+    def test_indexed_field(self):
+        """测试Indexed="1"的字段在XML、快照和紧凑格式中都保留"""
+        self.write_metadata(self.test_metadata.replace(
+            'VisibleExt="111" Length="200" />', 'VisibleExt="111" Length="200" Indexed="1" />'))
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        receipt_fields = model.get_form('采购管理', '采购入库')['fields']
+        self.assertTrue(receipt_fields['入库单号']['indexed'])
+        self.assertNotIn('indexed', model.get_form('采购管理', '采购订单')['fields']['订单编号'])
+        MetadataModel(self.metadata_file)
+        self.assertTrue(MetadataModel(self.metadata_file).get_form('采购管理', '采购入库')['fields']['入库单号'].indexed)
+        model.save_compact(self.compact_file)
+        compact = MetadataModel(self.compact_file)
+        self.assertTrue(compact.get_form('采购管理', '采购入库')['fields']['入库单号'].indexed)
+        compact.save_xml(self.exported_file)
+        exported = MetadataModel(self.exported_file, use_snapshot=False)
+        self.assertTrue(exported.get_form('采购管理', '采购入库')['fields']['入库单号'].indexed)
+
+    def test_compact_legacy_format(self):
+        """测试旧格式单个Form的紧凑格式往返转换"""
+        self.write_metadata('''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Form name="旧格式表单">
+        <FieldList>
+            <TextField name="备注" Length="500" Left="10" Top="10" Width="200" Height="60" VisibleExt="100"/>
+        </FieldList>
+    </Form>
+</FormMetadata>''')
+        model = MetadataModel(self.metadata_file, use_snapshot=False)
+        model.save_compact(self.compact_file)
+        compact = MetadataModel(self.compact_file)
+        compact.save_xml(self.exported_file)
+        exported = MetadataModel(self.exported_file, use_snapshot=False)
+        for loaded in (compact, exported):
+            self.assertEqual(loaded.form_name, '旧格式表单')
+            self.assertEqual(loaded.fields, model.fields)
+            self.assertEqual(loaded.modules, {})
+
+    def test_engine_accepts_compact(self):
+        """测试表单引擎直接使用紧凑格式的元数据文件"""
+        MetadataModel(self.metadata_file, use_snapshot=False).save_compact(self.compact_file)
+        engine = MDAFormEngine(self.compact_file, device='mobile')
+        engine.set_current_form('销售管理', '销售订单')
+        self.assertEqual([name for name, _ in engine.visible_fields], ['客户名称'])
+
+    def test_compact_hot_reload(self):
+        """测试紧凑格式文件变化后整体重新加载"""
+        MetadataModel(self.metadata_file, use_snapshot=False).save_compact(self.compact_file)
+        model = MetadataModel(self.compact_file)
+        model.start_tracking()
+        self.assertIsNone(model.check_for_changes())
+        mtime_ns = os.stat(self.compact_file).st_mtime_ns
+        self.write_metadata(self.test_metadata.replace('客户名称', '客户全称'))
+        MetadataModel(self.metadata_file, use_snapshot=False).save_compact(self.compact_file)
+        os.utime(self.compact_file, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+        self.assertTrue(model.check_for_changes()['reloaded'])
+        self.assertIn('客户全称', model.get_form('销售管理', '销售订单')['fields'])
+
+    def test_metadata_watcher(self):
+        """测试后台轮询监视元数据文件"""
+        model = MetadataModel(self.metadata_file)
+        received = []
+        watcher = MetadataWatcher(model, interval=0.01, on_change=received.append)
+        watcher.start()
+        try:
+            self.rewrite_metadata(self.test_metadata.replace('客户名称', '客户全称'))
+            deadline = time.time() + 5
+            while not received and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            watcher.stop()
+        self.assertEqual(received[0]['changed'], [('销售管理', '销售订单')])
+        self.assertIn('客户全称', model.get_form('销售管理', '销售订单')['fields'])
+
+def module_xml(*modules):
+    """生成只包含若干模块的元数据文件内容，每个模块一个单据、一个字段"""
+    parts = []
+    for module_name, form_name, field_name in modules:
+        parts.append(f'''        <Module name="{module_name}">
+            <Forms>
+                <Form name="{form_name}">
+                    <FieldList>
+                        <TextField name="{field_name}" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" Length="100" />
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+''')
+    return '<?xml version="1.0" encoding="UTF-8"?>\n<FormMetadata>\n    <Modules>\n' + ''.join(parts) + '    </Modules>\n</FormMetadata>'
+
+
+class TestMultiFileMetadata(unittest.TestCase):
+    def setUp(self):
+        self.metadata_dir = tempfile.mkdtemp()
+        self.write_file('b_sales.xml', module_xml(('销售管理', '销售订单', '客户名称')))
+        self.write_file('a_purchase.xml', module_xml(('采购管理', '采购订单', '订单编号')))
+        self.write_file('c_stock.xml', module_xml(('库存管理', '入库单', '入库单号')))
+
+    def tearDown(self):
+        shutil.rmtree(self.metadata_dir)
+
+    def write_file(self, filename, content, bump=False):
+        path = os.path.join(self.metadata_dir, filename)
+        mtime_ns = os.stat(path).st_mtime_ns if bump else None
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        if bump:
+            os.utime(path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+        return path
+
+    def test_directory_merged_in_filename_order(self):
+        """测试目录模式按文件名顺序合并模块"""
+        model = MetadataModel(self.metadata_dir, workers=1)
+        self.assertEqual(list(model.modules), ['采购管理', '销售管理', '库存管理'])
+        self.assertIn('客户名称', model.get_form('销售管理', '销售订单')['fields'])
+
+    def test_parallel_matches_serial(self):
+        """测试并行解析与单进程解析结果一致"""
+        serial = MetadataModel(self.metadata_dir, use_snapshot=False, workers=1)
+        parallel = MetadataModel(self.metadata_dir, use_snapshot=False, workers=2)
+        self.assertEqual(list(parallel.modules), list(serial.modules))
+        self.assertEqual(parallel.modules, serial.modules)
+
+    def test_per_file_snapshot(self):
+        """测试每个文件各自生成快照"""
+        MetadataModel(self.metadata_dir, workers=1)
+        for filename in ['a_purchase.xml', 'b_sales.xml', 'c_stock.xml']:
+            self.assertTrue(os.path.exists(os.path.join(self.metadata_dir, filename + '.snapshot')))
+
+    def test_include_order(self):
+        """测试Include引用的文件按在文档中的位置插入"""
+        main_file = self.write_file('main.xml', '''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Modules>
+        <Include file="b_sales.xml"/>
+        <Module name="财务管理">
+            <Forms>
+                <Form name="凭证">
+                    <FieldList>
+                        <TextField name="凭证号" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" Length="50" />
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+        <Include file="a_purchase.xml"/>
+    </Modules>
+</FormMetadata>''')
+        for lazy in (False, True):
+            model = MetadataModel(main_file, lazy=lazy, workers=1)
+            self.assertEqual(list(model.modules), ['销售管理', '财务管理', '采购管理'])
+            self.assertIn('凭证号', model.get_form('财务管理', '凭证')['fields'])
+            self.assertIn('订单编号', model.get_form('采购管理', '采购订单')['fields'])
+
+    def test_lazy_directory(self):
+        """测试目录模式下的懒加载"""
+        model = MetadataModel(self.metadata_dir, lazy=True, workers=1)
+        self.assertIsNone(model.modules['库存管理']['入库单'])
+        self.assertIn('入库单号', model.get_form('库存管理', '入库单')['fields'])
+
+    def test_hot_reload_single_file(self):
+        """测试目录模式下只重新解析变化的文件"""
+        model = MetadataModel(self.metadata_dir, workers=1)
+        model.start_tracking()
+        purchase = model.get_form('采购管理', '采购订单')
+        self.write_file('b_sales.xml', module_xml(('销售管理', '销售订单', '客户全称')), bump=True)
+        changes = model.check_for_changes()
+        self.assertEqual(changes['changed'], [('销售管理', '销售订单')])
+        self.assertIs(model.get_form('采购管理', '采购订单'), purchase)
+        self.assertIn('客户全称', model.get_form('销售管理', '销售订单')['fields'])
+        self.assertIsNone(model.check_for_changes())
+
+    def test_hot_reload_added_and_removed_files(self):
+        """测试目录中增删文件"""
+        model = MetadataModel(self.metadata_dir, workers=1)
+        model.start_tracking()
+        self.write_file('d_finance.xml', module_xml(('财务管理', '凭证', '凭证号')))
+        os.remove(os.path.join(self.metadata_dir, 'c_stock.xml'))
+        changes = model.check_for_changes()
+        self.assertEqual(changes['added'], [('财务管理', '凭证')])
+        self.assertEqual(changes['removed'], [('库存管理', '入库单')])
+        self.assertEqual(list(model.modules), ['采购管理', '销售管理', '财务管理'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import os
+import shutil
+import tempfile
+from unittest import mock
+from record_history import RecordHistory, record_delta
+
+
+class TestRecordHistory(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'data.history.jsonl')
+        self.history = RecordHistory(self.filename, snapshot_interval=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_record_delta(self):
+        """测试差异只包含改变的字段和去掉的字段"""
+        self.assertEqual(record_delta({'a': 1, 'b': 2, 'c': 3}, {'a': 1, 'b': 5, 'd': 4}), ({'b': 5, 'd': 4}, ['c']))
+
+    def test_versions(self):
+        """测试每个版本都能还原，每隔snapshot_interval个版本保存一次完整内容"""
+        records = [{'id': '1', '数量': str(i), '备注': 'x' * (i % 2)} for i in range(8)]
+        for record in records:
+            self.history.append([('1', record)])
+        self.assertEqual([v['op'] for v in self.history.get_versions('1')],
+                         ['full', 'delta', 'delta', 'full', 'delta', 'delta', 'full', 'delta'])
+        for version, record in enumerate(records, 1):
+            self.assertEqual(self.history.get_record_as_of('1', version), record)
+        self.assertEqual(self.history.get_record_as_of('1'), records[-1])
+        self.assertIsNone(self.history.get_record_as_of('1', 9))
+        self.assertIsNone(self.history.get_record_as_of('2'))
+
+    def test_delete_and_recreate(self):
+        """测试删除后的版本为None，重新保存时从完整内容开始"""
+        self.history.append([('1', {'id': '1', 'a': 1}), ('1', {'id': '1', 'a': 2})])
+        self.history.append([('1', None), ('2', None)])
+        self.history.append([('1', {'id': '1', 'a': 3})])
+        self.assertEqual([v['op'] for v in self.history.get_versions('1')], ['full', 'delta', 'delete', 'full'])
+        self.assertEqual(self.history.get_versions('2'), [])
+        self.assertEqual(self.history.get_record_as_of('1', 2), {'id': '1', 'a': 2})
+        self.assertIsNone(self.history.get_record_as_of('1', 3))
+        self.assertEqual(self.history.get_record_as_of('1', 4), {'id': '1', 'a': 3})
+
+    def test_as_of_timestamp(self):
+        """测试按时间读取当时的版本"""
+        for now, value in ((1767225600.0, 1), (1767229200.0, 2)):
+            with mock.patch('time.time', return_value=now):
+                self.history.append([('1', {'id': '1', 'a': value})])
+        self.assertIsNone(self.history.get_record_as_of('1', timestamp=1767225599.0))
+        self.assertEqual(self.history.get_record_as_of('1', timestamp=1767225600.0), {'id': '1', 'a': 1})
+        self.assertEqual(self.history.get_record_as_of('1', timestamp=1767229199.0), {'id': '1', 'a': 1})
+        self.assertEqual(self.history.get_record_as_of('1', timestamp=1767300000.0), {'id': '1', 'a': 2})
+
+    def test_other_instance(self):
+        """测试其他实例追加的版本在读取时读入，不完整的最后一行被覆盖"""
+        self.history.append([('1', {'id': '1', 'a': 1})])
+        other = RecordHistory(self.filename, snapshot_interval=3)
+        other.append([('1', {'id': '1', 'a': 2})])
+        with open(self.filename, 'ab') as f:
+            f.write(b'{"id":"1","v":3')
+        self.assertEqual(self.history.get_record_as_of('1'), {'id': '1', 'a': 2})
+        self.history.append([('1', {'id': '1', 'a': 3})])
+        self.assertEqual(RecordHistory(self.filename).get_record_as_of('1', 3), {'id': '1', 'a': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
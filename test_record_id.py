@@ -0,0 +1,94 @@
+import unittest
+import os
+import tempfile
+import shutil
+import threading
+from multiprocessing import Process
+from unittest import mock
+from record_id import (RecordIdGenerator, new_record_id, is_record_id, id_timestamp, id_lower_bound,
+                       ID_LENGTH)
+
+
+def write_ids(filename, count):
+    """子进程中生成ID写入文件"""
+    with open(filename, 'w') as f:
+        f.write('\n'.join(new_record_id() for _ in range(count)))
+
+
+class TestRecordId(unittest.TestCase):
+    def test_format(self):
+        """测试ID为26位Base32字符串，可解出生成时间"""
+        with mock.patch('time.time', return_value=1767225600.123):
+            record_id = RecordIdGenerator().new_id()
+        self.assertEqual(len(record_id), ID_LENGTH)
+        self.assertTrue(is_record_id(record_id))
+        self.assertAlmostEqual(id_timestamp(record_id), 1767225600.123, places=3)
+        self.assertFalse(is_record_id('17000000001234'))
+
+    def test_monotonic_within_millisecond(self):
+        """测试同一毫秒内生成的ID严格递增"""
+        generator = RecordIdGenerator()
+        with mock.patch('time.time', return_value=1767225600.0):
+            ids = [generator.new_id() for _ in range(1000)]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 1000)
+
+    def test_clock_going_backwards(self):
+        """测试时钟回拨时仍然递增"""
+        generator = RecordIdGenerator()
+        with mock.patch('time.time', return_value=1767225600.0):
+            first = generator.new_id()
+        with mock.patch('time.time', return_value=1767225500.0):
+            second = generator.new_id()
+        self.assertGreater(second, first)
+
+    def test_time_order(self):
+        """测试ID按生成时间排序，时间下界可用于范围查询"""
+        generator = RecordIdGenerator()
+        with mock.patch('time.time', return_value=1767225600.0):
+            early = generator.new_id()
+        with mock.patch('time.time', return_value=1767225700.0):
+            late = generator.new_id()
+        self.assertLess(early, late)
+        self.assertLessEqual(id_lower_bound(1767225600.0), early)
+        self.assertLess(early, id_lower_bound(1767225650.0))
+        self.assertLessEqual(id_lower_bound(1767225650.0), late)
+
+    def test_threads(self):
+        """测试多线程同时生成不重复"""
+        generator = RecordIdGenerator()
+        results = []
+
+        def generate():
+            results.extend(generator.new_id() for _ in range(2000))
+
+        threads = [threading.Thread(target=generate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(results)), 8000)
+
+    def test_processes(self):
+        """测试多个进程（包括fork出的子进程）同时生成不重复"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            new_record_id()
+            files = [os.path.join(temp_dir, f'ids_{i}.txt') for i in range(4)]
+            processes = [Process(target=write_ids, args=(filename, 2000)) for filename in files]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            ids = []
+            for filename in files:
+                with open(filename) as f:
+                    ids.extend(f.read().split('\n'))
+            self.assertEqual(len(ids), 8000)
+            self.assertEqual(len(set(ids)), 8000)
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
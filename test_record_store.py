@@ -0,0 +1,1174 @@
+import unittest
+import json
+import sqlite3
+import os
+import shutil
+import tempfile
+import threading
+import time
+from multiprocessing import Process
+from unittest import mock
+from mda_form_engine import MDAFormEngine
+from record_store import JsonRecordStore, open_record_store
+from sqlite_record_store import SqliteRecordStore, field_expression
+from record_index import parse_criteria
+from journal_record_store import JournalRecordStore
+from sharded_record_store import ShardedRecordStore
+from record_cache import RecordCache, estimate_records_size
+from form_validator import RecordValidationError
+from record_id import new_record_id
+from write_coordinator import GroupCommitter, atomic_write
+
+METADATA_FILE = os.path.abspath('erp_form_metadata.xml')
+
+
+def save_in_process(filename, backend, process, count):
+    """子进程中逐条保存新记录"""
+    store = open_record_store(filename, backend)
+    for i in range(count):
+        store.put_record({'id': f'{process}-{i}'})
+    store.close()
+
+
+class FakeEntry:
+    """无界面测试用的输入控件"""
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class RecordStoreTests:
+    """各存储方式共用的测试，子类提供open_store"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'data_采购管理_采购订单.json')
+        self.store = self.open_store()
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_put_and_get(self):
+        """测试新增后按ID读取"""
+        self.assertFalse(self.store.put_record({'id': '1', '供应商名称': '华为'}))
+        self.assertEqual(self.store.get_record('1'), {'id': '1', '供应商名称': '华为'})
+        self.assertIsNone(self.store.get_record('2'))
+
+    def test_update_keeps_position(self):
+        """测试更新记录保持原来的位置"""
+        for record_id in ['1', '2', '3']:
+            self.store.put_record({'id': record_id, '数量': record_id})
+        self.assertTrue(self.store.put_record({'id': '2', '数量': '20'}))
+        self.assertEqual([r['数量'] for r in self.store.get_records()], ['1', '20', '3'])
+
+    def test_delete(self):
+        """测试删除记录"""
+        self.store.put_record({'id': '1'})
+        self.store.put_record({'id': '2'})
+        self.assertTrue(self.store.delete_record('1'))
+        self.assertFalse(self.store.delete_record('1'))
+        self.assertEqual(self.store.get_records(), [{'id': '2'}])
+
+    def test_put_records(self):
+        """测试批量保存：新记录追加，已有ID原位更新"""
+        self.store.put_record({'id': '1', '数量': '1'})
+        updated = self.store.put_records([{'id': '2', '数量': '2'}, {'id': '1', '数量': '10'}, {'id': '3', '数量': '3'}])
+        self.assertEqual(updated, [False, True, False])
+        self.assertEqual([r['数量'] for r in self.store.get_records()], ['10', '2', '3'])
+
+    def test_delete_records(self):
+        """测试批量删除：返回每条记录是否找到并删除，删除后读取不到"""
+        self.store.put_records([{'id': str(i)} for i in range(5)])
+        self.assertEqual(self.store.delete_records(['1', '3', 'missing', '3']), [True, True, False, False])
+        self.assertEqual([r['id'] for r in self.store.get_records()], ['0', '2', '4'])
+        self.assertIsNone(self.store.get_record('1'))
+        self.assertEqual(self.store.delete_records([]), [])
+
+    def test_scan_records(self):
+        """测试按ID范围查询和倒序分页"""
+        for record_id in ['03', '01', '05', '02', '04']:
+            self.store.put_record({'id': record_id})
+        self.store.put_record({'备注': '没有ID的旧数据'})
+        ids = lambda records: [r['id'] for r in records]
+        self.assertEqual(ids(self.store.scan_records()), ['01', '02', '03', '04', '05'])
+        self.assertEqual(ids(self.store.scan_records('02', '05')), ['02', '03', '04'])
+        self.assertEqual(ids(self.store.scan_records(reverse=True, limit=2)), ['05', '04'])
+        self.assertEqual(ids(self.store.scan_records(end='04', reverse=True, limit=2)), ['03', '02'])
+
+    def test_find_records(self):
+        """测试按索引字段相等、前缀查找，保存和删除后索引随之更新"""
+        self.store.set_indexes(['供应商名称', '单号'])
+        self.store.put_records([
+            {'id': '1', '供应商名称': '华为', '单号': 'RK2026001', '状态': '已审核'},
+            {'id': '2', '供应商名称': '中兴', '单号': 'RK2026002', '状态': '草稿'},
+            {'id': '3', '供应商名称': '华为', '单号': 'RK2025001', '状态': '草稿'},
+        ])
+        ids = lambda records: sorted(r['id'] for r in records)
+        self.assertEqual(ids(self.store.find_records({'供应商名称': '华为'})), ['1', '3'])
+        self.assertEqual(ids(self.store.find_records(prefixes={'单号': 'RK2026'})), ['1', '2'])
+        self.assertEqual(ids(self.store.find_records({'供应商名称': '华为'}, {'单号': 'RK2026'})), ['1'])
+        # 没有索引的字段在候选记录中过滤或逐条扫描
+        self.assertEqual(ids(self.store.find_records({'供应商名称': '华为', '状态': '草稿'})), ['3'])
+        self.assertEqual(ids(self.store.find_records({'状态': '草稿'})), ['2', '3'])
+        self.store.put_record({'id': '1', '供应商名称': '联想', '单号': 'RK2026001'})
+        self.store.delete_record('3')
+        self.store.put_record({'id': '4', '供应商名称': '华为', '单号': 'RK2026004'})
+        self.assertEqual(ids(self.store.find_records({'供应商名称': '华为'})), ['4'])
+        self.assertEqual(ids(self.store.find_records({'供应商名称': '联想'})), ['1'])
+        self.assertEqual(ids(self.store.find_records(prefixes={'单号': 'RK2025'})), [])
+        self.assertEqual(self.store.find_records({'供应商名称': '不存在'}), [])
+
+    def test_find_records_sees_other_writers(self):
+        """测试其他实例写入后查询结果随之更新"""
+        self.store.set_indexes(['供应商名称'])
+        self.store.put_record({'id': '1', '供应商名称': '华为'})
+        self.assertEqual(len(self.store.find_records({'供应商名称': '华为'})), 1)
+        other = self.open_store()
+        other.put_record({'id': '2', '供应商名称': '华为'})
+        other.close()
+        self.assertEqual(len(self.store.find_records({'供应商名称': '华为'})), 2)
+
+    def test_records_between(self):
+        """测试按created_at时间段获取记录和最近的记录"""
+        self.store.put_records([
+            {'id': '1', 'created_at': '2025-12-31 23:59:59'},
+            {'id': '2', 'created_at': '2026-01-01 00:00:00'},
+            {'id': '3', 'created_at': '2026-02-15 08:00:00'},
+            {'id': '4', 'created_at': '2026-03-01 00:00:00'},
+        ])
+        ids = lambda records: [r['id'] for r in records]
+        self.assertEqual(ids(self.store.get_records_between('2026-01', '2026-03')), ['2', '3'])
+        self.assertEqual(ids(self.store.get_records_between('2026-02-15')), ['3', '4'])
+        self.assertEqual(ids(self.store.get_records_between(end='2026-01-01')), ['1'])
+        self.assertEqual(ids(self.store.get_recent_records(2)), ['3', '4'])
+        self.assertEqual(self.store.get_recent_records(0), [])
+
+    def test_iter_records(self):
+        """测试逐条遍历全部记录"""
+        self.store.put_records([{'id': str(i)} for i in range(5)])
+        self.assertEqual([r['id'] for r in self.store.iter_records()], ['0', '1', '2', '3', '4'])
+        self.assertEqual([r['id'] for r in self.open_store().iter_records()], ['0', '1', '2', '3', '4'])
+
+    def test_reopen(self):
+        """测试重新打开后数据仍在"""
+        self.store.put_record({'id': '1', '备注': '中文内容'})
+        self.store.close()
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), [{'id': '1', '备注': '中文内容'}])
+
+    def check_migrate_duplicate_ids(self):
+        """迁移原有数据文件时记录ID重复：抛出ValueError，原文件保持不变"""
+        self.store.close()
+        records = [{'id': '1', 'a': 'x'}, {'id': '1', 'a': 'y'}, {'id': '2'}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        with self.assertRaises(ValueError):
+            self.store = self.open_store()
+        self.assertFalse(os.path.exists(self.filename + '.migrated'))
+        self.assertEqual(JsonRecordStore(self.filename).get_records(), records)
+
+
+class TestJsonRecordStore(RecordStoreTests, unittest.TestCase):
+    def open_store(self):
+        return JsonRecordStore(self.filename)
+
+    def test_file_format_unchanged(self):
+        """测试仍然写成带缩进的JSON数组"""
+        self.store.put_record({'id': '1'})
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [{'id': '1'}])
+
+
+    def write_file(self, records):
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+
+    def test_iter_records_streams_file(self):
+        """测试记录未加载时流式读取文件，不常驻内存"""
+        self.write_file([{'id': '1'}, {'id': '2'}])
+        store = self.open_store()
+        self.assertEqual(list(store.iter_records()), [{'id': '1'}, {'id': '2'}])
+        self.assertIsNone(store.records)
+
+    def test_lookup_uses_index(self):
+        """测试文件未变化时按ID读取不再重新解析文件"""
+        for record_id in ['1', '2', '3']:
+            self.store.put_record({'id': record_id})
+        reads = []
+        original = self.store.read_records
+        self.store.read_records = lambda: reads.append(1) or original()
+        self.assertEqual(self.store.get_record('2'), {'id': '2'})
+        self.store.put_record({'id': '2', '状态': '已审核'})
+        self.assertEqual(self.store.get_record('2'), {'id': '2', '状态': '已审核'})
+        self.assertEqual(reads, [])
+
+    def test_reload_after_external_change(self):
+        """测试数据文件被其他程序修改后重新加载"""
+        self.store.put_record({'id': '1'})
+        self.write_file([{'id': '1', '备注': '外部修改后的内容'}, {'id': '2'}])
+        self.assertEqual(self.store.get_record('1')['备注'], '外部修改后的内容')
+        self.assertEqual(self.store.get_record('2'), {'id': '2'})
+
+    def test_delete_writes_tombstone(self):
+        """测试删除只追加墓碑不重写数据文件，其他实例和流式读取都跳过已删除的记录"""
+        self.store.put_records([{'id': str(i)} for i in range(5)])
+        state = self.store.get_file_state()
+        self.store.delete_record('1')
+        self.store.delete_records(['2', '3'])
+        self.assertEqual(self.store.get_file_state(), state)
+        self.assertEqual(self.store.tombstone_count, 3)
+        other = self.open_store()
+        self.assertEqual([r['id'] for r in other.get_records()], ['0', '4'])
+        self.assertEqual([r['id'] for r in self.open_store().iter_records()], ['0', '4'])
+        # 其他实例追加的墓碑增量读入
+        other.delete_record('4')
+        self.assertEqual([r['id'] for r in self.store.get_records()], ['0'])
+
+    def test_put_clears_tombstones(self):
+        """测试保存时重写的数据文件不含已删除的记录，墓碑随之清除"""
+        self.store.put_records([{'id': '1'}, {'id': '2'}])
+        self.store.delete_record('1')
+        self.store.put_record({'id': '3'})
+        self.assertFalse(os.path.exists(self.store.tombstone_file))
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [{'id': '2'}, {'id': '3'}])
+        # 已删除的ID重新保存后可以读到
+        self.store.put_record({'id': '1'})
+        self.assertEqual(self.open_store().get_record('1'), {'id': '1'})
+
+    def test_stale_tombstones_ignored(self):
+        """测试数据文件被其他程序重写后，原有的墓碑不再生效"""
+        self.store.put_records([{'id': '1'}, {'id': '2'}])
+        self.store.delete_record('1')
+        self.write_file([{'id': '1', '备注': '外部恢复'}, {'id': '2'}])
+        self.assertEqual(len(self.open_store().get_records()), 2)
+        self.assertEqual(len(self.store.get_records()), 2)
+        self.assertTrue(self.store.delete_record('2'))
+        self.assertEqual([r['id'] for r in self.open_store().get_records()], ['1'])
+
+    def test_vacuum(self):
+        """测试墓碑超过阈值时整理，重写一次数据文件"""
+        store = JsonRecordStore(self.filename, min_tombstones=3, vacuum_ratio=0.5, background=False)
+        store.put_records([{'id': str(i)} for i in range(5)])
+        store.delete_records(['0', '1'])
+        self.assertTrue(os.path.exists(store.tombstone_file))
+        store.delete_record('2')
+        self.assertFalse(os.path.exists(store.tombstone_file))
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f), [{'id': '3'}, {'id': '4'}])
+        self.assertEqual(store.vacuum(), 0)
+
+    def test_records_without_unique_id_preserved(self):
+        """测试没有ID或ID重复的旧数据在重写文件时保留"""
+        self.write_file([{'备注': '没有ID'}, {'id': '1', '序号': 1}, {'id': '1', '序号': 2}])
+        self.assertEqual(self.store.get_record('1'), {'id': '1', '序号': 1})
+        self.store.put_record({'id': '2'})
+        self.assertEqual(self.store.get_records(), [{'备注': '没有ID'}, {'id': '1', '序号': 1},
+                                                    {'id': '1', '序号': 2}, {'id': '2'}])
+
+
+class TestSqliteRecordStore(RecordStoreTests, unittest.TestCase):
+    def open_store(self):
+        return SqliteRecordStore(self.filename)
+
+    def test_database_beside_data_file(self):
+        """测试数据库文件默认放在数据文件所在目录"""
+        self.assertEqual(self.store.database, os.path.join(self.temp_dir, 'form_data.db'))
+        self.assertTrue(os.path.exists(self.store.database))
+
+    def test_one_table_per_form(self):
+        """测试不同单据使用不同的表"""
+        other = SqliteRecordStore(os.path.join(self.temp_dir, 'data_销售管理_销售订单.json'))
+        try:
+            self.store.put_record({'id': '1'})
+            self.assertEqual(other.get_records(), [])
+        finally:
+            other.close()
+
+    def test_migrate_json_file(self):
+        """测试首次打开时导入原有的JSON数据文件"""
+        self.store.close()
+        os.remove(self.store.database)
+        records = [{'id': '1', '数量': '5'}, {'id': '2', '数量': '8'}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), records)
+        self.assertFalse(os.path.exists(self.filename))
+        self.assertTrue(os.path.exists(self.filename + '.migrated'))
+        # 再次打开不会重复导入
+        self.store.close()
+        self.store = self.open_store()
+        self.assertEqual(len(self.store.get_records()), 2)
+
+    def test_requires_sqlite_version(self):
+        """测试SQLite版本过低时打开存储给出明确的错误"""
+        with mock.patch('sqlite3.sqlite_version_info', (3, 31, 1)), mock.patch('sqlite3.sqlite_version', '3.31.1'):
+            with self.assertRaises(RuntimeError) as context:
+                SqliteRecordStore(self.filename)
+        self.assertIn('3.38', str(context.exception))
+        self.assertIn('3.31.1', str(context.exception))
+
+    def test_migrate_keeps_records_without_id(self):
+        """测试迁移时没有ID的记录全部保留，顺序不变"""
+        self.store.close()
+        os.remove(self.store.database)
+        records = [{'备注': '没有ID'}, {'id': '1'}, {'id': '', '备注': 'ID为空'}, {'备注': '也没有ID'}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), records)
+
+    def test_migrate_duplicate_ids_fails(self):
+        """测试ID重复时迁移失败，不建表，原文件保持不变"""
+        self.store.close()
+        os.remove(self.store.database)
+        records = [{'id': '1', '序号': 1}, {'id': '1', '序号': 2}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        with self.assertRaises(ValueError):
+            self.open_store()
+        self.assertTrue(os.path.exists(self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.migrated'))
+        connection = sqlite3.connect(os.path.join(self.temp_dir, 'form_data.db'))
+        try:
+            self.assertIsNone(connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table'").fetchone())
+        finally:
+            connection.close()
+        # 修正数据后再次打开即可完成迁移
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records[:1], f, ensure_ascii=False)
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), records[:1])
+
+    def test_open_record_store_factory(self):
+        """测试按名称创建存储"""
+        self.assertIsInstance(open_record_store(self.filename), JsonRecordStore)
+        self.assertIsInstance(open_record_store(self.filename, 'journal'), JournalRecordStore)
+        store = open_record_store(self.filename, 'sqlite')
+        try:
+            self.assertIsInstance(store, SqliteRecordStore)
+        finally:
+            store.close()
+        with self.assertRaises(ValueError):
+            open_record_store(self.filename, 'csv')
+
+
+class TestFindRecordsAcrossBackends(unittest.TestCase):
+    """同样的查询在JSON和SQLite存储上结果相同"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        filename = os.path.join(self.temp_dir, 'data_采购管理_采购订单.json')
+        self.stores = [JsonRecordStore(filename), SqliteRecordStore(filename)]
+        records = [
+            {'id': '1', '已审核': True, '数量': 5, '单价': 2.5, '备注': None, '单号': 'RK001'},
+            {'id': '2', '已审核': False, '数量': 50, '单价': 0.1 + 0.2, '单号': 'RK002'},
+            {'id': '3', '已审核': 'True', '数量': '5', '单价': 1e16, '备注': 'None', '单号': 'RK101'},
+        ]
+        for store in self.stores:
+            store.set_indexes(['已审核', '数量', '单号'])
+            store.put_records(records)
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_same_results(self):
+        """测试布尔值、null、数字和文本条件在两种存储上匹配同样的记录"""
+        queries = [
+            ({'已审核': True}, ['1']),
+            ({'已审核': 'True'}, ['3']),
+            ({'已审核': False}, ['2']),
+            ({'数量': 5}, ['1', '3']),
+            ({'数量__prefix': 5}, ['1', '2', '3']),
+            ({'单价': 2.5}, ['1']),
+            ({'单价': 0.1 + 0.2}, ['2']),
+            ({'单价': 1e16}, ['3']),
+            ({'备注': None}, []),
+            ({'备注': 'None'}, ['3']),
+            ({'单号__prefix': 'RK0', '已审核': True}, ['1']),
+        ]
+        for criteria, expected in queries:
+            equals, prefixes = parse_criteria(criteria)
+            for store in self.stores:
+                with self.subTest(criteria=criteria, store=type(store).__name__):
+                    self.assertEqual(sorted(r['id'] for r in store.find_records(equals, prefixes)), expected)
+
+    def test_sqlite_query_uses_index(self):
+        """测试SQLite查询使用按字段建立的表达式索引"""
+        store = self.stores[1]
+        plan = store.connection.execute(
+            f'EXPLAIN QUERY PLAN SELECT data FROM {store.table} WHERE {field_expression("数量")} = ?', ('5',)).fetchall()
+        self.assertIn('data_采购管理_采购订单__数量', str(plan))
+
+
+class TestJournalRecordStore(RecordStoreTests, unittest.TestCase):
+    def open_store(self, **options):
+        return JournalRecordStore(self.filename, **options)
+
+    def read_journal(self):
+        with open(self.store.journal_file, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_append_one_line_per_write(self):
+        """测试每次保存、删除只追加一行"""
+        self.store.put_record({'id': '1', '数量': '5'})
+        self.store.put_record({'id': '1', '数量': '6'})
+        self.store.delete_record('1')
+        self.assertEqual(self.read_journal(), [
+            {'op': 'put', 'record': {'id': '1', '数量': '5'}},
+            {'op': 'put', 'record': {'id': '1', '数量': '6'}},
+            {'op': 'del', 'id': '1'}
+        ])
+        self.assertTrue(self.store.journal_file.endswith('data_采购管理_采购订单.jsonl'))
+
+    def test_compaction(self):
+        """测试失效行超过阈值后压缩为检查点"""
+        self.store = self.open_store(min_dead_entries=10, background=False)
+        for i in range(20):
+            self.store.put_record({'id': str(i % 3), '序号': i})
+        entries = self.read_journal()
+        self.assertEqual(entries[0]['op'], 'checkpoint')
+        self.assertLess(len(entries), 20)
+        self.assertEqual(self.store.get_records(), [{'id': '0', '序号': 18}, {'id': '1', '序号': 19},
+                                                    {'id': '2', '序号': 17}])
+        reopened = self.open_store()
+        self.assertEqual(reopened.get_records(), self.store.get_records())
+
+    def test_background_compaction(self):
+        """测试后台压缩期间的写入不丢失"""
+        self.store = self.open_store(min_dead_entries=5)
+        for i in range(200):
+            self.store.put_record({'id': str(i % 10), '序号': i})
+        self.store.close()
+        self.assertEqual(self.read_journal()[0]['op'], 'checkpoint')
+        self.assertEqual(self.open_store().get_records(), self.store.get_records())
+        self.assertEqual(len(self.store.get_records()), 10)
+
+    def test_sees_other_writers(self):
+        """测试读取时重放其他实例追加和压缩后的日志"""
+        other = self.open_store(min_dead_entries=1, background=False)
+        self.store.put_record({'id': '1'})
+        other.put_record({'id': '2'})
+        self.assertEqual(self.store.get_records(), [{'id': '1'}, {'id': '2'}])
+        other.put_record({'id': '2', '状态': '已审核'})
+        other.delete_record('1')
+        self.assertEqual(self.read_journal()[0]['op'], 'checkpoint')
+        self.assertEqual(self.store.get_records(), [{'id': '2', '状态': '已审核'}])
+
+    def test_ignores_partial_last_line(self):
+        """测试写到一半的最后一行不被重放"""
+        self.store.put_record({'id': '1'})
+        with open(self.store.journal_file, 'ab') as f:
+            f.write(b'{"op":"put","rec')
+        self.assertEqual(self.open_store().get_records(), [{'id': '1'}])
+
+    def test_migrate_duplicate_ids(self):
+        """测试原有数据中记录ID重复时不迁移"""
+        self.check_migrate_duplicate_ids()
+        self.assertFalse(os.path.exists(self.store.journal_file))
+
+    def test_overwrites_partial_last_line(self):
+        """测试追加前截掉写到一半的最后一行，新追加的行完整可读"""
+        self.store.put_record({'id': '1'})
+        with open(self.store.journal_file, 'ab') as f:
+            f.write(b'{"op":"put","rec')
+        store = self.open_store()
+        store.put_record({'id': '2'})
+        self.assertEqual(self.read_journal(), [{'op': 'put', 'record': {'id': '1'}},
+                                               {'op': 'put', 'record': {'id': '2'}}])
+        self.assertEqual(self.open_store().get_records(), [{'id': '1'}, {'id': '2'}])
+
+    def test_concurrent_compaction(self):
+        """测试写出检查点期间日志被另一个实例压缩替换时放弃本次压缩，不丢失记录"""
+        self.store = self.open_store(background=False)
+        other = self.open_store(background=False)
+        for i in range(10):
+            self.store.put_record({'id': str(i % 3), '序号': i})
+        write_checkpoint = self.store.write_checkpoint
+
+        def racing_checkpoint(f, records, count=None):
+            self.assertTrue(other.compact())
+            other.put_record({'id': '3'})
+            return write_checkpoint(f, records, count)
+
+        with mock.patch.object(self.store, 'write_checkpoint', racing_checkpoint):
+            self.assertFalse(self.store.compact())
+        expected = [{'id': '0', '序号': 9}, {'id': '1', '序号': 7}, {'id': '2', '序号': 8}, {'id': '3'}]
+        self.assertEqual(self.open_store().get_records(), expected)
+        self.assertEqual(self.store.get_records(), expected)
+        self.assertTrue(self.store.compact())
+        self.assertEqual(self.open_store().get_records(), expected)
+        self.assertEqual([name for name in os.listdir(self.temp_dir) if name.endswith('.tmp')], [])
+
+    def test_migrate_json_file(self):
+        """测试首次打开时导入原有的JSON数据文件"""
+        records = [{'id': '1', '数量': '5'}, {'id': '2', '数量': '8'}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), records)
+        self.assertTrue(os.path.exists(self.filename + '.migrated'))
+
+
+class TestShardedRecordStore(RecordStoreTests, unittest.TestCase):
+    def open_store(self, **options):
+        return ShardedRecordStore(self.filename, **options)
+
+    def read_manifest(self):
+        with open(self.store.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_monthly_shards(self):
+        """测试记录按created_at的月份保存到分片，清单记录每个分片的记录数"""
+        self.store.put_records([
+            {'id': '1', 'created_at': '2026-01-05 10:00:00'},
+            {'id': '2', 'created_at': '2026-02-01 10:00:00'},
+            {'id': '3', 'created_at': '2026-01-20 10:00:00'},
+            {'id': '4'},
+        ])
+        self.assertEqual(sorted(name for name in os.listdir(self.store.directory) if name.endswith('.json')),
+                         ['0000-00.json', '2026-01.json', '2026-02.json', 'manifest.json'])
+        shards = self.read_manifest()['shards']
+        self.assertEqual({month: shard['count'] for month, shard in shards.items()},
+                         {'0000-00': 1, '2026-01': 2, '2026-02': 1})
+        self.assertEqual((shards['2026-01']['min_id'], shards['2026-01']['max_id']), ('1', '3'))
+        self.assertEqual([r['id'] for r in self.store.get_records()], ['4', '1', '3', '2'])
+
+    def test_opens_only_needed_shards(self):
+        """测试时间段查询和最近记录只打开涉及的分片"""
+        for month in range(1, 13):
+            self.store.put_record({'id': f'{month:02d}', 'created_at': f'2025-{month:02d}-10 09:00:00'})
+        self.store.close()
+        self.store = self.open_store()
+        self.assertEqual(len(self.store.get_records_between('2025-03', '2025-05')), 2)
+        self.assertEqual(sorted(self.store.stores), ['2025-03', '2025-04'])
+        self.store.close()
+        self.assertEqual([r['id'] for r in self.store.get_recent_records(1)], ['12'])
+        self.assertEqual(list(self.store.stores), ['2025-12'])
+
+    def test_update_keeps_shard(self):
+        """测试更新时没有带created_at的记录留在原分片并保留创建时间，created_at改变时移到新分片"""
+        self.store.put_record({'id': '1', 'created_at': '2026-01-05 10:00:00', '数量': '1'})
+        self.assertTrue(self.store.put_record({'id': '1', '数量': '2'}))
+        self.assertEqual(self.store.get_record('1'), {'id': '1', '数量': '2', 'created_at': '2026-01-05 10:00:00'})
+        self.assertTrue(self.store.put_record({'id': '1', 'created_at': '2026-03-01 10:00:00', '数量': '3'}))
+        self.assertEqual(self.store.shard_store('2026-01').get_records(), [])
+        self.assertEqual(self.store.get_records_between('2026-03')[0]['数量'], '3')
+        self.assertEqual(self.read_manifest()['shards']['2026-03']['count'], 1)
+
+    def test_new_id_checks_current_shard_only(self):
+        """测试新生成的ID保存时只查找当前月份的分片"""
+        self.store.put_records([{'id': str(i), 'created_at': f'2020-{i:02d}-01 00:00:00'} for i in range(1, 13)])
+        self.store.close()
+        self.store = self.open_store()
+        self.store.put_record({'id': new_record_id(), 'created_at': time.strftime('%Y-%m-%d %H:%M:%S')})
+        self.assertEqual(list(self.store.stores), [time.strftime('%Y-%m')])
+
+    def test_migrate_json_file(self):
+        """测试首次打开时把原有的JSON数据文件拆分到分片"""
+        records = [{'id': '1', 'created_at': '2026-01-01 08:00:00'}, {'id': '2', 'created_at': '2026-02-01 08:00:00'}]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        self.store = self.open_store()
+        self.assertEqual(self.store.get_records(), records)
+        self.assertEqual(sorted(self.read_manifest()['shards']), ['2026-01', '2026-02'])
+        self.assertTrue(os.path.exists(self.filename + '.migrated'))
+
+    def test_migrate_duplicate_ids(self):
+        """测试原有数据中记录ID重复时不迁移"""
+        self.check_migrate_duplicate_ids()
+        self.assertFalse(os.path.exists(self.store.directory))
+
+    def test_interrupted_migration(self):
+        """测试拆分中途中断时不留下分片目录，再次打开时重新拆分全部记录"""
+        records = [{'id': str(i), 'created_at': f'2026-0{i % 3 + 1}-01 08:00:00'} for i in range(5)]
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        put_records = ShardedRecordStore.put_records
+        calls = []
+
+        def failing_put_records(store, batch):
+            calls.append(len(batch))
+            if len(calls) == 2:
+                raise OSError('中断')
+            return put_records(store, batch)
+
+        with mock.patch('sharded_record_store.MIGRATE_BATCH_SIZE', 2), \
+                mock.patch.object(ShardedRecordStore, 'put_records', failing_put_records):
+            with self.assertRaises(OSError):
+                self.open_store()
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['data_采购管理_采购订单.json', 'data_采购管理_采购订单.json.lock'])
+        self.store = self.open_store()
+        self.assertEqual(sorted(r['id'] for r in self.store.get_records()), ['0', '1', '2', '3', '4'])
+        self.assertTrue(os.path.exists(self.filename + '.migrated'))
+
+    def test_journal_shards(self):
+        """测试分片使用追加日志存储"""
+        self.store = self.open_store(shard_backend='journal')
+        self.store.put_record({'id': '1', 'created_at': '2026-01-01 08:00:00'})
+        self.assertTrue(os.path.exists(os.path.join(self.store.directory, '2026-01.jsonl')))
+        self.assertEqual(self.open_store(shard_backend='journal').get_record('1')['id'], '1')
+
+
+class TestRecordCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def json_store(self, name, count=0):
+        store = JsonRecordStore(os.path.join(self.temp_dir, f'data_{name}.json'))
+        for i in range(count):
+            store.put_record({'id': f'{name}{i}', '备注': '内容' * 20})
+        return store
+
+    def test_hit_until_changed(self):
+        """测试存储未变化时命中缓存，保存后重新读取"""
+        cache = RecordCache()
+        store = self.json_store('采购订单', 3)
+        first = cache.get_records(store)
+        first.append({'id': '调用方修改'})
+        self.assertEqual(len(cache.get_records(store)), 3)
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+        store.put_record({'id': '新记录'})
+        self.assertEqual(len(cache.get_records(store)), 4)
+        self.assertEqual(cache.misses, 2)
+
+    def test_external_change_invalidates(self):
+        """测试数据文件被其他程序修改后缓存失效"""
+        cache = RecordCache()
+        store = self.json_store('采购订单', 1)
+        cache.get_records(store)
+        with open(store.filename, 'w', encoding='utf-8') as f:
+            json.dump([{'id': '外部'}, {'id': '写入'}], f)
+        self.assertEqual(cache.get_records(store), [{'id': '外部'}, {'id': '写入'}])
+
+    def test_lru_eviction(self):
+        """测试超过内存上限时淘汰最久未使用的单据并释放存储的内存"""
+        stores = [self.json_store(name, 50) for name in ('甲', '乙', '丙')]
+        size = estimate_records_size(stores[0].get_records())
+        cache = RecordCache(max_bytes=int(size * 2.5))
+        cache.get_records(stores[0])
+        cache.get_records(stores[1])
+        cache.get_records(stores[0])
+        cache.get_records(stores[2])
+        self.assertEqual(list(cache.entries), [stores[0].filename, stores[2].filename])
+        self.assertIsNone(stores[1].records)
+        self.assertLessEqual(cache.total_size, cache.max_bytes)
+
+    def test_release_tracked_stores(self):
+        """测试超过内存上限时同时释放不在缓存中的已打开存储常驻内存的记录"""
+        stores = [self.json_store(name, 50) for name in ('甲', '乙')]
+        size = estimate_records_size(stores[0].get_records())
+        cache = RecordCache(max_bytes=int(size * 1.5))
+        for store in stores:
+            cache.track(store)
+        cache.get_records(stores[0])
+        # 保存、按ID查找等不经缓存的访问使记录常驻内存
+        stores[1].get_record('乙0')
+        self.assertIsNotNone(stores[1].records)
+        cache.get_records(self.json_store('丙', 50))
+        self.assertIsNone(stores[1].records)
+        self.assertEqual(stores[1].get_record('乙0')['id'], '乙0')
+
+    def test_sqlite_version(self):
+        """测试SQLite存储的版本在本连接和其他连接写入后变化"""
+        filename = os.path.join(self.temp_dir, 'data_采购订单.json')
+        store = SqliteRecordStore(filename)
+        other = SqliteRecordStore(filename)
+        try:
+            cache = RecordCache()
+            store.put_record({'id': '1'})
+            self.assertEqual(len(cache.get_records(store)), 1)
+            store.put_record({'id': '2'})
+            self.assertEqual(len(cache.get_records(store)), 2)
+            other.put_record({'id': '3'})
+            self.assertEqual(len(cache.get_records(store)), 3)
+            cache.get_records(store)
+            self.assertEqual(cache.hits, 1)
+        finally:
+            store.close()
+            other.close()
+
+    def test_journal_version(self):
+        """测试追加日志存储写入后缓存失效"""
+        store = JournalRecordStore(os.path.join(self.temp_dir, 'data_采购订单.json'))
+        cache = RecordCache()
+        store.put_record({'id': '1'})
+        self.assertEqual(len(cache.get_records(store)), 1)
+        store.put_record({'id': '2'})
+        self.assertEqual(len(cache.get_records(store)), 2)
+        cache.evict(store.filename)
+        self.assertEqual(len(cache.get_records(store)), 2)
+
+
+class TestWriteCoordinator(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_group_commit_batches(self):
+        """测试提交期间到达的操作合并为一批"""
+        batches = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def commit(ops):
+            batches.append(list(ops))
+            if len(batches) == 1:
+                started.set()
+                release.wait()
+            return [op * 10 for op in ops]
+
+        committer = GroupCommitter(commit)
+        results = {}
+
+        def submit(op):
+            results[op] = committer.submit(op)
+
+        first = threading.Thread(target=submit, args=(1,))
+        first.start()
+        started.wait()
+        others = [threading.Thread(target=submit, args=(op,)) for op in (2, 3, 4)]
+        for thread in others:
+            thread.start()
+        while len(committer.pending) < 3:
+            pass
+        release.set()
+        for thread in [first] + others:
+            thread.join()
+        self.assertEqual(batches[0], [1])
+        self.assertEqual(sorted(batches[1]), [2, 3, 4])
+        self.assertEqual(results, {1: 10, 2: 20, 3: 30, 4: 40})
+        self.assertEqual((committer.batches, committer.operations), (2, 4))
+
+    def test_group_commit_error(self):
+        """测试提交失败时同一批的调用都收到异常"""
+        def commit(ops):
+            raise OSError('磁盘已满')
+        committer = GroupCommitter(commit)
+        with self.assertRaises(OSError):
+            committer.submit(1)
+        self.assertFalse(committer.committing)
+
+    def test_atomic_write(self):
+        """测试原子写入替换原文件且不留下临时文件"""
+        filename = os.path.join(self.temp_dir, 'data.json')
+        atomic_write(filename, b'[1]')
+        atomic_write(filename, b'[1, 2]')
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), b'[1, 2]')
+        self.assertEqual(os.listdir(self.temp_dir), ['data.json'])
+
+    def check_no_lost_updates(self, backend):
+        filename = os.path.join(self.temp_dir, 'data_采购管理_采购订单.json')
+        processes = [Process(target=save_in_process, args=(filename, backend, p, 30)) for p in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        store = open_record_store(filename, backend)
+        self.assertEqual(len(store.get_records()), 120)
+        store.close()
+
+    def test_json_concurrent_processes(self):
+        """测试多个进程同时保存到JSON数据文件不丢失记录"""
+        self.check_no_lost_updates('json')
+
+    def test_journal_concurrent_processes(self):
+        """测试多个进程同时追加日志不丢失记录"""
+        self.check_no_lost_updates('journal')
+
+
+class TestEngineStorage(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+
+    def save(self, engine, values):
+        engine.field_widgets = {name: FakeEntry(value) for name, value in values.items()}
+        engine.save_data()
+        engine.field_widgets = {}
+
+    def test_engine_crud_with_sqlite(self):
+        """测试引擎通过SQLite存储新增、更新和删除记录"""
+        engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage='sqlite')
+        engine.set_current_form('测试模块', '测试单据')
+        self.save(engine, {'测试字段1': '值1'})
+        filename = engine.get_data_filename()
+        record = engine.get_records(filename)[0]
+        self.assertIn('created_at', record)
+        self.save(engine, {'id': record['id'], '测试字段1': '值2'})
+        self.assertEqual(engine.get_record_by_id(filename, record['id'])['测试字段1'], '值2')
+        self.assertEqual(len(engine.get_records(filename)), 1)
+        self.assertFalse(os.path.exists(filename))
+        engine.close_stores()
+
+    def test_engine_journal_storage(self):
+        """测试引擎使用追加日志存储"""
+        engine = MDAFormEngine(METADATA_FILE, use_snapshot=False, storage='journal')
+        engine.set_current_form('测试模块', '测试单据')
+        self.save(engine, {'测试字段1': '值1'})
+        self.assertTrue(os.path.exists('data_测试模块_测试单据.jsonl'))
+        self.assertEqual(engine.get_records(engine.get_data_filename())[0]['测试字段1'], '值1')
+        engine.close_stores()
+
+    def test_engine_record_cache(self):
+        """测试引擎重复读取记录列表时使用缓存"""
+        engine = MDAFormEngine(METADATA_FILE, use_snapshot=False)
+        engine.set_current_form('测试模块', '测试单据')
+        self.save(engine, {'测试字段1': '值1'})
+        filename = engine.get_data_filename()
+        for _ in range(3):
+            self.assertEqual(len(engine.get_records(filename)), 1)
+        self.assertEqual(engine.record_cache.hits, 2)
+
+    def test_engine_default_json(self):
+        """测试默认仍然保存到JSON数据文件"""
+        engine = MDAFormEngine(METADATA_FILE, use_snapshot=False)
+        engine.set_current_form('测试模块', '测试单据')
+        self.save(engine, {'测试字段1': '值1'})
+        with open('data_测试模块_测试单据.json', 'r', encoding='utf-8') as f:
+            self.assertEqual(json.load(f)[0]['测试字段1'], '值1')
+
+
+BULK_METADATA = '''<?xml version="1.0" encoding="UTF-8"?>
+<FormMetadata>
+    <Modules>
+        <Module name="采购管理">
+            <Forms>
+                <Form name="采购入库">
+                    <FieldList>
+                        <TextField name="入库单号" Length="20" Left="10" Top="10" Width="200" Height="30" VisibleExt="111" Indexed="1">
+                            <Validation>
+                                <Required>1</Required>
+                            </Validation>
+                        </TextField>
+                        <MoneyField name="入库金额" Length="10" Left="10" Top="50" Width="200" Height="30" VisibleExt="100">
+                            <Validation>
+                                <Number>1</Number>
+                            </Validation>
+                        </MoneyField>
+                    </FieldList>
+                </Form>
+            </Forms>
+        </Module>
+    </Modules>
+</FormMetadata>'''
+
+
+class TestSaveRecords(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        with open('metadata.xml', 'w', encoding='utf-8') as f:
+            f.write(BULK_METADATA)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp_dir)
+
+    def check_bulk_save(self, storage):
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage=storage, device='mobile')
+        rows = [{'入库单号': f' RK{i:04d} ', '入库金额': i * 1.5} for i in range(200)]
+        ids = engine.save_records('采购管理', '采购入库', rows)
+        self.assertEqual(len(set(ids)), 200)
+        records = engine.get_records('data_采购管理_采购入库.json')
+        self.assertEqual([r['id'] for r in records], ids)
+        self.assertEqual(records[0]['入库单号'], 'RK0000')
+        self.assertTrue(all(r['created_at'] for r in records))
+        # 再次导入的新记录不与已有记录重复，带ID的记录按ID更新
+        more = engine.save_records('采购管理', '采购入库', [{'入库单号': 'RK9999'}, {'id': ids[0], '入库单号': 'RK0000-改'}])
+        self.assertNotIn(more[0], ids)
+        records = engine.get_records('data_采购管理_采购入库.json')
+        self.assertEqual(len(records), 201)
+        self.assertEqual(records[0]['入库单号'], 'RK0000-改')
+        engine.close_stores()
+
+    def test_bulk_save_json(self):
+        """测试批量保存到JSON数据文件"""
+        self.check_bulk_save('json')
+
+    def test_bulk_save_sqlite(self):
+        """测试批量保存到SQLite"""
+        self.check_bulk_save('sqlite')
+
+    def test_bulk_save_journal(self):
+        """测试批量保存到追加日志，整批只追加一次"""
+        self.check_bulk_save('journal')
+
+    def test_json_written_once(self):
+        """测试整批只写一次数据文件"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        store = engine.get_store('data_采购管理_采购入库.json')
+        writes = []
+        write_records = store.write_records
+        store.write_records = lambda records: writes.append(1) or write_records(records)
+        engine.save_records('采购管理', '采购入库', ({'入库单号': f'RK{i}'} for i in range(50)))
+        self.assertEqual(len(writes), 1)
+
+    def test_validation_rejects_whole_batch(self):
+        """测试任何一条验证失败时整批都不写入，并报告所有出错的记录"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        rows = [{'入库单号': 'RK1'}, {'入库单号': '', '入库金额': 'abc'}, {'入库金额': '5'}]
+        with self.assertRaises(RecordValidationError) as context:
+            engine.save_records('采购管理', '采购入库', rows)
+        self.assertEqual(context.exception.errors, [
+            (1, ['入库单号 不能为空', '入库金额 必须是数字']),
+            (2, ['入库单号 不能为空'])
+        ])
+        self.assertIn('第 2 条记录', str(context.exception))
+        self.assertFalse(os.path.exists('data_采购管理_采购入库.json'))
+
+    def test_find_records(self):
+        """测试按元数据中的索引字段查找记录"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        engine.save_records('采购管理', '采购入库', [{'入库单号': f'RK{i:04d}', '入库金额': str(i % 3)} for i in range(100)])
+        store = engine.get_form_store('采购管理', '采购入库')
+        self.assertEqual(store.indexed_fields, ('入库单号',))
+        self.assertEqual([r['入库单号'] for r in engine.find_records('采购管理', '采购入库', 入库单号='RK0042')], ['RK0042'])
+        self.assertEqual(len(engine.find_records('采购管理', '采购入库', 入库单号__prefix='RK00')), 100)
+        self.assertEqual(len(engine.find_records('采购管理', '采购入库', 入库单号__prefix='RK001', 入库金额='0')), 3)
+
+    def test_engine_sharded_list_limit(self):
+        """测试按月分片存储时数据列表只取最近的记录"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage='sharded', list_limit=2)
+        engine.set_current_form('采购管理', '采购入库')
+        engine.save_records('采购管理', '采购入库', [
+            {'入库单号': '去年', 'created_at': '2025-06-01 09:00:00'},
+            {'入库单号': '一月', 'created_at': '2026-01-10 09:00:00'},
+            {'入库单号': '二月', 'created_at': '2026-02-10 09:00:00'},
+        ])
+        filename = engine.get_data_filename()
+        self.assertEqual([r['入库单号'] for r in engine.get_list_records(filename)], ['一月', '二月'])
+        self.assertEqual(len(engine.get_records(filename)), 3)
+        self.assertEqual([r['入库单号'] for r in engine.get_records_between('采购管理', '采购入库', '2025', '2026')],
+                         ['去年'])
+        engine.close_stores()
+
+    def check_details(self, storage):
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage=storage)
+        rows = [{'入库单号': f'RK{i}', 'details': [{'物料编码': f'WL{i}', '数量': '1'}] * (i + 1)} for i in range(3)]
+        ids = engine.save_records('采购管理', '采购入库', rows)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        headers = engine.get_records(filename)
+        self.assertFalse(any('details' in record for record in headers))
+        self.assertEqual(len(engine.get_record_details(filename, headers[2])), 3)
+        self.assertEqual(engine.get_record_details(filename, {'id': 'missing'}), [])
+        detail_store = engine.get_detail_store(filename)
+        self.assertEqual(detail_store.get_record(ids[0])['details'], [{'物料编码': 'WL0', '数量': '1'}])
+        self.assertEqual(detail_store.get_record(ids[0])['created_at'], headers[0]['created_at'])
+        # 不带明细的更新保留原有明细
+        engine.save_records('采购管理', '采购入库', [{'id': ids[1], '入库单号': 'RK1-改'}])
+        self.assertEqual(len(engine.get_record_details(filename, engine.get_record_by_id(filename, ids[1]))), 2)
+        engine.close_stores()
+
+    def test_details_stored_separately(self):
+        """测试明细行与表头分开保存，读取表头列表时不包含明细"""
+        self.check_details('json')
+        self.assertTrue(os.path.exists('data_采购管理_采购入库.details.json'))
+
+    def test_details_sqlite(self):
+        """测试SQLite存储的明细行单独一张表"""
+        self.check_details('sqlite')
+
+    def test_details_sharded(self):
+        """测试按月分片时明细行与表头在同一月份的分片"""
+        self.check_details('sharded')
+        month = time.strftime('%Y-%m')
+        self.assertTrue(os.path.exists(f'data_采购管理_采购入库.details.shards/{month}.json'))
+
+    def test_split_legacy_details(self):
+        """测试旧数据中嵌套的明细行在首次读取列表时移到明细存储"""
+        records = [{'id': '1', '入库单号': 'RK1', 'details': [{'物料编码': 'WL1'}]}, {'id': '2', '入库单号': 'RK2'}]
+        with open('data_采购管理_采购入库.json', 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        self.assertEqual(engine.get_records(filename), [{'id': '1', '入库单号': 'RK1'}, {'id': '2', '入库单号': 'RK2'}])
+        self.assertEqual(engine.get_record_details(filename, engine.get_record_by_id(filename, '1')), [{'物料编码': 'WL1'}])
+        events = engine.change_consumer('采购管理', '采购入库', 'sync').poll()
+        self.assertEqual([(e['op'], e['id'], e['record']['details']) for e in events], [('update', '1', [{'物料编码': 'WL1'}])])
+
+    def test_split_legacy_details_rereads_under_lock(self):
+        """测试拆分时在锁内重新读取记录，读取之后保存的内容不被旧的表头覆盖"""
+        records = [{'id': '1', '入库单号': 'RK1', 'details': [{'物料编码': 'WL1'}]}]
+        with open('data_采购管理_采购入库.json', 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        stale = engine.get_store(filename).get_records()
+        engine.save_records('采购管理', '采购入库', [{'id': '1', '入库单号': 'RK1-改', 'details': [{'物料编码': 'WL2'}]}])
+        self.assertFalse(engine.split_legacy_details(filename, stale))
+        self.assertEqual(engine.get_record_by_id(filename, '1'), {'id': '1', '入库单号': 'RK1-改'})
+        self.assertEqual(engine.get_record_details(filename, {'id': '1'}), [{'物料编码': 'WL2'}])
+
+    def test_split_legacy_details_list_limit(self):
+        """测试设置了list_limit时数据列表中的旧数据同样拆分明细行"""
+        records = [{'id': str(i), '入库单号': f'RK{i}', 'details': [{'物料编码': f'WL{i}'}]} for i in range(3)]
+        with open('data_采购管理_采购入库.json', 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False)
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, list_limit=2)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        self.assertEqual(engine.get_list_records(filename), [{'id': '1', '入库单号': 'RK1'}, {'id': '2', '入库单号': 'RK2'}])
+        self.assertEqual(engine.get_record_details(filename, engine.get_record_by_id(filename, '2')), [{'物料编码': 'WL2'}])
+        self.assertEqual(engine.get_record_details(filename, engine.get_record_by_id(filename, '0')), [{'物料编码': 'WL0'}])
+
+    def test_search_records(self):
+        """测试全文检索：首次检索时建立索引，之后的保存和删除增量更新"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        engine.set_current_form('采购管理', '采购入库')
+        ids = engine.save_records('采购管理', '采购入库', [
+            {'入库单号': 'RK1', 'details': [{'物料编码': '六角螺丝'}]},
+            {'入库单号': 'RK2', 'details': [{'物料编码': '螺母'}]},
+        ])
+        self.assertEqual(engine.search_records('采购管理', '采购入库', '螺丝'), [ids[0]])
+        self.assertTrue(os.path.exists('data_采购管理_采购入库.search'))
+        # 不带明细的更新沿用已保存的明细
+        more = engine.save_records('采购管理', '采购入库', [{'入库单号': 'RK3 螺丝'}, {'id': ids[0], '入库单号': 'RK1'}])
+        self.assertEqual(sorted(engine.search_records('采购管理', '采购入库', '螺丝')), sorted([ids[0], more[0]]))
+        with mock.patch('mda_form_engine.messagebox'):
+            engine.delete_record(ids[0])
+        self.assertEqual(engine.search_records('采购管理', '采购入库', '螺丝'), [more[0]])
+        engine.close_stores()
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        self.assertEqual(engine.search_records('采购管理', '采购入库', 'rk2'), [ids[1]])
+
+    def test_change_log(self):
+        """测试保存、删除按顺序记录到变更日志，消费者从提交的位置继续读取"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        engine.set_current_form('采购管理', '采购入库')
+        consumer = engine.change_consumer('采购管理', '采购入库', 'sync')
+        self.assertEqual(consumer.poll(), [])
+        ids = engine.save_records('采购管理', '采购入库', [{'入库单号': 'RK1', 'details': [{'物料编码': 'WL1'}]},
+                                                          {'入库单号': 'RK2'}])
+        events = consumer.poll()
+        self.assertEqual([(e['seq'], e['op'], e['id']) for e in events], [(1, 'insert', ids[0]), (2, 'insert', ids[1])])
+        self.assertEqual(events[0]['record']['details'], [{'物料编码': 'WL1'}])
+        consumer.commit()
+        engine.save_records('采购管理', '采购入库', [{'id': ids[1], '入库单号': 'RK2-改'}])
+        with mock.patch('mda_form_engine.messagebox'):
+            engine.delete_record(ids[0])
+            engine.delete_record('missing')
+        consumer = engine.change_consumer('采购管理', '采购入库', 'sync')
+        events = consumer.poll()
+        self.assertEqual([(e['seq'], e['op'], e['id']) for e in events], [(3, 'update', ids[1]), (4, 'delete', ids[0])])
+        self.assertEqual(events[0]['record']['入库单号'], 'RK2-改')
+        # 不同名称的消费者各自从头读取
+        self.assertEqual(len(engine.change_consumer('采购管理', '采购入库', 'report').poll()), 4)
+
+    def check_concurrent_saves(self, storage):
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage=storage, commit_window=0.01)
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        ids = []
+
+        def save(thread):
+            for i in range(5):
+                ids.extend(engine.save_records('采购管理', '采购入库', [{'入库单号': f'RK{thread}-{i}'}]))
+
+        threads = [threading.Thread(target=save, args=(thread,)) for thread in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        committer = engine.get_committer(filename)
+        self.assertEqual(committer.operations, 20)
+        self.assertLess(committer.batches, 20)
+        self.assertEqual(len(engine.get_records(filename)), 20)
+        events = engine.change_consumer('采购管理', '采购入库', 'sync').poll()
+        self.assertEqual([e['seq'] for e in events], list(range(1, 21)))
+        self.assertEqual(sorted(e['id'] for e in events), sorted(ids))
+        # 同一批中的保存和删除按到达顺序写入，各自返回自己的结果
+        self.assertEqual(engine.commit_changes(filename, [('put', [({'id': ids[0], '入库单号': '改'}, None)]),
+                                                          ('del', [ids[0], 'missing']), ('del', [ids[1]])]),
+                         [[True], [True, False], [True]])
+        self.assertIsNone(engine.get_record_by_id(filename, ids[0]))
+        engine.close_stores()
+
+    def test_concurrent_saves_group_commit(self):
+        """测试同时到达的保存经组提交合并写入，变更日志序号连续且与保存一一对应"""
+        self.check_concurrent_saves('json')
+
+    def test_concurrent_saves_sqlite(self):
+        """测试SQLite存储在其他线程中保存（由组提交的提交者线程代为写入）"""
+        self.check_concurrent_saves('sqlite')
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage='sqlite')
+        store = engine.get_form_store('采购管理', '采购入库')
+        thread = threading.Thread(target=lambda: store.put_record({'id': 'X', '入库单号': '其他线程'}))
+        thread.start()
+        thread.join()
+        self.assertEqual(store.get_record('X')['入库单号'], '其他线程')
+        engine.close_stores()
+
+    def test_commit_window_sqlite(self):
+        """测试组提交等待时间不传给存储，SQLite存储同样可用；写在storage_options中时同样生效"""
+        for options in ({'commit_window': 0.002}, {'storage_options': {'commit_window': 0.002}}):
+            engine = MDAFormEngine('metadata.xml', use_snapshot=False, storage='sqlite', **options)
+            self.assertEqual(engine.commit_window, 0.002)
+            ids = engine.save_records('采购管理', '采购入库', [{'入库单号': 'RK1'}])
+            filename = engine.data_filename_for('采购管理', '采购入库')
+            self.assertEqual(engine.get_record_by_id(filename, ids[0])['入库单号'], 'RK1')
+            self.assertEqual(engine.delete_records('采购管理', '采购入库', ids), [True])
+            engine.close_stores()
+
+    def test_delete_records(self):
+        """测试无界面批量删除记录及其明细，整批只追加一次墓碑"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        ids = engine.save_records('采购管理', '采购入库', [{'入库单号': f'RK{i}', 'details': [{'物料编码': 'WL'}]}
+                                                          for i in range(100)])
+        filename = engine.data_filename_for('采购管理', '采购入库')
+        store = engine.get_store(filename)
+        writes = []
+        write_tombstones = store.write_tombstones
+        store.write_tombstones = lambda record_ids: writes.append(len(record_ids)) or write_tombstones(record_ids)
+        self.assertEqual(engine.delete_records('采购管理', '采购入库', ids[:60] + ['missing']), [True] * 60 + [False])
+        self.assertEqual(writes, [60])
+        self.assertEqual(len(engine.get_records(filename)), 40)
+        self.assertIsNone(engine.get_detail_store(filename).get_record(ids[0]))
+        events = engine.change_consumer('采购管理', '采购入库', 'sync').poll(1000)
+        self.assertEqual(sum(1 for e in events if e['op'] == 'delete'), 60)
+
+    def test_record_history(self):
+        """测试keep_history=True时保存、删除记录保留版本历史，可读取任一版本（含明细行）"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False, keep_history=True)
+        engine.set_current_form('采购管理', '采购入库')
+        record_id = engine.save_records('采购管理', '采购入库', [{'入库单号': 'RK1', 'details': [{'物料编码': 'WL1'}]}])[0]
+        engine.save_records('采购管理', '采购入库', [{'id': record_id, '入库单号': 'RK1-改'}])
+        with mock.patch('mda_form_engine.messagebox'):
+            engine.delete_record(record_id)
+        versions = engine.get_record_versions('采购管理', '采购入库', record_id)
+        self.assertEqual([v['op'] for v in versions], ['full', 'delta', 'delete'])
+        first = engine.get_record_as_of('采购管理', '采购入库', record_id, version=1)
+        self.assertEqual((first['入库单号'], first['details']), ('RK1', [{'物料编码': 'WL1'}]))
+        second = engine.get_record_as_of('采购管理', '采购入库', record_id, timestamp=versions[1]['timestamp'])
+        self.assertEqual((second['入库单号'], second['details']), ('RK1-改', [{'物料编码': 'WL1'}]))
+        self.assertIsNone(engine.get_record_as_of('采购管理', '采购入库', record_id))
+        # 默认不保存历史
+        MDAFormEngine('metadata.xml', use_snapshot=False).save_records('采购管理', '采购入库', [{'入库单号': 'RK2'}])
+        with open('data_采购管理_采购入库.history.jsonl', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+    def test_unknown_form(self):
+        """测试表单不存在时报错"""
+        engine = MDAFormEngine('metadata.xml', use_snapshot=False)
+        with self.assertRaises(ValueError):
+            engine.save_records('采购管理', '不存在的单据', [{}])
+
+
+if __name__ == '__main__':
+    unittest.main()
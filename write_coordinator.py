@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# 写入协调：多个引擎进程共用同一数据目录时，保存操作通过文件锁互斥，
+# 写临时文件后原子替换；同一进程内短时间内到达的多个保存合并为一次写入和一次fsync（组提交）
+
+
+class FileLock:
+    """基于锁文件的进程间建议锁，Linux/macOS使用fcntl，Windows使用msvcrt"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, 'a+b')
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            # LK_LOCK失败前会重试10秒，仍未取得时继续等待
+            self.file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+        elif msvcrt is not None:
+            self.file.seek(0)
+            msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.file.close()
+        self.file = None
+
+
+def lock_file_for(filename):
+    """数据文件对应的锁文件"""
+    return filename + '.lock'
+
+
+def temp_file_for(filename):
+    """替换filename前写入的临时文件，按进程和线程区分，同时写入的多个进程、线程互不覆盖"""
+    return f'{filename}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+
+def atomic_write(filename, data):
+    """写入临时文件并fsync后替换原文件，读取方不会看到写了一半的文件"""
+    temp_file = temp_file_for(filename)
+    try:
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, filename)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+class CommitRequest:
+    __slots__ = ('op', 'done', 'result', 'error')
+
+    def __init__(self, op):
+        self.op = op
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class GroupCommitter:
+    """组提交：第一个到达的保存成为提交者，等待window秒后把期间到达的所有操作一次提交
+
+    commit(ops)接收操作列表并返回对应的结果列表；提交期间新到达的操作由同一提交者在下一批处理
+    """
+
+    def __init__(self, commit, window=0.0):
+        self.commit = commit
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = []
+        self.committing = False
+        # 已提交的批次数和操作数，用于观察合并效果
+        self.batches = 0
+        self.operations = 0
+
+    def submit(self, op):
+        """提交一个操作，等待其所在批次写入完成后返回结果"""
+        request = CommitRequest(op)
+        with self.lock:
+            self.pending.append(request)
+            leader = not self.committing
+            if leader:
+                self.committing = True
+        if leader:
+            self.run_batches()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def run_batches(self):
+        if self.window:
+            time.sleep(self.window)
+        while True:
+            with self.lock:
+                batch = self.pending
+                self.pending = []
+                if not batch:
+                    self.committing = False
+                    return
+            try:
+                results = self.commit([request.op for request in batch])
+                for request, result in zip(batch, results):
+                    request.result = result
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            self.batches += 1
+            self.operations += len(batch)
+            for request in batch:
+                request.done.set()